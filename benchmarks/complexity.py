@@ -0,0 +1,244 @@
+"""
+Measures how the runtime of `remove_parallel_edges` and
+`get_vertices_from_edges` grows with the number of segments N, by fitting
+the exponent k of runtime ~ N ** k on synthetic segment sets of increasing
+size, and checks it against a declared bound for each case:
+
+    python -m benchmarks.complexity
+
+The segment sets are generated at constant density - the area they cover
+grows with N - as on pages with more (rather than more crowded) molecules.
+The exit status is non-zero if any exponent exceeds its bound. The same check
+runs in the test suite only if the MOLREC_TIMING_TESTS environment variable is
+set, as it depends on wall-clock timings.
+
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from molrec.molecule_detection.feature_detection import (
+    get_vertices_from_edges,
+    remove_parallel_edges
+)
+
+# The mean area per segment, in square pixels
+_AREA_PER_SEGMENT = 3600
+
+
+def _side(n_segments: int) -> int:
+    """The side of the square covered by `n_segments` segments."""
+    return int(math.sqrt(_AREA_PER_SEGMENT * n_segments))
+
+
+def random_segments(n_segments: int, seed: int = 0) -> np.ndarray:
+    """
+    Generates segments with uniformly random positions, angles and lengths.
+
+    Returns:
+        N x 1 x 4 array of segments, as from the line detector.
+
+    """
+    rng = np.random.RandomState(seed)
+    starts = rng.randint(0, _side(n_segments), size=(n_segments, 2))
+    angles = rng.uniform(0, math.pi, size=n_segments)
+    lengths = rng.uniform(10, 60, size=n_segments)
+    ends = starts + np.stack(
+        [np.cos(angles) * lengths, np.sin(angles) * lengths], axis=1
+    )
+    return np.concatenate(
+        [starts, np.around(ends).astype(np.int64)], axis=1
+    )[:, None, :]
+
+
+def parallel_clusters(
+        n_segments: int,
+        seed: int = 0,
+        cluster_size: int = 4
+) -> np.ndarray:
+    """
+    Generates clusters of `cluster_size` near-parallel segments, a few pixels
+    apart, as the line detector produces for both sides of a thick bond.
+
+    Returns:
+        N x 1 x 4 array of segments, as from the line detector.
+
+    """
+    rng = np.random.RandomState(seed)
+    n_clusters = -(-n_segments // cluster_size)
+    segments = random_segments(n_clusters, seed)[:, 0].astype(np.float64)
+    direction = segments[:, 2:] - segments[:, :2]
+    normal = np.stack([-direction[:, 1], direction[:, 0]], axis=1)
+    normal /= np.linalg.norm(normal, axis=1, keepdims=True) + 1e-12
+    # Offset each copy along the normal, with a slight change of angle
+    offsets = rng.uniform(-3, 3, size=(n_clusters, cluster_size, 1))
+    tilt = rng.uniform(-1, 1, size=(n_clusters, cluster_size, 1))
+    starts = segments[:, None, :2] + offsets * normal[:, None]
+    ends = segments[:, None, 2:] + (offsets + tilt) * normal[:, None]
+    clusters = np.concatenate([starts, ends], axis=2).reshape(-1, 4)
+    return np.around(clusters[:n_segments]).astype(np.int64)[:, None, :]
+
+
+def grid_segments(n_segments: int, seed: int = 0) -> np.ndarray:
+    """
+    Generates the horizontal and vertical edges of a square lattice, with
+    endpoints jittered by a pixel or two, so that many endpoints share each
+    vertex, as in a page of drawn rings.
+
+    Returns:
+        N x 1 x 4 array of segments, as from the line detector.
+
+    """
+    rng = np.random.RandomState(seed)
+    spacing = 40
+    cells = int(math.ceil(math.sqrt(n_segments / 2))) + 1
+    x, y = np.meshgrid(np.arange(cells - 1), np.arange(cells - 1))
+    x, y = x.ravel() * spacing, y.ravel() * spacing
+    segments = np.concatenate([
+        np.stack([x, y, x + spacing, y], axis=1),
+        np.stack([x, y, x, y + spacing], axis=1)
+    ])[:n_segments]
+    segments += rng.randint(-2, 3, size=segments.shape)
+    return segments[:, None, :]
+
+
+LAYOUTS: Dict[str, Callable[[int, int], np.ndarray]] = {
+    'random': random_segments,
+    'parallel_clusters': parallel_clusters,
+    'grid': grid_segments
+}
+
+
+class Case(NamedTuple):
+    """A function of a segment set, with a bound on its growth exponent."""
+    name: str
+    func: Callable[[np.ndarray], Any]
+    layout: str
+    bound: float
+
+
+CASES = [
+    Case(
+        f'remove_parallel_edges[grid]/{layout}',
+        lambda segments: remove_parallel_edges(
+            segments, max_line_dist=5, method='grid'
+        ),
+        layout,
+        1.5
+    )
+    for layout in LAYOUTS
+] + [
+    Case(
+        f'get_vertices_from_edges/{layout}',
+        lambda segments: get_vertices_from_edges(
+            segments, (0, 0), tolerance=10
+        ),
+        layout,
+        1.5
+    )
+    for layout in LAYOUTS
+]
+
+
+def measure(
+        func: Callable[[np.ndarray], Any],
+        layout: str,
+        sizes: Sequence[int],
+        repeat: int = 3
+) -> List[float]:
+    """
+    Times `func` on segment sets of the given `layout` and `sizes`.
+
+    Returns:
+        The best wall time in seconds of `repeat` calls for each size.
+
+    """
+    timings = []
+    for size in sizes:
+        segments = LAYOUTS[layout](size, size)
+        best = math.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(segments)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best)
+    return timings
+
+
+def fit_exponent(sizes: Sequence[int], timings: Sequence[float]) -> float:
+    """
+    Fits the exponent k of timings ~ sizes ** k by least squares on a log-log
+    scale.
+
+    Raises:
+        ValueError: If fewer than two sizes are given.
+
+    """
+    if len(sizes) < 2:
+        raise ValueError('At least two sizes are required to fit an exponent')
+    return float(np.polyfit(np.log(sizes), np.log(timings), 1)[0])
+
+
+def check(
+        cases: Sequence[Case] = CASES,
+        sizes: Sequence[int] = (2000, 4000, 8000, 16000),
+        repeat: int = 3
+) -> List[Dict[str, Any]]:
+    """
+    Measures the growth exponent of each of the `cases`.
+
+    Returns:
+        The name, timings, fitted exponent and bound of each case, and
+        whether the exponent is within the bound.
+
+    """
+    report = []
+    for case in cases:
+        timings = measure(case.func, case.layout, sizes, repeat)
+        exponent = fit_exponent(sizes, timings)
+        report.append({
+            'case': case.name,
+            'sizes': list(sizes),
+            'timings': timings,
+            'exponent': exponent,
+            'bound': case.bound,
+            'passed': exponent <= case.bound
+        })
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Check the growth exponents of the segment filters.'
+    )
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[2000, 4000, 8000, 16000],
+        help='The numbers of segments at which to measure.'
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--json', action='store_true', help='Write the report as JSON.'
+    )
+    args = parser.parse_args(argv)
+
+    report = check(sizes=args.sizes, repeat=args.repeat)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f'{"case":<46}{"exponent":>10}{"bound":>8}')
+        for row in report:
+            status = '' if row['passed'] else '  FAILED'
+            print(
+                f'{row["case"]:<46}{row["exponent"]:>10.2f}'
+                f'{row["bound"]:>8.2f}{status}'
+            )
+    return 0 if all(row['passed'] for row in report) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Measures the peak resident set size (RSS) of `process_molecule_image` on a
+large (by default 20 megapixel) photo, compared with the previous pipeline,
+which decoded the image as BGR and made float32 and uint8 copies of it.
+
+Each variant is run in a fresh process, so that peak RSS is not shared:
+
+    python -m benchmarks.memory_pipeline --width 5472 --height 3648
+
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+from typing import Dict
+
+import cv2
+import numpy as np
+
+from molrec.molecule_detection import feature_detection
+from molrec.molecule_detection.process_image import process_molecule_image
+
+
+def _max_rss_bytes() -> int:
+    """The peak RSS of the current process in bytes."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def _legacy_pipeline(path: str):
+    """The pipeline prior to decoding directly to grayscale."""
+    img = cv2.imread(path)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = np.float32(gray)
+    lines = feature_detection.detect_edges(gray, remove_parallel=True)
+    feature_detection.get_vertices_from_edges(lines, gray.shape)
+
+
+def _grayscale_pipeline(path: str):
+    process_molecule_image(path)
+
+
+def _colour_pipeline(path: str):
+    process_molecule_image(path, colour=True)
+
+
+VARIANTS = {
+    'legacy': _legacy_pipeline,
+    'grayscale': _grayscale_pipeline,
+    'colour': _colour_pipeline
+}
+
+
+def _measure(variant: str, path: str, results: multiprocessing.Queue):
+    baseline = _max_rss_bytes()
+    VARIANTS[variant](path)
+    results.put((baseline, _max_rss_bytes()))
+
+
+def draw_photo(width: int, height: int) -> np.ndarray:
+    """Draws a grid of hexagons on a large, white, BGR image."""
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    side = max(min(width, height) // 20, 10)
+    for y in range(2 * side, height - 3 * side, 4 * side):
+        for x in range(side, width - 3 * side, 4 * side):
+            a = side // 2
+            a_root_3 = int(3 ** 0.5 * a)
+            hexagon = np.array([
+                (x, y),
+                (x + a_root_3, y - a),
+                (x + 2 * a_root_3, y),
+                (x + 2 * a_root_3, y + side),
+                (x + a_root_3, y + side + a),
+                (x, y + side)
+            ], dtype=np.int32)
+            cv2.polylines(image, [hexagon], True, (0, 0, 0), 4)
+    return image
+
+
+def run(width: int, height: int) -> Dict[str, Dict[str, float]]:
+    """
+    Measures the peak RSS of each pipeline variant.
+
+    Returns:
+        The baseline (after imports) and peak RSS of each variant in
+        megabytes, and the increase of the peak over the baseline.
+
+    """
+    context = multiprocessing.get_context('spawn')
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'photo.png')
+        cv2.imwrite(path, draw_photo(width, height))
+
+        for variant in VARIANTS:
+            results = context.Queue()
+            process = context.Process(
+                target=_measure, args=(variant, path, results)
+            )
+            process.start()
+            baseline, peak = results.get()
+            process.join()
+            report[variant] = {
+                'baseline_mb': baseline / 1024 ** 2,
+                'peak_mb': peak / 1024 ** 2,
+                'increase_mb': (peak - baseline) / 1024 ** 2
+            }
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Measure the peak RSS of the recognition pipeline.'
+    )
+    parser.add_argument('--width', type=int, default=5472)
+    parser.add_argument('--height', type=int, default=3648)
+    parser.add_argument(
+        '--json', action='store_true', help='Write the report as JSON.'
+    )
+    args = parser.parse_args(argv)
+
+    report = run(args.width, args.height)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        megapixels = args.width * args.height / 1e6
+        print(f'{args.width} x {args.height} ({megapixels:.1f} MP)')
+        print(f'{"variant":<12}{"peak (MB)":>12}{"increase (MB)":>16}')
+        for variant, row in report.items():
+            print(
+                f'{variant:<12}{row["peak_mb"]:>12.1f}'
+                f'{row["increase_mb"]:>16.1f}'
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
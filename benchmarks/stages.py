@@ -0,0 +1,394 @@
+"""
+Times each stage of the recognition pipeline on synthetic molecules drawn
+with `tests.drawing.ShapeImage` - chains of fused hexagons, branched alkanes
+and dense grids of rings - at several image sizes:
+
+    python -m benchmarks.stages --output report.json
+
+A report may be compared against a saved baseline, in which case the exit
+status is non-zero if any stage is slower than the baseline by more than the
+threshold:
+
+    python -m benchmarks.stages --baseline baseline.json --threshold 0.2
+
+The text detection and OCR stages are skipped if the EAST model or the
+Tesseract binary is not available.
+
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from molrec.molecule_detection import feature_detection, text_detection
+from tests.drawing import ShapeImage
+
+Box = Tuple[int, int, int, int]
+
+STAGES = [
+    'detect_edges',
+    'remove_parallel_edges',
+    'get_vertices_from_edges',
+    'text_detection',
+    'ocr'
+]
+
+
+def _label(image: ShapeImage, text: str, pos: Tuple[int, int]) -> Box:
+    """Draws `text` on `image`, returning its bounding box."""
+    font_scale = image.shape[1] / 1000
+    thickness = max(int(2 * font_scale), 1)
+    width, height = image.add_text(
+        text, pos, font_scale=font_scale, thickness=thickness
+    )
+    return pos[0], pos[1] - height, pos[0] + width, pos[1] + thickness
+
+
+def draw_hexagon_chain(size: int) -> Tuple[ShapeImage, List[Box]]:
+    """
+    Draws a horizontal chain of fused hexagons, with a label at either end.
+
+    """
+    image = ShapeImage.new(size, size)
+    length = size // 12
+    a_root_3 = int(3 ** 0.5 * (length // 2))
+    start_y = size // 2 - length // 2
+    n_rings = (size - 4 * length) // (2 * a_root_3)
+    start_x = (size - 2 * a_root_3 * n_rings) // 2
+    for ring in range(n_rings):
+        image.add_regular_hexagon(
+            length,
+            start_coord=(start_x + 2 * a_root_3 * ring, start_y),
+            thickness=2
+        )
+    return image, [
+        _label(image, 'OH', (start_x - 3 * length // 2, start_y)),
+        _label(
+            image,
+            'NH2',
+            (start_x + 2 * a_root_3 * n_rings + length // 4, start_y)
+        )
+    ]
+
+
+def draw_branched_alkane(size: int) -> Tuple[ShapeImage, List[Box]]:
+    """
+    Draws a zigzag carbon backbone with a methyl branch on every other
+    carbon, alternately above and below the backbone, with a terminal label.
+
+    """
+    image = ShapeImage.new(size, size)
+    length = size // 16
+    step = int(3 ** 0.5 * length / 2)
+    y = size // 2
+    x = 2 * length
+    backbone = []
+    while x < size - 3 * length:
+        backbone.append((x, y + (length // 2 if len(backbone) % 2 else 0)))
+        x += step
+    for start, end in zip(backbone, backbone[1:]):
+        image.add_line(start, end, thickness=2)
+    for ii, (x, y) in enumerate(backbone[1:-1:2]):
+        offset = -length if ii % 2 else length
+        image.add_line((x, y), (x, y + offset), thickness=2)
+    end_x, end_y = backbone[-1]
+    return image, [_label(image, 'OH', (end_x + length // 4, end_y))]
+
+
+def draw_grid(size: int, length: int = 40) -> Tuple[ShapeImage, List[Box]]:
+    """
+    Draws a dense grid of separate hexagons of a fixed size, so that the
+    number of segments grows with the image area, without labels.
+
+    """
+    image = ShapeImage.new(size, size)
+    a_root_3 = int(3 ** 0.5 * (length // 2))
+    for y in range(length, size - 2 * length, 3 * length):
+        for x in range(length // 2, size - 3 * a_root_3, 3 * a_root_3):
+            image.add_regular_hexagon(
+                length, start_coord=(x, y), thickness=2
+            )
+    return image, []
+
+
+SCENES: Dict[str, Callable[[int], Tuple[ShapeImage, List[Box]]]] = {
+    'hexagon_chain': draw_hexagon_chain,
+    'branched_alkane': draw_branched_alkane,
+    'grid': draw_grid
+}
+
+
+def _time(func: Callable[[], Any], repeat: int) -> Tuple[Any, List[float]]:
+    """
+    Calls `func` `repeat` times.
+
+    Returns:
+        Tuple of the result of the last call and the wall time of each call
+        in seconds.
+
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def _summarize(times: List[float]) -> Dict[str, float]:
+    return {'min': min(times), 'median': statistics.median(times)}
+
+
+def text_detection_available() -> bool:
+    """Whether the EAST text detection model can be loaded."""
+    try:
+        text_detection.east_model.get_net()
+    except (OSError, cv2.error):
+        return False
+    return True
+
+
+def ocr_available() -> bool:
+    """Whether the Tesseract binary (and pytesseract) are available."""
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except (ImportError, EnvironmentError):
+        return False
+    return True
+
+
+def benchmark_image(
+        image: np.ndarray,
+        labels: Sequence[Box] = (),
+        repeat: int = 5,
+        stages: Sequence[str] = STAGES
+) -> Dict[str, Dict[str, float]]:
+    """
+    Times each of the `stages` on a single (BGR) image.
+
+    The line detection stages are timed separately, with the output of each
+    passed to the next. OCR is run on the known `labels` boxes, so that it
+    does not depend on text detection.
+
+    Returns:
+        The minimum and median wall time in seconds of each stage, along with
+        the number of segments and vertices it produced, where applicable.
+
+    """
+    gray = cv2.cvtColor(np.asarray(image), cv2.COLOR_BGR2GRAY)
+    report = {}
+
+    lines, times = _time(
+        lambda: feature_detection.detect_edges(gray, remove_parallel=False),
+        repeat
+    )
+    if 'detect_edges' in stages:
+        report['detect_edges'] = {**_summarize(times), 'segments': len(lines)}
+
+    filtered, times = _time(
+        lambda: feature_detection.remove_parallel_edges(
+            lines, max_line_dist=gray.shape[0] / 200
+        ),
+        repeat
+    )
+    if 'remove_parallel_edges' in stages:
+        report['remove_parallel_edges'] = {
+            **_summarize(times), 'segments': len(filtered)
+        }
+
+    if 'get_vertices_from_edges' in stages:
+        vertices, times = _time(
+            lambda: feature_detection.get_vertices_from_edges(
+                filtered, gray.shape
+            ),
+            repeat
+        )
+        report['get_vertices_from_edges'] = {
+            **_summarize(times), 'vertices': len(vertices)
+        }
+
+    if 'text_detection' in stages:
+        boxes, times = _time(
+            lambda: text_detection.east_detection_tiled(gray), repeat
+        )
+        report['text_detection'] = {**_summarize(times), 'boxes': len(boxes)}
+
+    if 'ocr' in stages and labels:
+        from molrec.molecule_detection.text_recognition import extract_text
+
+        _, times = _time(
+            lambda: extract_text(gray, list(labels), batch=True), repeat
+        )
+        report['ocr'] = _summarize(times)
+
+    return report
+
+
+def run(
+        sizes: Sequence[int] = (512, 1024, 2048),
+        scenes: Sequence[str] = tuple(SCENES),
+        stages: Sequence[str] = STAGES,
+        repeat: int = 5
+) -> Dict[str, Any]:
+    """
+    Times each of the `stages` on each of the `scenes` at each of the
+    `sizes`. Unavailable text stages are skipped.
+
+    Returns:
+        The JSON-serializable report, with the results keyed by
+        '<scene>/<size>' and then by stage.
+
+    Raises:
+        ValueError: If a scene or stage is unknown.
+
+    """
+    unknown = (set(scenes) - set(SCENES)) | (set(stages) - set(STAGES))
+    if unknown:
+        raise ValueError(f'Unknown scenes or stages: {sorted(unknown)}')
+
+    skipped = []
+    if 'text_detection' in stages and not text_detection_available():
+        skipped.append('text_detection')
+    if 'ocr' in stages and not ocr_available():
+        skipped.append('ocr')
+    stages = [stage for stage in stages if stage not in skipped]
+
+    results = {}
+    for scene in scenes:
+        for size in sizes:
+            image, labels = SCENES[scene](size)
+            results[f'{scene}/{size}'] = benchmark_image(
+                image, labels, repeat=repeat, stages=stages
+            )
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor()
+        },
+        'repeat': repeat,
+        'skipped': skipped,
+        'results': results
+    }
+
+
+def compare(
+        report: Dict[str, Any],
+        baseline: Dict[str, Any],
+        threshold: float = 0.2,
+        statistic: str = 'min'
+) -> List[Dict[str, Any]]:
+    """
+    Compares the stage timings of `report` with those of `baseline`.
+
+    Only cases and stages present in both reports are compared.
+
+    Args:
+        report: The current report (see `run`).
+        baseline: The baseline report.
+        threshold: The fractional slowdown above which a stage has regressed,
+                   e.g. 0.2 for 20% slower.
+        statistic: The timing compared - 'min', which is the least affected
+                   by noise, or 'median'.
+
+    Returns:
+        The case, stage, baseline and current times and their ratio of each
+        stage which has regressed.
+
+    """
+    regressions = []
+    for case, stages in report['results'].items():
+        baseline_stages = baseline['results'].get(case, {})
+        for stage, timing in stages.items():
+            if stage not in baseline_stages:
+                continue
+            previous = baseline_stages[stage][statistic]
+            current = timing[statistic]
+            ratio = current / previous if previous > 0 else float('inf')
+            if ratio > 1 + threshold:
+                regressions.append({
+                    'case': case,
+                    'stage': stage,
+                    'baseline': previous,
+                    'current': current,
+                    'ratio': ratio
+                })
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Time each stage of the recognition pipeline on '
+                    'synthetic molecules.'
+    )
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[512, 1024, 2048],
+        help='Image widths (and heights) in pixels.'
+    )
+    parser.add_argument(
+        '--scenes', nargs='+', choices=list(SCENES), default=list(SCENES)
+    )
+    parser.add_argument(
+        '--stages', nargs='+', choices=STAGES, default=STAGES
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='The number of times each stage is timed.'
+    )
+    parser.add_argument(
+        '-o', '--output', help='Write the report as JSON to this file.'
+    )
+    parser.add_argument(
+        '--baseline', help='A saved report with which to compare.'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=0.2,
+        help='The fractional slowdown considered a regression.'
+    )
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.scenes, args.stages, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+    print(f'{"case":<24}{"stage":<26}{"min (ms)":>10}{"median (ms)":>13}')
+    for case, stages in report['results'].items():
+        for stage, timing in stages.items():
+            print(
+                f'{case:<24}{stage:<26}{1000 * timing["min"]:>10.2f}'
+                f'{1000 * timing["median"]:>13.2f}'
+            )
+    for stage in report['skipped']:
+        print(f'Skipped {stage}: not available', file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        regressions = compare(report, baseline, args.threshold)
+        for regression in regressions:
+            print(
+                f'Regression: {regression["case"]} {regression["stage"]} '
+                f'{1000 * regression["baseline"]:.2f} ms -> '
+                f'{1000 * regression["current"]:.2f} ms '
+                f'({regression["ratio"]:.2f}x)',
+                file=sys.stderr
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,424 @@
+"""
+Command line interface for batch processing of molecule images.
+
+Images are processed across a pool of worker processes and one JSON record is
+streamed per image, as each completes:
+
+    python -m molrec drawings/ 'scans/*.png' -j 8 -o results.jsonl
+
+"""
+import argparse
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    wait
+)
+import glob
+import inspect
+import json
+import os
+import sys
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set
+)
+
+from .molecule_detection import feature_detection
+from .molecule_detection.image_utils import ImageDecodeError, ImageSource
+from .molecule_detection.process_image import process_molecule_image
+
+
+IMAGE_EXTENSIONS = {
+    '.bmp', '.jpeg', '.jpg', '.png', '.tif', '.tiff', '.webp'
+}
+
+# The error raised while loading the models of this worker process, if any
+_warmup_error: Optional[str] = None
+
+
+def find_images(inputs: Sequence[str]) -> List[str]:
+    """
+    Expands directories, glob patterns and file paths into a list of image
+    paths.
+
+    Directories are searched (non-recursively) for files with common image
+    extensions. Duplicates are removed, preserving order.
+
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(
+                os.path.join(item, name) for name in sorted(os.listdir(item))
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+            )
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item)))
+        else:
+            paths.append(item)
+    return list(dict.fromkeys(paths))
+
+
+def recognize(
+        source: ImageSource,
+        text: bool = False,
+        detector_params: Optional[Mapping[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Runs the recognition pipeline on a single image, capturing any error.
+
+    Args:
+        source: Path to the image file, or the contents of the file.
+        text: Whether to also detect and recognize text.
+        detector_params: Keyword arguments to
+                         `feature_detection.detect_edges` (see
+                         `process_molecule_image`).
+
+    Returns:
+        JSON-serializable record of the vertices, edges, molecular graph,
+        text, stage timings and error (if any) for the image. The kind of
+        error is recorded as 'decode' if the image could not be read or
+        decoded, or 'internal' otherwise. If the models of the worker process
+        failed to load (see `init_worker`), the image is not processed and
+        the error is recorded.
+
+    """
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    record: Dict[str, Any] = {
+        'vertices': None,
+        'edges': None,
+        'graph': None,
+        'text': None,
+        'timings': timings,
+        'error': None,
+        'error_kind': None
+    }
+    if _warmup_error is not None:
+        record['error'] = f'Failed to load models: {_warmup_error}'
+        record['error_kind'] = 'internal'
+        timings['total'] = time.perf_counter() - start
+        return record
+    try:
+        result = process_molecule_image(
+            source,
+            timings=timings,
+            keep_image=text,
+            detector_params=detector_params
+        )
+        record.update(result.to_dict(), timings=timings)
+        graph_start = time.perf_counter()
+        record['graph'] = result.to_graph().to_dict()
+        timings['graph'] = time.perf_counter() - graph_start
+        if text:
+            # Imported here as text detection depends on Tesseract and the
+            # EAST model, which are not required otherwise
+            from .molecule_detection.text_detection import (
+                east_detection_tiled
+            )
+            from .molecule_detection.text_recognition import extract_text
+
+            text_start = time.perf_counter()
+            boxes = east_detection_tiled(result.image)
+            record['text'] = [
+                {'box': list(map(int, box)), 'text': label.strip()}
+                for box, label in extract_text(
+                    result.image, [tuple(box) for box in boxes], batch=True
+                )
+            ]
+            timings['text'] = time.perf_counter() - text_start
+    except Exception as exc:
+        record['error'] = f'{type(exc).__name__}: {exc}'
+        record['error_kind'] = (
+            'decode' if isinstance(exc, ImageDecodeError) else 'internal'
+        )
+    timings['total'] = time.perf_counter() - start
+    return record
+
+
+def process_path(
+        path: str,
+        text: bool = False,
+        detector_params: Optional[Mapping[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Runs the recognition pipeline on the image at `path` (see `recognize`).
+
+    Returns:
+        The record of the image, including its path.
+
+    """
+    return {
+        'path': path,
+        **recognize(path, text=text, detector_params=detector_params)
+    }
+
+
+def warmup_worker(
+        text: bool = False,
+        detector_params: Optional[Mapping[str, Any]] = None
+):
+    """
+    Loads the models required by a worker process: the line detector with the
+    parameters among `detector_params` (or its defaults) and, if `text` is
+    set, the EAST model.
+
+    """
+    names = inspect.signature(feature_detection.get_line_detector).parameters
+    feature_detection.get_line_detector(**{
+        name: value for name, value in (detector_params or {}).items()
+        if name in names
+    })
+    if text:
+        from .molecule_detection.text_detection import east_model
+        east_model.warmup()
+
+
+def init_worker(
+        text: bool = False,
+        detector_params: Optional[Mapping[str, Any]] = None
+):
+    """
+    Initializes a worker process, loading its models (see `warmup_worker`).
+
+    Unlike `warmup_worker`, this does not raise, as a process pool
+    initializer which raises breaks the pool. Instead, the error is recorded
+    and reported in the record of each image by `recognize`.
+
+    """
+    global _warmup_error
+    _warmup_error = None
+    try:
+        warmup_worker(text, detector_params)
+    except Exception as exc:
+        _warmup_error = f'{type(exc).__name__}: {exc}'
+
+
+def worker_warmup_error() -> Optional[str]:
+    """
+    Returns the error raised while loading the models of this worker process
+    (see `init_worker`), if any.
+
+    """
+    return _warmup_error
+
+
+def process_paths(
+        paths: Sequence[str],
+        workers: int = 1,
+        text: bool = False,
+        detector_params: Optional[Mapping[str, Any]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Processes the images at `paths` across `workers` processes (see
+    `process_path`).
+
+    Yields:
+        The record of each image (see `process_path`), as each completes.
+
+    """
+    if workers <= 1:
+        init_worker(text, detector_params)
+        for path in paths:
+            yield process_path(
+                path, text=text, detector_params=detector_params
+            )
+        return
+
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(text, detector_params)
+    ) as executor:
+        pending: Set[Future] = set()
+        remaining = iter(paths)
+        # Keep a bounded number of images in flight, so that submission does
+        # not race ahead of the workers
+        for path in remaining:
+            pending.add(executor.submit(
+                process_path, path, text, detector_params
+            ))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                path = next(remaining, None)
+                if path is not None:
+                    pending.add(executor.submit(
+                        process_path, path, text, detector_params
+                    ))
+
+
+def add_detector_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds options for the parameters of the line detector and the parallel
+    edge filter to `parser` (see `feature_detection.detect_edges`).
+
+    """
+    group = parser.add_argument_group(
+        'line detection',
+        'Parameters of the line detector. Each defaults to that of '
+        'feature_detection.detect_edges.'
+    )
+    group.add_argument(
+        '--length-threshold',
+        type=int,
+        help='Segments shorter than this many pixels are discarded.'
+    )
+    group.add_argument(
+        '--distance-threshold',
+        type=float,
+        help='Points further than this from a hypothesis segment are '
+             'outliers.'
+    )
+    group.add_argument(
+        '--canny-th1',
+        type=float,
+        help='First threshold of the Canny hysteresis procedure.'
+    )
+    group.add_argument(
+        '--canny-th2',
+        type=float,
+        help='Second threshold of the Canny hysteresis procedure.'
+    )
+    group.add_argument(
+        '--canny-aperture-size',
+        type=int,
+        choices=[3, 5, 7],
+        help='Aperture size of the Sobel operator of Canny.'
+    )
+    group.add_argument(
+        '--do-merge',
+        action='store_true',
+        default=None,
+        help='Incrementally merge segments.'
+    )
+    group.add_argument(
+        '--max-line-dist',
+        type=float,
+        help='Maximum distance between parallel edges for them to be '
+             'filtered as adjacent.'
+    )
+    group.add_argument(
+        '--parallel-method',
+        choices=['vectorized', 'grid', 'loop'],
+        help="The parallel edge filter engine - 'grid' is recommended for "
+             'images with very many segments.'
+    )
+
+
+def detector_params_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Collects the line detection options given on the command line (see
+    `add_detector_arguments`).
+
+    Returns:
+        Keyword arguments to `feature_detection.detect_edges`.
+
+    """
+    names = (
+        'length_threshold',
+        'distance_threshold',
+        'canny_th1',
+        'canny_th2',
+        'canny_aperture_size',
+        'do_merge',
+        'max_line_dist',
+        'parallel_method'
+    )
+    return {
+        name: getattr(args, name) for name in names
+        if getattr(args, name) is not None
+    }
+
+
+def _parse_args(argv: Optional[Sequence[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='molrec',
+        description='Recognize the molecules drawn in images, writing one '
+                    'JSON record per image.'
+    )
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        help='Image files, directories of images or glob patterns.'
+    )
+    parser.add_argument(
+        '-j', '--workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Number of worker processes. Defaults to the number of CPUs.'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='File to which to write the JSON Lines output. Defaults to '
+             'stdout.'
+    )
+    parser.add_argument(
+        '--text',
+        action='store_true',
+        help='Also detect and recognize text. Requires the EAST model and '
+             'Tesseract.'
+    )
+    parser.add_argument(
+        '-q', '--quiet',
+        action='store_true',
+        help='Do not report progress on stderr.'
+    )
+    add_detector_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Entry point of the command line interface.
+
+    Returns:
+        Exit status - 0 if all images were processed successfully, 1 if any
+        failed and 2 if no images were found.
+
+    """
+    args = _parse_args(argv)
+
+    paths = find_images(args.inputs)
+    if not paths:
+        print('molrec: no images found', file=sys.stderr)
+        return 2
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    n_failed = 0
+    try:
+        for n_done, record in enumerate(
+                process_paths(
+                    paths,
+                    workers=args.workers,
+                    text=args.text,
+                    detector_params=detector_params_from_args(args)
+                ),
+                1
+        ):
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+            if record['error'] is not None:
+                n_failed += 1
+            if not args.quiet:
+                status = 'error' if record['error'] else 'ok'
+                print(
+                    f'[{n_done}/{len(paths)}] {record["path"]}: {status}',
+                    file=sys.stderr
+                )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return 1 if n_failed else 0
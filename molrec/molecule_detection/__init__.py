@@ -1,7 +1,13 @@
-from .image_utils import annotate_image
-from .process_image import process_molecule_image
+from .image_utils import annotate_image, read_image
+from .pack import PackReader
+from .process_image import process_molecule_image, process_molecule_images
+from .result import MoleculeImageResult
 
 __all__ = [
+    'MoleculeImageResult',
+    'PackReader',
     'annotate_image',
     'process_molecule_image',
-]
\ No newline at end of file
+    'process_molecule_images',
+    'read_image',
+]
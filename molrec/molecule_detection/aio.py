@@ -0,0 +1,211 @@
+"""
+This module provides an asyncio interface to the recognition pipeline, which
+runs the blocking OpenCV and Tesseract work in an executor so that the event
+loop remains responsive.
+
+"""
+import asyncio
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+import functools
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from . import process_image, text_detection, text_recognition
+from .image_utils import ImageSource
+from .result import MoleculeImageResult
+from .text_recognition import Box
+
+
+def _call_soon_threadsafe(
+        loop: asyncio.AbstractEventLoop,
+        callback: Callable[[], Any]
+):
+    """Schedules `callback` on `loop`, unless the loop has been closed."""
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        pass
+
+
+class AsyncRecognizer:
+    """
+    Runs the recognition pipeline from asyncio code, limiting the number of
+    recognitions that run at once.
+
+    Each call may be given a timeout and may be cancelled. Cancelling a call
+    (or timing out) prevents work that has not yet started from running, but
+    work already running in the executor cannot be interrupted; its
+    concurrency slot is only released once it has finished, so the limit
+    holds for the work actually running.
+
+    Example:
+
+        async with AsyncRecognizer(max_concurrency=4) as recognizer:
+            result = await recognizer.process_molecule_image(
+                data, timeout=5.
+            )
+
+    """
+    def __init__(
+            self,
+            max_concurrency: int = 4,
+            executor: Optional[Executor] = None,
+            timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            max_concurrency: The maximum number of calls to run at once.
+            executor: The executor in which to run calls. Defaults to a thread
+                      pool of `max_concurrency` threads, owned by (and shut
+                      down with) the recognizer.
+            timeout: The default timeout of each call in seconds, including
+                     the time spent waiting for a concurrency slot.
+
+        Raises:
+            ValueError: If `max_concurrency` is less than one.
+
+        """
+        if max_concurrency < 1:
+            raise ValueError(
+                f'max_concurrency must be at least 1, got {max_concurrency}'
+            )
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix='molrec-aio'
+        )
+        # Created on first use, as asyncio primitives are bound to the event
+        # loop that is running when they are created
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(
+            self,
+            func: Callable[..., Any],
+            *args,
+            timeout: Optional[float] = None,
+            **kwargs
+    ) -> Any:
+        """
+        Runs the blocking `func` with the given arguments in the executor.
+
+        Args:
+            func: The function to run.
+            timeout: The timeout of the call in seconds. Defaults to the
+                     recognizer's timeout.
+
+        Returns:
+            The return value of `func`.
+
+        Raises:
+            asyncio.TimeoutError: If the call does not complete in time.
+
+        """
+        if timeout is None:
+            timeout = self.timeout
+        return await asyncio.wait_for(
+            self._run(functools.partial(func, *args, **kwargs)), timeout
+        )
+
+    async def _run(self, call: Callable[[], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+        try:
+            future: Future = self._executor.submit(call)
+        except BaseException:
+            semaphore.release()
+            raise
+        # Release the slot once the work itself is done, rather than when
+        # the awaiting task finishes, as cancellation does not stop work that
+        # is already running
+        future.add_done_callback(
+            lambda _: _call_soon_threadsafe(loop, semaphore.release)
+        )
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def process_molecule_image(
+            self,
+            source: ImageSource,
+            timeout: Optional[float] = None,
+            **kwargs
+    ) -> MoleculeImageResult:
+        """
+        Detects the edges and vertices of the molecule drawn in an image.
+        Keyword arguments are passed to
+        `process_image.process_molecule_image`.
+
+        """
+        return await self.run(
+            process_image.process_molecule_image,
+            source,
+            timeout=timeout,
+            **kwargs
+        )
+
+    async def east_detection(
+            self,
+            image: np.ndarray,
+            timeout: Optional[float] = None,
+            **kwargs
+    ) -> np.ndarray:
+        """
+        Performs EAST text detection of text bounding boxes. Keyword arguments
+        are passed to `text_detection.east_detection`.
+
+        """
+        return await self.run(
+            text_detection.east_detection, image, timeout=timeout, **kwargs
+        )
+
+    async def extract_text(
+            self,
+            image: np.ndarray,
+            boxes: List[Box],
+            timeout: Optional[float] = None,
+            **kwargs
+    ) -> List[Tuple[Box, str]]:
+        """
+        Recognizes the text in each of the bounding `boxes` of `image`.
+        Keyword arguments are passed to `text_recognition.extract_text`.
+
+        """
+        return await self.run(
+            text_recognition.extract_text,
+            image,
+            boxes,
+            timeout=timeout,
+            **kwargs
+        )
+
+    def close(self, wait: bool = True):
+        """
+        Shuts down the executor, if owned by the recognizer.
+
+        Args:
+            wait: Whether to wait for running calls to finish.
+
+        """
+        if self._owns_executor:
+            self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self) -> 'AsyncRecognizer':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Wait for running calls without blocking the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
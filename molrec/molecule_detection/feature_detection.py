@@ -1,10 +1,11 @@
 import math
-from typing import List, Optional, Tuple
+import threading
+from typing import List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
 
-from . import line_utils
+from . import grid, line_utils
 
 
 class DetectionError(Exception):
@@ -25,56 +26,256 @@ def test_coords_close(
     return line_utils.calculate_point_distance(a, b) <= tol
 
 
+def _find_close_point_pairs(
+        points: np.ndarray,
+        tolerance: float
+) -> np.ndarray:
+    """
+    Identifies the pairs of `points` within `tolerance` of one another.
+
+    Points are hashed into grid cells of size `tolerance`, so that only points
+    in neighbouring cells need be compared.
+
+    Returns:
+        Array of (i, j) index pairs, with i < j.
+
+    """
+    cells = np.floor(points / max(tolerance, 1)).astype(np.int64)
+    # Offset the cells so that the neighbour lookups remain non-negative
+    cells -= cells.min(axis=0) - 1
+    n_cells_x = int(cells[:, 0].max()) + 2
+    keys = cells[:, 1] * n_cells_x + cells[:, 0]
+
+    neighbour_offsets = np.array([
+        d_y * n_cells_x + d_x for d_y in (-1, 0, 1) for d_x in (-1, 0, 1)
+    ])
+    owners = np.arange(len(points))
+    ii, jj = grid.join_cell_keys(
+        keys,
+        owners,
+        (keys[:, None] + neighbour_offsets).ravel(),
+        np.repeat(owners, len(neighbour_offsets))
+    )
+
+    upper = ii < jj
+    ii, jj = ii[upper], jj[upper]
+    close = line_utils.calculate_point_distances(
+        points[ii], points[jj], pairwise=False
+    ) <= tolerance
+    return np.stack([ii[close], jj[close]], axis=1)
+
+
+def _cluster_pairs(n_items: int, pairs: np.ndarray) -> np.ndarray:
+    """
+    Clusters items connected (transitively) by `pairs` using union-find.
+
+    Returns:
+        Length `n_items` array of cluster labels, numbered in order of the
+        first item of each cluster.
+
+    """
+    parents = list(range(n_items))
+
+    def find(item):
+        while parents[item] != item:
+            # Path halving
+            parents[item] = parents[parents[item]]
+            item = parents[item]
+        return item
+
+    for ii, jj in pairs.tolist():
+        root_i, root_j = find(ii), find(jj)
+        if root_i != root_j:
+            # The lowest index is kept as the root of each cluster
+            parents[max(root_i, root_j)] = min(root_i, root_j)
+
+    roots = np.array([find(item) for item in range(n_items)], dtype=np.int64)
+    return np.unique(roots, return_inverse=True)[1]
+
+
 def get_vertices_from_edges(
         edges: np.ndarray,
         image_size: Tuple[int, int],
-        tolerance: Optional[int] = None
-):
+        tolerance: Optional[int] = None,
+        return_index: bool = False
+) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
     """
     Identifies unique vertices based on the `edges`.
 
+    Edge endpoints within `tolerance` of one another (transitively) are
+    clustered, and each vertex is the rounded centroid of its cluster. The
+    clustering hashes endpoints into grid cells of size `tolerance`, so runs
+    in linear time in the number of edges.
+
     If `tolerance` is not provided, it is defined adaptively based on
     `image_size`.
 
+    Args:
+        edges: Array of line coordinates (start and end point of each line).
+        image_size: The dimensions of the image.
+        tolerance: The maximum distance between endpoints of the same vertex.
+        return_index: Whether to also return the index of the vertex of each
+                      edge endpoint.
+
+    Returns:
+        Array of vertex coordinates, in order of first appearance in `edges`.
+        If `return_index` is True, an N x 2 array of the vertex indices of the
+        start and end point of each edge is also returned.
+
     """
     if tolerance is None:
         tolerance = image_size[0] // 50
 
-    vertices: List[Tuple[int, int]] = []
-    for edge in edges:
-        # TODO: Should the average vertex coordinate be kept, rather than the
-        #  first encountered?
-        for vertex in [tuple(edge[0, :2]), tuple(edge[0, 2:])]:
-            if not any(test_coords_close(vertex, v, tolerance)
-                       for v in vertices):
-                vertices.append(vertex)
+    endpoints = np.reshape(edges, (-1, 2))
+    if len(endpoints):
+        labels = _cluster_pairs(
+            len(endpoints),
+            _find_close_point_pairs(endpoints, tolerance)
+        )
+        counts = np.bincount(labels)
+        centroids = np.stack([
+            np.bincount(labels, weights=endpoints[:, 0]) / counts,
+            np.bincount(labels, weights=endpoints[:, 1]) / counts
+        ], axis=1)
+    else:
+        labels = np.empty(0, dtype=np.int64)
+        centroids = np.empty((0, 2))
+
     # This return format mimics the corner detection format from
     # cv2.goodFeaturesToTrack
-    return np.array([[v] for v in vertices])
+    vertices = np.around(centroids).astype(np.int64)[:, None, :]
+    if return_index:
+        return vertices, labels.reshape(-1, 2)
+    return vertices
 
 
-def remove_parallel_edges(
-        edges: np.ndarray,
-        gradient_tolerance: float = 0.1,
-        max_line_dist: float = 20.
+def _are_gradients_close(
+        a: np.ndarray,
+        b: np.ndarray,
+        abs_tol: float
 ) -> np.ndarray:
     """
-    Removes parallel lines in close proximity to one another from `edges`.
+    Vectorised equivalent of math.isclose with the default relative tolerance.
+
+    """
+    return np.abs(a - b) <= np.maximum(
+        1e-09 * np.maximum(np.abs(a), np.abs(b)),
+        abs_tol
+    )
+
+
+def _are_gradients_parallel(
+        gradients_a: np.ndarray,
+        gradients_b: np.ndarray,
+        gradient_tolerance: float
+) -> np.ndarray:
+    """
+    Tests whether gradients are within `gradient_tolerance` of one another,
+    or both vertical (NaN).
+
+    """
+    return (
+        (np.isnan(gradients_a) & np.isnan(gradients_b)) |
+        _are_gradients_close(gradients_a, gradients_b, gradient_tolerance)
+    )
+
+
+def _are_parallel_segments_adjacent(
+        coords: np.ndarray,
+        gradients: np.ndarray,
+        ii: np.ndarray,
+        jj: np.ndarray,
+        max_line_dist: float
+) -> np.ndarray:
+    """
+    Tests whether the parallel segment pairs (`ii`, `jj`) are adjacent.
+
+    The tests are those applied by the reference implementation,
+    _remove_parallel_edges_loop: for "identical" gradients, the start of
+    segment `jj` must lie within `max_line_dist` of segment `ii`. Otherwise,
+    any endpoint of either segment must lie within `max_line_dist` of the
+    other segment.
 
     Args:
-        edges: Array of line coordinates (start and end point of each line).
-        gradient_tolerance: Maximum allowed difference in gradient for lines to
-                            be considered parallel. Defaults to 0.1.
+        coords: N x 4 array of segment coordinates.
+        gradients: Length N array of segment gradients.
+        ii: Indices of the first segment of each pair.
+        jj: Indices of the second segment of each pair.
         max_line_dist: Maximum distance between lines for them to be considered
                        adjacent to one another.
 
     Returns:
-        Array with adjacent parallel lines removed.
+        Boolean array, with one element per pair.
+
+    """
+    coords_a, coords_b = coords[ii], coords[jj]
+    identical = _are_gradients_close(gradients[ii], gradients[jj], 0.00000001)
+
+    def is_close(segments, points):
+        return line_utils.calculate_point_segment_distances(
+            segments, points, pairwise=False
+        ) <= max_line_dist
+
+    start_b_close = is_close(coords_a, coords_b[:, :2])
+    any_close = (
+        start_b_close |
+        is_close(coords_a, coords_b[:, 2:]) |
+        is_close(coords_b, coords_a[:, :2]) |
+        is_close(coords_b, coords_a[:, 2:])
+    )
+
+    return np.where(identical, start_b_close, any_close)
 
+
+def _resolve_parallel_pairs(
+        n_edges: int,
+        pairs: np.ndarray,
+        lengths: np.ndarray
+) -> np.ndarray:
     """
-    coords = [edge[0] for edge in edges]
+    Determines which segments to keep given the adjacent parallel `pairs`.
+
+    The pairs are resolved in the same order as the reference implementation,
+    such that the shorter segment of each pair is removed unless either has
+    already been removed by an earlier pair.
+
+    Args:
+        n_edges: Total number of segments.
+        pairs: Array of (i, j) index pairs, with i < j, sorted by i then j.
+        lengths: Lengths of the segments.
+
+    Returns:
+        Boolean keep-mask for the segments.
+
+    """
+    keep = [True] * n_edges
+    current_row, row_kept = -1, False
+    for ii, jj in pairs.tolist():
+        if ii != current_row:
+            # Whether or not `ii` is kept is only checked when first
+            # encountered
+            current_row, row_kept = ii, keep[ii]
+        if not row_kept or not keep[jj]:
+            continue
+        # Keep longest segment
+        idx = ii if lengths[ii] < lengths[jj] else jj
+        keep[idx] = False
+    return np.array(keep, dtype=bool)
+
+
+def _remove_parallel_edges_loop(
+        coords: List[np.ndarray],
+        gradient_tolerance: float,
+        max_line_dist: float
+) -> List[bool]:
+    """
+    Reference implementation of the parallel edge filter, testing each pair of
+    segments in turn.
+
+    Returns:
+        List of booleans indicating which segments to keep.
 
-    # TODO: vectorise these computations
+    """
     lengths = [line_utils.calculate_segment_length(*a.T) for a in coords]
     gradients = [line_utils.calculate_gradient(*a.T) for a in coords]
 
@@ -121,31 +322,348 @@ def remove_parallel_edges(
                             keep[idx] = False
                             break
 
+    return keep
+
+
+def _remove_parallel_edges_vectorized(
+        coords: np.ndarray,
+        gradient_tolerance: float,
+        max_line_dist: float,
+        chunk_size: int
+) -> np.ndarray:
+    """
+    Vectorised implementation of the parallel edge filter.
+
+    The gradient compatibility matrix is evaluated in blocks of `chunk_size`
+    rows against all later segments, bounding the memory used by the
+    intermediate matrices to O(chunk_size * N). Endpoint to segment distances
+    are then calculated in bulk for the compatible pairs only.
+
+    Returns:
+        Boolean keep-mask for the segments.
+
+    """
+    coords = coords.astype(np.float64)
+    n_edges = len(coords)
+
+    lengths = line_utils.calculate_segment_lengths(coords)
+    gradients = line_utils.calculate_gradients(coords)
+
+    pairs = []
+    for start in range(0, n_edges, chunk_size):
+        stop = min(start + chunk_size, n_edges)
+        # Gradient compatibility of this block of rows with all later segments
+        ii, jj = np.nonzero(_are_gradients_parallel(
+            gradients[start:stop, None],
+            gradients[None, start + 1:],
+            gradient_tolerance
+        ))
+        ii += start
+        jj += start + 1
+        # Only pairs in the upper triangle are considered
+        upper = jj > ii
+        ii, jj = ii[upper], jj[upper]
+
+        adjacent = _are_parallel_segments_adjacent(
+            coords, gradients, ii, jj, max_line_dist
+        )
+        pairs.append(np.stack([ii[adjacent], jj[adjacent]], axis=1))
+
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), np.int64)
+    return _resolve_parallel_pairs(n_edges, pairs, lengths.tolist())
+
+
+def _find_candidate_pairs_grid(
+        coords: np.ndarray,
+        gradient_tolerance: float,
+        max_line_dist: float
+) -> np.ndarray:
+    """
+    Identifies candidate pairs of segments for the parallel edge tests using
+    an index of quantized segment angle and a coarse spatial grid.
+
+    Since the arctangent is 1-Lipschitz, segments with gradients within
+    `gradient_tolerance` have angles within `gradient_tolerance` and so fall
+    in the same or neighbouring angle buckets. Vertical (and zero length)
+    segments, which have NaN gradients, are simply assigned an angle of -pi/2.
+    Similarly, adjacent segments must have bounding boxes within
+    `max_line_dist` of one another, so share at least one cell once one of the
+    bounding boxes is expanded by `max_line_dist`.
+
+    Returns:
+        Unique array of candidate (i, j) index pairs, with i < j, sorted by i
+        then j.
+
+    """
+    n_edges = len(coords)
+    delta_x = coords[:, 2] - coords[:, 0]
+    delta_y = coords[:, 3] - coords[:, 1]
+
+    # Fold the segment angles into [-pi/2, pi/2), independent of direction
+    angles = np.arctan2(delta_y, delta_x)
+    angles[angles >= math.pi / 2] -= math.pi
+    angles[angles < -math.pi / 2] += math.pi
+    angles[delta_x == 0] = -math.pi / 2
+    max_gradient = np.nanmax(
+        np.abs(line_utils.calculate_gradients(coords)), initial=0.
+    )
+    # The bucket width includes the relative tolerance of math.isclose, plus a
+    # margin for rounding error. It is kept positive for a zero tolerance when
+    # all segments are horizontal or vertical; wider buckets only add
+    # candidates
+    bucket_width = max(
+        gradient_tolerance, 1e-09 * max(max_gradient, 1.)
+    ) * 1.000001
+    buckets = np.floor((angles + math.pi / 2) / bucket_width).astype(np.int64)
+
+    min_x = np.minimum(coords[:, 0], coords[:, 2])
+    max_x = np.maximum(coords[:, 0], coords[:, 2])
+    min_y = np.minimum(coords[:, 1], coords[:, 3])
+    max_y = np.maximum(coords[:, 1], coords[:, 3])
+    # Coarse cells, such that a typical segment spans only a few of them
+    cell_size = max(
+        2 * max_line_dist,
+        float(np.median(np.maximum(max_x - min_x, max_y - min_y))),
+        1.
+    )
+    origin_x = min_x.min() - max_line_dist
+    origin_y = min_y.min() - max_line_dist
+
+    def to_cell(values, origin):
+        return np.floor((values - origin) / cell_size).astype(np.int64)
+
+    # Segments are inserted in the cells covered by their bounding boxes...
+    insert_owners, insert_x, insert_y = grid.expand_grid_cells(
+        to_cell(min_x, origin_x),
+        to_cell(min_y, origin_y),
+        to_cell(max_x, origin_x),
+        to_cell(max_y, origin_y)
+    )
+    # ...and look up the cells covered by their expanded bounding boxes
+    query_owners, query_x, query_y = grid.expand_grid_cells(
+        to_cell(min_x - max_line_dist, origin_x),
+        to_cell(min_y - max_line_dist, origin_y),
+        to_cell(max_x + max_line_dist, origin_x),
+        to_cell(max_y + max_line_dist, origin_y)
+    )
+
+    n_cells_x = int(query_x.max()) + 1
+    n_cells_y = int(query_y.max()) + 1
+
+    def to_key(bucket, cell_x, cell_y):
+        # Buckets are offset by one so that the neighbour lookup of bucket
+        # zero remains non-negative
+        return ((bucket + 1) * n_cells_y + cell_y) * n_cells_x + cell_x
+
+    # Each query cell is looked up in the neighbouring angle buckets too
+    ii, jj = grid.join_cell_keys(
+        to_key(buckets[insert_owners], insert_x, insert_y),
+        insert_owners,
+        to_key(
+            (buckets[query_owners][:, None] + np.array([-1, 0, 1])).ravel(),
+            np.repeat(query_x, 3),
+            np.repeat(query_y, 3)
+        ),
+        np.repeat(query_owners, 3)
+    )
+
+    pair_keys = np.unique(
+        np.minimum(ii, jj) * n_edges + np.maximum(ii, jj)
+    )
+    pairs = np.stack([pair_keys // n_edges, pair_keys % n_edges], axis=1)
+    return pairs[pairs[:, 0] != pairs[:, 1]]
+
+
+def _remove_parallel_edges_grid(
+        coords: np.ndarray,
+        gradient_tolerance: float,
+        max_line_dist: float
+) -> np.ndarray:
+    """
+    Implementation of the parallel edge filter which only tests the candidate
+    pairs from an angle and spatial index (see _find_candidate_pairs_grid).
+
+    Returns:
+        Boolean keep-mask for the segments.
+
+    """
+    coords = coords.astype(np.float64)
+    n_edges = len(coords)
+    if n_edges == 0:
+        return np.ones(0, dtype=bool)
+
+    lengths = line_utils.calculate_segment_lengths(coords)
+    gradients = line_utils.calculate_gradients(coords)
+
+    ii, jj = _find_candidate_pairs_grid(
+        coords, gradient_tolerance, max_line_dist
+    ).T
+    parallel = _are_gradients_parallel(
+        gradients[ii], gradients[jj], gradient_tolerance
+    )
+    ii, jj = ii[parallel], jj[parallel]
+    adjacent = _are_parallel_segments_adjacent(
+        coords, gradients, ii, jj, max_line_dist
+    )
+    pairs = np.stack([ii[adjacent], jj[adjacent]], axis=1)
+    return _resolve_parallel_pairs(n_edges, pairs, lengths.tolist())
+
+
+def remove_parallel_edges(
+        edges: np.ndarray,
+        gradient_tolerance: float = 0.1,
+        max_line_dist: float = 20.,
+        method: str = 'vectorized',
+        chunk_size: int = 512
+) -> np.ndarray:
+    """
+    Removes parallel lines in close proximity to one another from `edges`.
+
+    Args:
+        edges: Array of line coordinates (start and end point of each line).
+        gradient_tolerance: Maximum allowed difference in gradient for lines to
+                            be considered parallel. Defaults to 0.1.
+        max_line_dist: Maximum distance between lines for them to be considered
+                       adjacent to one another.
+        method: The pairwise engine to use - 'vectorized' (default) evaluates
+                the pairwise tests in bulk using numpy, 'grid' only tests
+                candidate pairs from neighbouring cells of an angle and
+                spatial index, scaling near-linearly with the number of
+                segments, while 'loop' is the pure Python reference
+                implementation. All methods retain the same segments.
+        chunk_size: The number of segments per block of pairwise tests for the
+                    'vectorized' method, bounding memory use.
+
+    Returns:
+        Array with adjacent parallel lines removed.
+
+    Raises:
+        ValueError: If `method` is not recognised.
+
+    """
+    if method == 'loop':
+        keep = _remove_parallel_edges_loop(
+            [edge[0] for edge in edges],
+            gradient_tolerance,
+            max_line_dist
+        )
+    elif method == 'vectorized':
+        keep = _remove_parallel_edges_vectorized(
+            np.reshape(edges, (-1, 4)),
+            gradient_tolerance,
+            max_line_dist,
+            chunk_size
+        )
+    elif method == 'grid':
+        keep = _remove_parallel_edges_grid(
+            np.reshape(edges, (-1, 4)),
+            gradient_tolerance,
+            max_line_dist
+        )
+    else:
+        raise ValueError(f'Unknown parallel edge removal method: {method}')
+
     return edges[keep]
 
 
+# Per-thread cache of line detectors, keyed by their parameters, as detectors
+# are not safe to share between threads
+_line_detectors = threading.local()
+
+
+def get_line_detector(
+        length_threshold: int = 10,
+        distance_threshold: float = 1.41421356,
+        canny_th1: float = 50.,
+        canny_th2: float = 50.,
+        canny_aperture_size: int = 7,
+        do_merge: bool = False
+) -> cv2.ximgproc_FastLineDetector:
+    """
+    Retrieves the FastLineDetector for the given parameters for the current
+    thread, constructing it on first use.
+
+    Args:
+        length_threshold: Segments shorter than this are discarded.
+        distance_threshold: Points further than this from a hypothesis line
+                            segment are regarded as outliers.
+        canny_th1: First threshold for the hysteresis procedure of Canny().
+        canny_th2: Second threshold for the hysteresis procedure of Canny().
+        canny_aperture_size: Aperture size of the Sobel operator of Canny().
+        do_merge: Whether to incrementally merge segments.
+
+    """
+    params = (
+        int(length_threshold),
+        float(distance_threshold),
+        float(canny_th1),
+        float(canny_th2),
+        int(canny_aperture_size),
+        bool(do_merge)
+    )
+    detectors = getattr(_line_detectors, 'detectors', None)
+    if detectors is None:
+        detectors = _line_detectors.detectors = {}
+    detector = detectors.get(params)
+    if detector is None:
+        # The parameters are passed positionally, as their keyword names
+        # differ between OpenCV versions
+        detector = detectors[params] = cv2.ximgproc.createFastLineDetector(
+            *params
+        )
+    return detector
+
+
 def detect_edges(
     image: np.ndarray,
     remove_parallel: bool = True,
-    max_line_dist: Optional[float] = None
+    max_line_dist: Optional[float] = None,
+    parallel_method: str = 'vectorized',
+    length_threshold: int = 10,
+    distance_threshold: float = 1.41421356,
+    canny_th1: float = 50.,
+    canny_th2: float = 50.,
+    canny_aperture_size: int = 7,
+    do_merge: bool = False
 ) -> np.ndarray:
     """
     Detects edges (lines) in the given `image` using the probabilistic
     Hough line transform.
 
     Args:
-        image: The image array.
+        image: The image array. A single-channel uint8 image is used as is,
+               without copying.
         remove_parallel: Flag indicating whether nearby parallel edges should be
                          filtered.
         max_line_dist: Maximum distance between lines for them to be considered
                        adjacent to one another. Defaults to the x-size of the
                        image divided by 200.
+        parallel_method: The engine used to filter parallel edges - see
+                         `remove_parallel_edges`. 'grid' is recommended for
+                         images with very many segments.
+        length_threshold: Segments shorter than this are discarded by the line
+                          detector. Raising this reduces the number of short
+                          segments passed to the parallel edge filter.
+        distance_threshold: Points further than this from a hypothesis line
+                            segment are regarded as outliers.
+        canny_th1: First threshold for the hysteresis procedure of Canny().
+        canny_th2: Second threshold for the hysteresis procedure of Canny().
+        canny_aperture_size: Aperture size of the Sobel operator of Canny().
+        do_merge: Whether the line detector should incrementally merge
+                  segments.
 
     """
-    image = image.astype(np.uint8)
-
-    detector = cv2.ximgproc.createFastLineDetector(
-        _canny_aperture_size=7
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image = image.astype(np.uint8, copy=False)
+
+    detector = get_line_detector(
+        length_threshold,
+        distance_threshold,
+        canny_th1,
+        canny_th2,
+        canny_aperture_size,
+        do_merge
     )
     lines = detector.detect(image)
 
@@ -157,6 +675,10 @@ def detect_edges(
     if remove_parallel:
         if max_line_dist is None:
             max_line_dist = image.shape[0] / 200
-        lines = remove_parallel_edges(lines, max_line_dist=max_line_dist)
+        lines = remove_parallel_edges(
+            lines,
+            max_line_dist=max_line_dist,
+            method=parallel_method
+        )
 
     return lines
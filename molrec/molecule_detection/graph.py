@@ -0,0 +1,377 @@
+"""
+This module provides the construction of a molecular graph from the detected
+edges, connecting each edge to the vertices at its ends.
+
+"""
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from . import grid, line_utils
+from .feature_detection import get_vertices_from_edges
+
+
+class MoleculeGraph:
+    """
+    An undirected graph of the vertices and edges of a molecule, with its
+    adjacency and incidence in compressed sparse row (CSR) form.
+
+    The neighbours of vertex `v` are `indices[indptr[v]:indptr[v + 1]]`, and
+    the edges joining `v` to them are `edge_index[indptr[v]:indptr[v + 1]]`.
+
+    """
+    __slots__ = (
+        'vertices',
+        'edges',
+        'segment_index',
+        'indptr',
+        'indices',
+        'edge_index'
+    )
+
+    def __init__(
+            self,
+            vertices: np.ndarray,
+            edges: np.ndarray,
+            segment_index: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            vertices: V x 2 array of vertex coordinates.
+            edges: E x 2 array of the vertex indices joined by each edge.
+            segment_index: The index of the detected segment from which each
+                           edge derives. Defaults to the index of the edge.
+
+        """
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.edges = np.ascontiguousarray(edges, dtype=np.int32).reshape(-1, 2)
+        self.segment_index = np.ascontiguousarray(
+            np.arange(len(self.edges)) if segment_index is None
+            else segment_index,
+            dtype=np.int32
+        )
+
+        # Each edge appears in the rows of both of its vertices
+        rows = np.concatenate([self.edges[:, 0], self.edges[:, 1]])
+        cols = np.concatenate([self.edges[:, 1], self.edges[:, 0]])
+        edge_ids = np.tile(np.arange(len(self.edges), dtype=np.int32), 2)
+        order = np.lexsort((cols, rows))
+        self.indptr = np.zeros(len(self.vertices) + 1, dtype=np.int32)
+        np.cumsum(
+            np.bincount(rows, minlength=len(self.vertices)),
+            out=self.indptr[1:]
+        )
+        self.indices = cols[order]
+        self.edge_index = edge_ids[order]
+
+    @property
+    def n_vertices(self) -> int:
+        return len(self.vertices)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edges)
+
+    def degrees(self) -> np.ndarray:
+        """The number of edges incident to each vertex."""
+        return np.diff(self.indptr)
+
+    def neighbours(self, vertex: int) -> np.ndarray:
+        """The vertices adjacent to `vertex`, in ascending order."""
+        return self.indices[self.indptr[vertex]:self.indptr[vertex + 1]]
+
+    def incident_edges(self, vertex: int) -> np.ndarray:
+        """
+        The edges incident to `vertex`, in the order of `neighbours`.
+
+        """
+        return self.edge_index[self.indptr[vertex]:self.indptr[vertex + 1]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Converts the graph to a JSON-serializable dictionary of the vertex
+        coordinates and the vertex index pairs of the edges.
+
+        """
+        return {
+            'vertices': self.vertices.tolist(),
+            'edges': self.edges.tolist()
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f'{type(self).__name__}({self.n_vertices} vertices, '
+            f'{self.n_edges} edges)'
+        )
+
+
+def _snap_points(
+        points: np.ndarray,
+        vertices: np.ndarray,
+        tolerance: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the nearest of the `vertices` within `tolerance` of each of the
+    `points`, hashing the vertices into grid cells of size `tolerance`.
+
+    Returns:
+        Tuple of the index of the nearest vertex of each point (-1 where there
+        is none within `tolerance`) and the distance to it.
+
+    """
+    nearest = np.full(len(points), -1, dtype=np.int64)
+    distances = np.full(len(points), np.inf)
+    if not len(points) or not len(vertices):
+        return nearest, distances
+
+    cell_size = max(tolerance, 1)
+    origin = np.minimum(points.min(axis=0), vertices.min(axis=0)) - cell_size
+    vertex_cells = np.floor((vertices - origin) / cell_size).astype(np.int64)
+    point_cells = np.floor((points - origin) / cell_size).astype(np.int64)
+    n_cells_x = int(max(vertex_cells[:, 0].max(), point_cells[:, 0].max())) + 2
+
+    neighbour_offsets = np.array([
+        d_y * n_cells_x + d_x for d_y in (-1, 0, 1) for d_x in (-1, 0, 1)
+    ])
+    point_keys = point_cells[:, 1] * n_cells_x + point_cells[:, 0]
+    ii, jj = grid.join_cell_keys(
+        vertex_cells[:, 1] * n_cells_x + vertex_cells[:, 0],
+        np.arange(len(vertices)),
+        (point_keys[:, None] + neighbour_offsets).ravel(),
+        np.repeat(np.arange(len(points)), len(neighbour_offsets))
+    )
+
+    pair_distances = line_utils.calculate_point_distances(
+        points[ii], vertices[jj], pairwise=False
+    )
+    close = pair_distances <= tolerance
+    ii, jj, pair_distances = ii[close], jj[close], pair_distances[close]
+    # The nearest vertex of each point is first once sorted by distance
+    order = np.lexsort((pair_distances, ii))
+    ii, jj, pair_distances = ii[order], jj[order], pair_distances[order]
+    first = np.unique(ii, return_index=True)[1]
+    nearest[ii[first]] = jj[first]
+    distances[ii[first]] = pair_distances[first]
+    return nearest, distances
+
+
+def _find_junctions(
+        vertices: np.ndarray,
+        edges: np.ndarray,
+        tolerance: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Identifies T-junctions - vertices lying within `tolerance` of the
+    interior of an edge, but further than `tolerance` from both of its ends.
+
+    Returns:
+        Three equal length arrays - the edge, the vertex and the position of
+        the projection of the vertex along the edge (from 0 at its start to 1
+        at its end) of each junction.
+
+    """
+    segments = np.concatenate(
+        [vertices[edges[:, 0]], vertices[edges[:, 1]]], axis=1
+    ).astype(np.float64)
+    min_x = np.minimum(segments[:, 0], segments[:, 2]) - tolerance
+    max_x = np.maximum(segments[:, 0], segments[:, 2]) + tolerance
+    min_y = np.minimum(segments[:, 1], segments[:, 3]) - tolerance
+    max_y = np.maximum(segments[:, 1], segments[:, 3]) + tolerance
+
+    # Coarse cells, such that a typical edge spans only a few of them
+    cell_size = max(
+        tolerance, float(np.median(np.maximum(max_x - min_x, max_y - min_y))), 1
+    )
+    origin_x = min(min_x.min(), vertices[:, 0].min())
+    origin_y = min(min_y.min(), vertices[:, 1].min())
+
+    def to_cell(values, origin):
+        return np.floor((values - origin) / cell_size).astype(np.int64)
+
+    # Edges are inserted in the cells covered by their expanded bounding
+    # boxes, and each vertex looks up its own cell
+    insert_owners, insert_x, insert_y = grid.expand_grid_cells(
+        to_cell(min_x, origin_x),
+        to_cell(min_y, origin_y),
+        to_cell(max_x, origin_x),
+        to_cell(max_y, origin_y)
+    )
+    vertex_x = to_cell(vertices[:, 0], origin_x)
+    vertex_y = to_cell(vertices[:, 1], origin_y)
+    n_cells_x = int(max(insert_x.max(), vertex_x.max())) + 1
+    vertex_ids, edge_ids = grid.join_cell_keys(
+        insert_y * n_cells_x + insert_x,
+        insert_owners,
+        vertex_y * n_cells_x + vertex_x,
+        np.arange(len(vertices))
+    )
+
+    # A vertex at either end of the edge is not a junction
+    interior = (
+        (edges[edge_ids, 0] != vertex_ids) & (edges[edge_ids, 1] != vertex_ids)
+    )
+    vertex_ids, edge_ids = vertex_ids[interior], edge_ids[interior]
+
+    points = vertices[vertex_ids].astype(np.float64)
+    candidates = segments[edge_ids]
+    lengths = line_utils.calculate_segment_lengths(candidates)
+    delta = candidates[:, 2:] - candidates[:, :2]
+    t = np.einsum('ij,ij->i', points - candidates[:, :2], delta) / np.where(
+        lengths == 0, 1, lengths ** 2
+    )
+    junction = (
+        (line_utils.calculate_point_segment_distances(
+            candidates, points, pairwise=False
+        ) <= tolerance)
+        & (t * lengths > tolerance)
+        & ((1 - t) * lengths > tolerance)
+    )
+    return edge_ids[junction], vertex_ids[junction], t[junction]
+
+
+def _split_edges(
+        edges: np.ndarray,
+        segment_index: np.ndarray,
+        junction_edges: np.ndarray,
+        junction_vertices: np.ndarray,
+        junction_positions: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Splits each edge at its junctions into a chain of edges, ordered along the
+    edge.
+
+    Returns:
+        Tuple of the new edges and the segment index of each.
+
+    """
+    split = np.unique(junction_edges)
+    # Each split edge becomes the sequence of its start, its junctions in
+    # order of position and its end
+    sequence_edges = np.concatenate([split, junction_edges, split])
+    sequence_positions = np.concatenate([
+        np.full(len(split), -np.inf),
+        junction_positions,
+        np.full(len(split), np.inf)
+    ])
+    sequence_vertices = np.concatenate(
+        [edges[split, 0], junction_vertices, edges[split, 1]]
+    )
+    order = np.lexsort((sequence_positions, sequence_edges))
+    sequence_edges = sequence_edges[order]
+    sequence_vertices = sequence_vertices[order]
+    consecutive = sequence_edges[:-1] == sequence_edges[1:]
+
+    kept = np.ones(len(edges), dtype=bool)
+    kept[split] = False
+    new_edges = np.stack([
+        sequence_vertices[:-1][consecutive], sequence_vertices[1:][consecutive]
+    ], axis=1)
+    new_segments = segment_index[sequence_edges[:-1][consecutive]]
+
+    # Keep the edges in order of the segment from which they derive
+    edges = np.concatenate([edges[kept], new_edges])
+    segment_index = np.concatenate([segment_index[kept], new_segments])
+    order = np.argsort(segment_index, kind='stable')
+    return edges[order], segment_index[order]
+
+
+def build_graph(
+        edges: np.ndarray,
+        vertices: Optional[np.ndarray] = None,
+        image_size: Optional[Tuple[int, int]] = None,
+        tolerance: Optional[float] = None,
+        split_junctions: bool = True,
+        vertex_index: Optional[np.ndarray] = None
+) -> MoleculeGraph:
+    """
+    Builds the graph of the molecule from the detected edges.
+
+    The endpoints of each edge are snapped to the nearest vertex within
+    `tolerance`, found by hashing the vertices into grid cells, unless their
+    vertices are given by `vertex_index`. Endpoints with no such vertex
+    become vertices of their own. Edges whose ends snap to the same vertex,
+    and duplicate edges, are removed.
+
+    If `split_junctions` is True, an edge is split where the vertex at the end
+    of another edge lies on its interior (a T-junction).
+
+    Args:
+        edges: Array of line coordinates (start and end point of each line).
+        vertices: Array of vertex coordinates, e.g. from
+                  `get_vertices_from_edges`. If not provided, the vertices are
+                  identified from the `edges` and the endpoints are assigned
+                  to them directly.
+        image_size: The dimensions of the image.
+        tolerance: The maximum distance between an edge endpoint and its
+                   vertex, or between a vertex and the edge on which it lies.
+                   If not provided, it is defined adaptively based on
+                   `image_size`, as for `get_vertices_from_edges`.
+        split_junctions: Whether to split edges at T-junctions.
+        vertex_index: N x 2 array of the indices of the `vertices` of the
+                      start and end point of each edge, as returned by
+                      `get_vertices_from_edges` with `return_index`. Since
+                      the clustering is transitive, an endpoint may lie
+                      further than `tolerance` from its vertex, so this
+                      avoids snapping it to another vertex, or to none.
+
+    Returns:
+        The molecular graph.
+
+    Raises:
+        ValueError: If neither `tolerance` nor `image_size` is provided, or
+                    `vertex_index` is provided without `vertices` or does not
+                    match the `edges`.
+
+    """
+    if tolerance is None:
+        if image_size is None:
+            raise ValueError('Either tolerance or image_size is required')
+        tolerance = image_size[0] // 50
+
+    endpoints = np.reshape(edges, (-1, 2)).astype(np.float64)
+    if vertex_index is not None:
+        if vertices is None:
+            raise ValueError('vertex_index requires the vertices')
+        labels = np.asarray(vertex_index, dtype=np.int64).ravel()
+        if len(labels) != len(endpoints):
+            raise ValueError(
+                f'vertex_index has {len(labels)} endpoints, but the edges '
+                f'have {len(endpoints)}'
+            )
+        vertices = np.reshape(vertices, (-1, 2)).astype(np.float64)
+    elif vertices is None:
+        vertices, labels = get_vertices_from_edges(
+            edges, image_size, tolerance=tolerance, return_index=True
+        )
+        vertices = np.reshape(vertices, (-1, 2)).astype(np.float64)
+        labels = labels.ravel()
+    else:
+        vertices = np.reshape(vertices, (-1, 2)).astype(np.float64)
+        labels, _ = _snap_points(endpoints, vertices, tolerance)
+        unmatched = labels < 0
+        if unmatched.any():
+            new_vertices, inverse = np.unique(
+                endpoints[unmatched], axis=0, return_inverse=True
+            )
+            labels[unmatched] = len(vertices) + inverse.ravel()
+            vertices = np.concatenate([vertices, new_vertices])
+
+    graph_edges = labels.reshape(-1, 2)
+    segment_index = np.arange(len(graph_edges))
+    if split_junctions and len(graph_edges):
+        junctions = _find_junctions(vertices, graph_edges, tolerance)
+        if len(junctions[0]):
+            graph_edges, segment_index = _split_edges(
+                graph_edges, segment_index, *junctions
+            )
+
+    # Remove self-loops and duplicate edges, keeping the first of each
+    proper = graph_edges[:, 0] != graph_edges[:, 1]
+    graph_edges, segment_index = graph_edges[proper], segment_index[proper]
+    first = np.sort(np.unique(
+        np.sort(graph_edges, axis=1), axis=0, return_index=True
+    )[1])
+
+    return MoleculeGraph(
+        vertices, graph_edges[first], segment_index=segment_index[first]
+    )
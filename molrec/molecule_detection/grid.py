@@ -0,0 +1,71 @@
+"""
+This module provides the hashed spatial grid used to find nearby items (e.g.
+the endpoints or bounding boxes of segments) without comparing every pair.
+
+Items are inserted under integer cell keys and looked up by the keys of the
+cells around them, with the lookups joined by sorting rather than through a
+Python dictionary.
+
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+def join_cell_keys(
+        insert_keys: np.ndarray,
+        insert_owners: np.ndarray,
+        query_keys: np.ndarray,
+        query_owners: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Joins hashed grid cell lookups against the inserted cells, by sorting the
+    inserted keys rather than building a Python dictionary.
+
+    Args:
+        insert_keys: Cell keys under which items are inserted.
+        insert_owners: The item inserted under each of `insert_keys`.
+        query_keys: Cell keys to look up.
+        query_owners: The item looking up each of `query_keys`.
+
+    Returns:
+        Two equal length arrays - the querying and inserted item of each match.
+
+    """
+    order = np.argsort(insert_keys, kind='stable')
+    insert_keys, insert_owners = insert_keys[order], insert_owners[order]
+
+    lower = np.searchsorted(insert_keys, query_keys, side='left')
+    counts = np.searchsorted(insert_keys, query_keys, side='right') - lower
+    positions = np.repeat(lower, counts) + np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    return np.repeat(query_owners, counts), insert_owners[positions]
+
+
+def expand_grid_cells(
+        min_x: np.ndarray,
+        min_y: np.ndarray,
+        max_x: np.ndarray,
+        max_y: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Enumerates the grid cells covered by each of a set of (inclusive) cell
+    ranges.
+
+    Returns:
+        Three equal length arrays - the index of the range to which each
+        covered cell belongs, and the x and y indices of the cell.
+
+    """
+    n_x = max_x - min_x + 1
+    counts = n_x * (max_y - min_y + 1)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    return (
+        owners,
+        min_x[owners] + offsets % n_x[owners],
+        min_y[owners] + offsets // n_x[owners]
+    )
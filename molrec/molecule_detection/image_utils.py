@@ -2,8 +2,82 @@
 This module provides utility functions for working with images.
 
 """
+import mmap
+import os
+from typing import Union
 
 import cv2
+import numpy as np
+
+ImageSource = Union[
+    str, os.PathLike, bytes, bytearray, memoryview, mmap.mmap, np.ndarray
+]
+
+
+class ImageDecodeError(ValueError):
+    """Raised if an image cannot be read or decoded."""
+
+
+def _convert_decoded(image: np.ndarray, grayscale: bool) -> np.ndarray:
+    """
+    Converts an already-decoded grayscale, BGR or BGRA image to grayscale or
+    BGR, returning it as is if already in the requested format.
+
+    """
+    if image.ndim == 2:
+        return image if grayscale else cv2.cvtColor(
+            image, cv2.COLOR_GRAY2BGR
+        )
+    if image.ndim == 3 and image.shape[2] in (1, 3, 4):
+        if image.shape[2] == 1:
+            return _convert_decoded(image[:, :, 0], grayscale)
+        if image.shape[2] == 4:
+            return cv2.cvtColor(
+                image,
+                cv2.COLOR_BGRA2GRAY if grayscale else cv2.COLOR_BGRA2BGR
+            )
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if grayscale else image
+    raise ImageDecodeError(f'Unsupported image shape {image.shape}')
+
+
+def read_image(source: ImageSource, grayscale: bool = False) -> np.ndarray:
+    """
+    Reads an image from a file path, from the encoded contents of an image
+    file, or from an already-decoded image.
+
+    Encoded contents are decoded from a view of their buffer, so that no
+    temporary file or copy is made - e.g. a memoryview of an mmap slice is
+    decoded in place.
+
+    Args:
+        source: Path to the image file; the contents of the file as bytes,
+                a bytearray, memoryview, mmap or one dimensional uint8 array;
+                or a decoded two or three dimensional image array.
+        grayscale: Whether to decode the image directly to a single channel,
+                   rather than to BGR.
+
+    Returns:
+        The decoded uint8 image. A decoded `source` already in the requested
+        format is returned as is, without copying.
+
+    Raises:
+        ImageDecodeError: If the image cannot be read or decoded.
+
+    """
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    if isinstance(source, np.ndarray) and source.ndim != 1:
+        image = _convert_decoded(source, grayscale)
+    elif isinstance(
+            source, (bytes, bytearray, memoryview, mmap.mmap, np.ndarray)
+    ):
+        image = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flags)
+        if image is None:
+            raise ImageDecodeError('Unable to decode image')
+    else:
+        image = cv2.imread(os.fspath(source), flags)
+        if image is None:
+            raise ImageDecodeError(f'Unable to read image {source}')
+    return image
 
 
 def annotate_image(image, corners=None, lines=None):
@@ -11,7 +85,13 @@ def annotate_image(image, corners=None, lines=None):
     Annotates the provided `image` using circles for `corners` and lines for
     `lines`.
 
+    A grayscale image is first converted to a new BGR image, so that the
+    annotations are coloured.
+
     """
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
     if corners is not None:
         for i in corners:
             x, y = i.ravel()
@@ -1,6 +1,13 @@
 """
 This module defines functions to calculate line properties.
 
+Each scalar function, operating on the coordinates of a single segment or
+point, has an array-native variant (named in the plural) which operates on
+whole batches at once. Segment arrays have shape (N, 4), with rows of
+(x0, y0, x1, y1), and point arrays have shape (M, 2), with rows of (x, y).
+The array variants follow the same arithmetic as the scalar functions, so that
+their results agree exactly.
+
 """
 import math
 from typing import Tuple
@@ -130,7 +137,10 @@ def calculate_point_segment_distance(
         Shortest distance between `point` and the specified line segment.
 
     """
-    squared_length = calculate_segment_length_squared(*start, *end)
+    x0, y0 = start
+    x1, y1 = end
+    px, py = point
+    squared_length = calculate_segment_length_squared(x0, y0, x1, y1)
 
     if squared_length == 0.:
         # Start point == end point
@@ -140,20 +150,15 @@ def calculate_point_segment_distance(
     # start + t(end - start). We find the projection of the point onto the line.
     # It falls where t = [(point - start).(end - start)] / | end - start | ^ 2
     # We clamp t from [0, 1] to handle points outside the line segment.
-
-    start_arr = np.array(start)
-    end_arr = np.array(end)
-    point_arr = np.array(point)
+    delta_x = x1 - x0
+    delta_y = y1 - y0
     t = max(
         0,
-        min(
-            1,
-            np.dot(point_arr - start_arr, end_arr - start_arr) / squared_length
-        )
+        min(1, ((px - x0) * delta_x + (py - y0) * delta_y) / squared_length)
     )
 
     # Projection falls on the segment
-    projection = start_arr + t * (end_arr - start_arr)
+    projection = (x0 + t * delta_x, y0 + t * delta_y)
 
     return calculate_point_distance(point, projection)
 
@@ -180,7 +185,201 @@ def calculate_parallel_distance(c1: float, c2: float, m: float) -> float:
     Calculates the distance between two parallel lines based on their
     intercepts and shared gradient.
 
-    c1:
+    Args:
+        c1: y-intercept of the first line.
+        c2: y-intercept of the second line.
+        m: gradient of the lines.
+
+    Returns:
+        Perpendicular distance between the lines. If the lines are vertical,
+        this is NaN.
+
+    """
+    return float(calculate_parallel_distances(c1, c2, m))
+
+
+def _unpack_segments(segments: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Splits an (..., 4) array of segments into its x0, y0, x1 and y1 arrays.
+
+    """
+    return tuple(np.moveaxis(np.asarray(segments), -1, 0))
+
+
+def calculate_segment_lengths_squared(segments: np.ndarray) -> np.ndarray:
+    """
+    Calculates the squares of the lengths of line segments.
+
+    Args:
+        segments: N x 4 array of segment start and end points.
+
+    Returns:
+        Length N array of squared segment lengths.
+
+    """
+    return calculate_segment_length_squared(*_unpack_segments(segments))
+
+
+def calculate_segment_lengths(segments: np.ndarray) -> np.ndarray:
+    """
+    Calculates the lengths of line segments.
+
+    Args:
+        segments: N x 4 array of segment start and end points.
+
+    Returns:
+        Length N array of segment lengths.
+
+    """
+    return np.sqrt(calculate_segment_lengths_squared(segments))
+
+
+def calculate_gradients(segments: np.ndarray) -> np.ndarray:
+    """
+    Calculates the gradients of the lines through line segments.
+
+    Args:
+        segments: N x 4 array of segment start and end points.
+
+    Returns:
+        Length N array of gradients. The gradients of vertical lines are NaN.
+
+    """
+    x0, y0, x1, y1 = _unpack_segments(segments)
+    delta_x = x1 - x0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(delta_x == 0, np.nan, (y1 - y0) / delta_x)
+
+
+def calculate_intercepts(
+        points: np.ndarray,
+        gradients: np.ndarray
+) -> np.ndarray:
+    """
+    Calculates the y-intercepts of lines given a point on each line and their
+    gradients.
+
+    Args:
+        points: N x 2 array of points, one on each line.
+        gradients: Length N array of line gradients.
+
+    Returns:
+        Length N array of y-intercepts, which are NaN for NaN gradients.
+
+    """
+    x, y = np.moveaxis(np.asarray(points), -1, 0)
+    return calculate_intercept(x, y, np.asarray(gradients))
+
+
+def calculate_midpoints(segments: np.ndarray) -> np.ndarray:
+    """
+    Calculates the midpoints of line segments.
+
+    Args:
+        segments: N x 4 array of segment start and end points.
+
+    Returns:
+        N x 2 array of segment midpoints.
+
+    """
+    return np.stack(calculate_midpoint(*_unpack_segments(segments)), axis=-1)
+
+
+def calculate_point_distances(
+        a: np.ndarray,
+        b: np.ndarray,
+        pairwise: bool = True
+) -> np.ndarray:
+    """
+    Calculates the distances between the points in `a` and the points in `b`.
+
+    Args:
+        a: N x 2 array of points.
+        b: M x 2 array of points.
+        pairwise: If True (default), the distance between every point in `a`
+                  and every point in `b` is calculated. Otherwise, `a` and `b`
+                  are broadcast against one another and the distances are
+                  calculated elementwise.
+
+    Returns:
+        N x M matrix of distances, or the elementwise distances if `pairwise`
+        is False.
+
+    """
+    a, b = np.asarray(a), np.asarray(b)
+    if pairwise:
+        a, b = a[:, None], b[None]
+    return calculate_segment_lengths(np.concatenate(
+        np.broadcast_arrays(a, b), axis=-1
+    ))
+
+
+def calculate_point_segment_distances(
+        segments: np.ndarray,
+        points: np.ndarray,
+        pairwise: bool = True
+) -> np.ndarray:
+    """
+    Calculates the shortest distances between line `segments` and `points`.
+
+    Each point is projected onto the line extending each segment, with the
+    projection clamped to lie on the segment.
+
+    Args:
+        segments: N x 4 array of segment start and end points.
+        points: M x 2 array of points.
+        pairwise: If True (default), the distance between every segment and
+                  every point is calculated. Otherwise, `segments` and
+                  `points` are broadcast against one another and the distances
+                  are calculated elementwise.
+
+    Returns:
+        N x M matrix of distances, or the elementwise distances if `pairwise`
+        is False.
+
+    """
+    segments, points = np.asarray(segments), np.asarray(points)
+    if pairwise:
+        segments, points = segments[:, None], points[None]
+
+    x0, y0, x1, y1 = _unpack_segments(segments)
+    px, py = np.moveaxis(points, -1, 0)
+
+    delta_x = x1 - x0
+    delta_y = y1 - y0
+    squared_length = calculate_segment_length_squared(x0, y0, x1, y1)
+
+    # As for calculate_point_segment_distance, with t clamped to [0, 1]. Where
+    # the start point == end point, the dot product is zero and so the
+    # projection is the start point.
+    t = ((px - x0) * delta_x + (py - y0) * delta_y) / np.where(
+        squared_length == 0, 1, squared_length
+    )
+    t = np.clip(t, 0, 1)
+
+    return calculate_segment_lengths(np.stack(
+        np.broadcast_arrays(px, py, x0 + t * delta_x, y0 + t * delta_y),
+        axis=-1
+    ))
+
+
+def calculate_parallel_distances(
+        c1: np.ndarray,
+        c2: np.ndarray,
+        m: np.ndarray
+) -> np.ndarray:
+    """
+    Calculates the distances between pairs of parallel lines based on their
+    intercepts and shared gradients.
+
+    Args:
+        c1: Array of y-intercepts of the first line of each pair.
+        c2: Array of y-intercepts of the second line of each pair.
+        m: Array of gradients of each pair.
+
+    Returns:
+        Array of perpendicular distances, which are NaN for vertical lines.
 
     """
-    return abs(c1 - c2) / (m * m + 1) ** 0.5
+    c1, c2, m = np.asarray(c1), np.asarray(c2), np.asarray(m)
+    return np.abs(c1 - c2) / np.sqrt(m * m + 1)
@@ -1,4 +1,4 @@
-from typing import Tuple, Union
+from typing import Optional, Tuple, Union
 
 import cv2
 import numpy as np
@@ -6,7 +6,8 @@ import numpy as np
 
 def create_mask(
         shape: Tuple[int, ...],
-        mask_rectangles: np.ndarray
+        mask_rectangles: np.ndarray,
+        single_channel: bool = False
 ) -> np.ndarray:
     """
     Constructs an image mask with masked rectangular regions.
@@ -18,11 +19,16 @@ def create_mask(
         shape: The shape of the mask.
         mask_rectangles: The rectangular regions to mask, defined by start and
                          end coordinates.
+        single_channel: Whether to construct a single-channel mask for a
+                        colour image `shape`, which `apply_mask` applies to
+                        every channel.
 
     Returns:
         Numpy array mask.
 
     """
+    if single_channel:
+        shape = shape[:2]
     mask = np.zeros(shape, dtype=np.uint8)
     mask.fill(255)
 
@@ -44,13 +50,161 @@ def apply_mask(
 
     Args:
         image: The numpy array image.
-        mask: The mask to apply to `image`.
+        mask: The mask to apply to `image`. A single-channel mask may be
+              applied to a colour image.
         apply_colour: The desired colour of the masked region.
 
     """
     masked_image = image.copy()
-    if len(image.shape) == 2:
+    if len(mask.shape) == 2:
         masked_image[mask == 0] = apply_colour
     else:
         masked_image[np.all(mask == (0, 0, 0), axis=-1)] = apply_colour
     return masked_image
+
+
+def normalize_rectangles(
+        rectangles: np.ndarray,
+        shape: Tuple[int, ...]
+) -> np.ndarray:
+    """
+    Converts rectangles defined by (inclusive) start and end coordinates, in
+    either order, to half-open (start_x, start_y, end_x, end_y) ranges
+    clipped to an image of the given `shape`.
+
+    Returns:
+        N x 4 array of the non-empty rectangles.
+
+    """
+    rectangles = np.reshape(rectangles, (-1, 4)).astype(np.int64)
+    start = np.minimum(rectangles[:, :2], rectangles[:, 2:])
+    end = np.maximum(rectangles[:, :2], rectangles[:, 2:]) + 1
+    limits = np.array([shape[1], shape[0]])
+    start = np.clip(start, 0, limits)
+    end = np.clip(end, 0, limits)
+    non_empty = (end > start).all(axis=1)
+    return np.concatenate([start, end], axis=1)[non_empty]
+
+
+def _drop_contained(rectangles: np.ndarray) -> np.ndarray:
+    """
+    Drops the rectangles contained in another, keeping the first of any
+    identical rectangles.
+
+    """
+    start_x, start_y, end_x, end_y = rectangles.T
+    # Whether rectangle i contains rectangle j
+    contains = (
+        (start_x[:, None] <= start_x) & (start_y[:, None] <= start_y)
+        & (end_x[:, None] >= end_x) & (end_y[:, None] >= end_y)
+    )
+    # Of two identical rectangles, only the later is dropped
+    contains &= ~(contains.T & np.tril(np.ones_like(contains)))
+    return rectangles[~contains.any(axis=0)]
+
+
+def _join_aligned(rectangles: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Joins the rectangles which span the same rows (`axis` 0) or columns
+    (`axis` 1) and overlap or touch, by sorting and sweeping each group of
+    aligned rectangles. Each joined rectangle takes the place of the first
+    of its parts.
+
+    """
+    start, end = rectangles[:, axis], rectangles[:, axis + 2]
+    group_start = rectangles[:, 1 - axis]
+    group_end = rectangles[:, 3 - axis]
+    order = np.lexsort((start, group_end, group_start))
+    start, end = start[order], end[order]
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (
+        (np.diff(group_start[order]) != 0) | (np.diff(group_end[order]) != 0)
+    )
+
+    # Offset each group beyond the previous, so that the running maximum of
+    # the ends does not carry over between groups
+    offsets = np.cumsum(new_group) * (end.max() - start.min() + 2)
+    reach = np.maximum.accumulate(end + offsets)
+    new_run = new_group.copy()
+    new_run[1:] |= start[1:] + offsets[1:] > reach[:-1]
+
+    run_starts = np.flatnonzero(new_run)
+    joined = rectangles[np.minimum.reduceat(order, run_starts)]
+    joined[:, axis] = np.minimum.reduceat(start, run_starts)
+    joined[:, axis + 2] = np.maximum.reduceat(end, run_starts)
+    return joined[np.argsort(np.minimum.reduceat(order, run_starts))]
+
+
+def merge_rectangles(rectangles: np.ndarray) -> np.ndarray:
+    """
+    Merges overlapping half-open rectangles where this does not change the
+    area they cover: rectangles contained in another are dropped, and
+    rectangles spanning the same rows (or columns) which overlap or touch
+    are joined.
+
+    Each pass drops every contained rectangle and joins every aligned group
+    at once, so that the number of passes is small, rather than merging one
+    pair at a time.
+
+    Args:
+        rectangles: N x 4 array of half-open (start_x, start_y, end_x, end_y)
+                    ranges.
+
+    Returns:
+        Array of the merged rectangles, covering the same area, in the order
+        of the first rectangle merged into each.
+
+    """
+    rectangles = np.array(rectangles, dtype=np.int64).reshape(-1, 4)
+    n_rectangles = None
+    while len(rectangles) > 1 and len(rectangles) != n_rectangles:
+        n_rectangles = len(rectangles)
+        rectangles = _drop_contained(rectangles)
+        rectangles = _join_aligned(rectangles, 0)
+        rectangles = _join_aligned(rectangles, 1)
+    return rectangles
+
+
+def mask_rectangles(
+        image: np.ndarray,
+        rectangles: np.ndarray,
+        apply_colour: Union[int, Tuple[int, int, int]],
+        out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Fills rectangular regions of `image` with `apply_colour`, writing only to
+    the covered slices rather than constructing a full-size mask.
+
+    Args:
+        image: The numpy array image, which is modified in place unless `out`
+               is provided.
+        rectangles: The rectangular regions to mask, defined by (inclusive)
+                    start and end coordinates, as for `create_mask`. Regions
+                    outside the image are clipped.
+        apply_colour: The desired colour of the masked regions.
+        out: An array of the same shape as `image` into which to write the
+             masked image, leaving `image` unchanged.
+
+    Returns:
+        The masked image - `out` if provided, otherwise `image`.
+
+    Raises:
+        ValueError: If `out` does not have the shape of `image`.
+
+    """
+    if out is None:
+        out = image
+    elif out is not image:
+        if out.shape != image.shape:
+            raise ValueError(
+                f'Output shape {out.shape} does not match image shape '
+                f'{image.shape}'
+            )
+        np.copyto(out, image)
+
+    for start_x, start_y, end_x, end_y in merge_rectangles(
+            normalize_rectangles(rectangles, image.shape)
+    ).tolist():
+        out[start_y:end_y, start_x:end_x] = apply_colour
+
+    return out
@@ -0,0 +1,169 @@
+"""
+This module provides a content-addressed cache of OCR results, so that
+repeated labels (e.g. "OH", "NH2") need only be recognized once.
+
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+
+class OCRCache:
+    """
+    A bounded, in-memory LRU cache of recognized text, with an optional
+    on-disk tier.
+
+    Entries are keyed by a hash of the normalized region of interest: the
+    region is converted to grayscale, binarized with Otsu's method and resized
+    to a canonical height, so that the same label rendered at slightly
+    different sizes or contrast shares a key.
+
+    The cache is safe to share between threads.
+
+    """
+    def __init__(
+            self,
+            max_entries: int = 4096,
+            directory: Optional[str] = None,
+            canonical_height: int = 32
+    ):
+        """
+        Args:
+            max_entries: The maximum number of entries held in memory, beyond
+                         which the least recently used are evicted.
+            directory: Directory in which to persist entries, if any. Entries
+                       evicted from memory are retrieved from here.
+            canonical_height: The height to which regions are resized before
+                              hashing.
+
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.canonical_height = canonical_height
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, roi: np.ndarray, namespace: str = '') -> str:
+        """
+        Computes the cache key of a region of interest.
+
+        Args:
+            roi: The BGR or grayscale region of interest.
+            namespace: Additional text to include in the key, such as the OCR
+                       configuration used to recognize the region.
+
+        Returns:
+            Hexadecimal digest of the normalized region.
+
+        """
+        if roi.ndim == 3:
+            roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        digest = hashlib.sha1(namespace.encode('utf-8'))
+        if roi.size:
+            roi = roi.astype(np.uint8, copy=False)
+            _, roi = cv2.threshold(
+                roi, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
+            )
+            width = max(
+                1, round(roi.shape[1] * self.canonical_height / roi.shape[0])
+            )
+            roi = cv2.resize(
+                roi,
+                (width, self.canonical_height),
+                interpolation=cv2.INTER_AREA
+            )
+            # Re-binarize after interpolation
+            roi = np.where(roi < 128, 0, 255).astype(np.uint8)
+        digest.update(np.array(roi.shape, dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(roi).tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.txt')
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Retrieves the text cached under `key`, if any.
+
+        """
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+
+        if self.directory is not None:
+            try:
+                with open(self._path(key), encoding='utf-8') as fh:
+                    text = fh.read()
+            except FileNotFoundError:
+                pass
+            else:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._insert(key, text)
+                return text
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, text: str):
+        """
+        Caches `text` under `key`.
+
+        """
+        with self._lock:
+            self._insert(key, text)
+
+        if self.directory is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write atomically, in case of concurrent readers
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                fh.write(text)
+            os.replace(tmp_path, path)
+
+    def _insert(self, key: str, text: str):
+        """Inserts an entry in memory. The lock must be held."""
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Clears the in-memory entries and resets the counters. Entries on disk
+        are retained.
+
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """The hit and miss counters and the number of entries in memory."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries)
+            }
@@ -0,0 +1,119 @@
+"""
+This module provides a reader for pack files - uncompressed tar archives of
+image files - which memory-maps the archive, so that each entry is accessed
+as a zero-copy view rather than read into memory.
+
+"""
+import mmap
+import tarfile
+from typing import Dict, Iterator, List, Tuple
+
+
+class PackReader:
+    """
+    Reads the entries of an uncompressed tar archive as memoryviews of the
+    memory-mapped archive.
+
+    The views may be passed directly to `process_molecule_image` or
+    `process_molecule_images`, which decode them in place:
+
+        with PackReader('images.tar') as pack:
+            for index, result in process_molecule_images(
+                    view for _, view in pack
+            ):
+                ...
+
+    Views must not be used after the reader is closed. The mapping is
+    released once the reader is closed and no views remain.
+
+    """
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Path to the archive.
+
+        Raises:
+            ValueError: If the file is not an uncompressed tar archive.
+
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            # Only the member headers are read to index the entries
+            with tarfile.open(fileobj=self._file, mode='r:') as archive:
+                self._entries: Dict[str, Tuple[int, int]] = {
+                    member.name: (member.offset_data, member.size)
+                    for member in archive.getmembers() if member.isfile()
+                }
+        except tarfile.ReadError as exc:
+            self._file.close()
+            raise ValueError(
+                f'{path} is not an uncompressed tar archive'
+            ) from exc
+
+        # mmap cannot map an empty file
+        self._mmap = mmap.mmap(
+            self._file.fileno(), 0, access=mmap.ACCESS_READ
+        ) if self._entries else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else None
+
+    @property
+    def names(self) -> List[str]:
+        """The names of the entries, in archive order."""
+        return list(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def __getitem__(self, name: str) -> memoryview:
+        """
+        Retrieves a zero-copy view of the contents of the entry `name`.
+
+        Raises:
+            KeyError: If there is no such entry.
+            ValueError: If the reader is closed.
+
+        """
+        offset, size = self._entries[name]
+        if self._file.closed:
+            raise ValueError('Pack file is closed')
+        if not size:
+            return memoryview(b'')
+        return self._view[offset:offset + size]
+
+    def __iter__(self) -> Iterator[Tuple[str, memoryview]]:
+        """
+        Yields:
+            Tuple of the name and a zero-copy view of the contents of each
+            entry, in archive order.
+
+        """
+        for name in self._entries:
+            yield name, self[name]
+
+    def close(self):
+        """
+        Closes the archive. The mapping itself is released once no views of
+        it remain.
+
+        """
+        try:
+            if self._view is not None:
+                self._view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            # Views are still exported - the mapping is released when they
+            # are garbage collected
+            pass
+        self._view = self._mmap = None
+        self._file.close()
+
+    def __enter__(self) -> 'PackReader':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
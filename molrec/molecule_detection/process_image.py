@@ -1,21 +1,445 @@
-from typing import Tuple
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait
+)
+from contextlib import contextmanager
+import inspect
+import os
+import queue
+import threading
+import time
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    Tuple,
+    Union
+)
 
-import cv2
 import numpy as np
 
-from . import feature_detection
+from . import feature_detection, text_detection
+from .image_utils import ImageSource, read_image
+from .masking import mask_rectangles, merge_rectangles, normalize_rectangles
+from .result import MoleculeImageResult
 
 
-def process_molecule_image(filename: str)\
-        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+@contextmanager
+def _timed(timings: Optional[Dict[str, float]], stage: str) -> Iterator[None]:
     """
+    Records the wall time of the enclosed `stage` in `timings`, if provided.
+
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = time.perf_counter() - start
+
+
+def _check_detector_params(detector_params: Optional[Mapping[str, Any]]):
+    """
+    Checks that `detector_params` are keyword arguments of
+    `feature_detection.detect_edges`.
+
+    Raises:
+        ValueError: If any parameter is unknown.
+
+    """
+    if not detector_params:
+        return
+    names = set(inspect.signature(feature_detection.detect_edges).parameters)
+    unknown = set(detector_params) - (names - {'image'})
+    if unknown:
+        raise ValueError(f'Unknown detector parameters: {sorted(unknown)}')
+
+
+def _detect_edges(
+        img: np.ndarray,
+        detector_params: Optional[Mapping[str, Any]] = None
+) -> np.ndarray:
+    """
+    Detects the edges of `img`, filtering parallel edges unless otherwise
+    specified by `detector_params`.
+
+    """
+    return feature_detection.detect_edges(
+        img, **{'remove_parallel': True, **(detector_params or {})}
+    )
+
+
+def process_molecule_image(
+        source: ImageSource,
+        timings: Optional[Dict[str, float]] = None,
+        keep_image: bool = False,
+        colour: bool = False,
+        mask_text: bool = False,
+        text_model: Optional[text_detection.EASTModel] = None,
+        detector_params: Optional[Mapping[str, Any]] = None
+) -> MoleculeImageResult:
+    """
+    Detects the edges and vertices of the molecule drawn in an image.
+
+    The image is decoded directly to a single-channel uint8 image, which is
+    passed to each stage of the pipeline without copying, unless `colour` is
+    requested.
+
+    If `mask_text` is set, text (e.g. atom labels) is detected with the EAST
+    model and blanked before line detection, so that the strokes of the
+    letters are not detected as edges. The decoded image is masked in place,
+    unless it is the caller's own array.
+
+    Args:
+        source: Path to the image file, the contents of the file (e.g. bytes
+                or a memoryview of a memory-mapped file) or a decoded image
+                (see `image_utils.read_image`).
+        timings: If provided, the wall time in seconds of each stage of the
+                 pipeline is recorded in this dictionary.
+        keep_image: Whether the result should hold the decoded image. By
+                    default only its path (if any) and a weak reference to it
+                    are kept.
+        colour: Whether to decode the image in colour (BGR), e.g. for
+                annotation. The image is then converted to grayscale for
+                detection.
+        mask_text: Whether to mask text before detecting edges. The masked
+                   boxes and the number of edges removed are recorded in
+                   the result. The latter is the number of raw detector
+                   segments (before parallel edges are filtered) removed,
+                   counted with two extra detector passes included in the
+                   'mask' timing.
+        text_model: The EAST model registry used to detect text. Defaults to
+                    the process-wide `text_detection.east_model`.
+        detector_params: Keyword arguments to
+                         `feature_detection.detect_edges`, e.g.
+                         {'length_threshold': 20, 'parallel_method': 'grid'}.
+                         Defaults to its defaults.
+
+    Returns:
+        The detected vertices and edges.
+
+    Raises:
+        ValueError: If the image cannot be read, or any of the
+                    `detector_params` is unknown.
+        DetectionError: If no edges are found in the image.
+
+    """
+    _check_detector_params(detector_params)
+    if timings is None:
+        timings = {}
+
+    with _timed(timings, 'read'):
+        img = read_image(source, grayscale=not colour)
+
+    return _detect_features(
+        img,
+        timings,
+        image_path=(
+            source if isinstance(source, (str, os.PathLike)) else None
+        ),
+        keep_image=keep_image,
+        mask_text=mask_text,
+        text_model=text_model,
+        detector_params=detector_params,
+        in_place=img is not source
+    )
+
+
+def _count_segments(
+        img: np.ndarray,
+        detector_params: Optional[Mapping[str, Any]] = None
+) -> int:
+    """
+    Counts the segments found by the line detector in `img`, before parallel
+    edges are filtered.
+
+    """
+    try:
+        return len(feature_detection.detect_edges(
+            img, **{**(detector_params or {}), 'remove_parallel': False}
+        ))
+    except feature_detection.DetectionError:
+        return 0
+
+
+def _mask_text(
+        img: np.ndarray,
+        model: Optional[text_detection.EASTModel] = None,
+        in_place: bool = True,
+        detector_params: Optional[Mapping[str, Any]] = None
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Detects text in `img` and blanks the text boxes in white.
+
+    The raw output of the line detector is counted before and after masking,
+    without filtering parallel edges, so that the number of segments removed
+    is measured at the cost of two detector passes.
+
+    Args:
+        img: The decoded grayscale or BGR image.
+        model: The EAST model registry used to detect text.
+        in_place: Whether `img` may be modified, rather than copied.
+        detector_params: Keyword arguments to
+                         `feature_detection.detect_edges`.
+
+    Returns:
+        Tuple of the masked image, the half-open (start_x, start_y, end_x,
+        end_y) text boxes and the number of segments removed by masking. The
+        latter is clamped at zero, as masking may split a segment in two.
+
+    """
+    boxes = merge_rectangles(normalize_rectangles(
+        text_detection.east_detection_tiled(img, model=model), img.shape
+    ))
+
+    n_unmasked = _count_segments(img, detector_params)
+    img = mask_rectangles(
+        img, boxes, 255, out=None if in_place else np.empty_like(img)
+    )
+    removed = max(n_unmasked - _count_segments(img, detector_params), 0)
+    return img, boxes, removed
+
+
+def _detect_features(
+        img: np.ndarray,
+        timings: Optional[Dict[str, float]] = None,
+        image_path: Optional[Union[str, os.PathLike]] = None,
+        keep_image: bool = False,
+        mask_text: bool = False,
+        text_model: Optional[text_detection.EASTModel] = None,
+        detector_params: Optional[Mapping[str, Any]] = None,
+        in_place: bool = True
+) -> MoleculeImageResult:
+    """
+    Detects the edges and vertices of the molecule drawn in a decoded
+    grayscale or BGR image (see `process_molecule_image`).
+
+    """
+    if timings is None:
+        timings = {}
+
+    text_boxes = masked_segments = None
+    if mask_text:
+        with _timed(timings, 'mask'):
+            img, text_boxes, masked_segments = _mask_text(
+                img, text_model, in_place, detector_params
+            )
+
+    with _timed(timings, 'edges'):
+        lines = _detect_edges(img, detector_params)
+
+    with _timed(timings, 'vertices'):
+        corners, vertex_index = feature_detection.get_vertices_from_edges(
+            lines, img.shape[:2], return_index=True
+        )
+
+    return MoleculeImageResult(
+        corners,
+        lines,
+        vertex_index=vertex_index,
+        timings=timings,
+        image_path=image_path,
+        image=img,
+        keep_image=keep_image,
+        text_boxes=text_boxes,
+        masked_segments=masked_segments
+    )
+
+
+# Placed on the prefetch queue once the inputs are exhausted, along with any
+# error raised while iterating them
+_END = None
+
+
+def _put(
+        buffer: queue.Queue,
+        item: Tuple,
+        stop: threading.Event
+) -> bool:
     """
-    img = cv2.imread(filename)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray = np.float32(gray)
+    Places `item` on the bounded `buffer`, giving up if `stop` is set.
+
+    Returns:
+        Whether the item was placed.
+
+    """
+    while not stop.is_set():
+        try:
+            buffer.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _decode_inputs(
+        inputs: Iterable[ImageSource],
+        buffer: queue.Queue,
+        stop: threading.Event,
+        colour: bool = False
+):
+    """
+    Decodes each of the `inputs` onto the bounded `buffer` as (index, kwargs,
+    error) tuples, where kwargs are the arguments to `_detect_features`,
+    until the inputs are exhausted or `stop` is set.
+
+    """
+    error = None
+    try:
+        for index, source in enumerate(inputs):
+            timings: Dict[str, float] = {}
+            try:
+                with _timed(timings, 'read'):
+                    img = read_image(source, grayscale=not colour)
+            except Exception as exc:
+                item = (index, None, exc)
+            else:
+                item = (index, {
+                    'img': img,
+                    'timings': timings,
+                    'image_path': (
+                        source if isinstance(source, (str, os.PathLike))
+                        else None
+                    ),
+                    'in_place': img is not source
+                }, None)
+            if not _put(buffer, item, stop):
+                return
+    except Exception as exc:
+        error = exc
+    _put(buffer, (_END, None, error), stop)
+
+
+def process_molecule_images(
+        inputs: Iterable[ImageSource],
+        prefetch: int = 4,
+        max_workers: Optional[int] = None,
+        ordered: bool = True,
+        return_exceptions: bool = False,
+        keep_image: bool = False,
+        colour: bool = False,
+        mask_text: bool = False,
+        text_model: Optional[text_detection.EASTModel] = None,
+        detector_params: Optional[Mapping[str, Any]] = None
+) -> Iterator[Tuple[int, Union[MoleculeImageResult, Exception]]]:
+    """
+    Detects the edges and vertices of the molecules drawn in a stream of
+    images.
+
+    Upcoming images are decoded in a background thread, overlapping with the
+    detection of earlier images on a pool of worker threads (OpenCV releases
+    the GIL during line detection). At most `prefetch` decoded images wait to
+    be processed and at most `max_workers` are processed at once, so memory
+    use is bounded regardless of the number of inputs.
+
+    Args:
+        inputs: Paths to the image files, the contents of the files or decoded
+                images (see `image_utils.read_image`). This may be a lazy
+                iterable, which is consumed as prefetching allows.
+        prefetch: The maximum number of decoded images awaiting detection.
+        max_workers: The number of images to process concurrently. Defaults
+                     to the number of CPUs.
+        ordered: Whether to yield results in the order of `inputs`, rather
+                 than as they complete.
+        return_exceptions: Whether to yield the exception raised for an image
+                           in place of its result, rather than raising it.
+        keep_image: Whether each result should hold its decoded image (see
+                    `process_molecule_image`).
+        colour: Whether to decode the images in colour (see
+                `process_molecule_image`).
+        mask_text: Whether to mask text before detecting edges (see
+                   `process_molecule_image`).
+        text_model: The EAST model registry used to detect text.
+        detector_params: Keyword arguments to
+                         `feature_detection.detect_edges` (see
+                         `process_molecule_image`).
+
+    Yields:
+        Tuple of the index of the input and its result (see
+        `process_molecule_image`).
+
+    Raises:
+        ValueError: If `prefetch` or `max_workers` is less than one, or any of
+                    the `detector_params` is unknown.
+
+    """
+    _check_detector_params(detector_params)
+    if prefetch < 1:
+        raise ValueError(f'prefetch must be at least 1, got {prefetch}')
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers < 1:
+        raise ValueError(f'max_workers must be at least 1, got {max_workers}')
+
+    buffer: queue.Queue = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    decoder = threading.Thread(
+        target=_decode_inputs,
+        args=(inputs, buffer, stop, colour),
+        name='molrec-decoder',
+        daemon=True
+    )
+    decoder.start()
 
-    lines = feature_detection.detect_edges(gray, remove_parallel=True)
+    pending: Deque[Tuple[int, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            exhausted = False
+            while not exhausted or pending:
+                # Keep the workers busy, but yield completed results rather
+                # than wait on decoding
+                while not exhausted and len(pending) < max_workers:
+                    try:
+                        index, kwargs, error = buffer.get(block=not pending)
+                    except queue.Empty:
+                        break
+                    if index is _END:
+                        if error is not None:
+                            raise error
+                        exhausted = True
+                    elif error is not None:
+                        future: Future = Future()
+                        future.set_exception(error)
+                        pending.append((index, future))
+                    else:
+                        pending.append((index, executor.submit(
+                            _detect_features,
+                            keep_image=keep_image,
+                            mask_text=mask_text,
+                            text_model=text_model,
+                            detector_params=detector_params,
+                            **kwargs
+                        )))
 
-    corners = feature_detection.get_vertices_from_edges(lines)
+                if not pending:
+                    continue
+                if ordered:
+                    index, future = pending.popleft()
+                else:
+                    done, _ = wait(
+                        [future for _, future in pending],
+                        return_when=FIRST_COMPLETED
+                    )
+                    index, future = next(
+                        entry for entry in pending if entry[1] in done
+                    )
+                    pending.remove((index, future))
 
-    return img, corners, lines
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    if not return_exceptions:
+                        raise
+                    result = exc
+                yield index, result
+        finally:
+            stop.set()
+            for _, future in pending:
+                future.cancel()
@@ -0,0 +1,335 @@
+"""
+This module provides the result of the molecule recognition pipeline.
+
+"""
+import os
+import struct
+from typing import Any, Dict, Optional, Tuple, Union
+import weakref
+
+import numpy as np
+
+from .graph import MoleculeGraph, build_graph
+from .image_utils import read_image
+
+# Magic, format version, number of vertices, number of edges, image height
+# and width (zero if unknown) and flags. Version 1 omitted the image size and
+# version 2 the flags
+_HEADER = struct.Struct('<4sBIIIIB')
+_HEADER_V2 = struct.Struct('<4sBIIII')
+_HEADER_V1 = struct.Struct('<4sBII')
+_MAGIC = b'MOLR'
+_VERSION = 3
+# Set if the vertex index of the edge endpoints follows the edges
+_FLAG_VERTEX_INDEX = 1
+
+
+class MoleculeImageResult:
+    """
+    The vertices and edges detected in an image of a molecule.
+
+    Vertices are stored as a contiguous (N, 2) float32 array of (x, y)
+    coordinates and edges as a contiguous (M, 4) int32 array of (x0, y0, x1,
+    y1) coordinates, so that many results can be held in memory cheaply. The
+    vertex of each edge endpoint may be recorded as an (M, 2) int32 array of
+    vertex indices, from which the graph is then built directly.
+
+    The source image is not held by default. Its path is recorded if it was
+    read from a file, and a weak reference to it is kept, so that `image` can
+    return it while it is otherwise alive, or re-read it from disk in the
+    same colour mode (grayscale or BGR).
+
+    If text was masked before detection, the masked text boxes and the number
+    of segments removed by masking them are also recorded.
+
+    """
+    __slots__ = (
+        'vertices',
+        'edges',
+        'vertex_index',
+        'timings',
+        'image_path',
+        'image_size',
+        'grayscale',
+        'text_boxes',
+        'masked_segments',
+        '_image',
+        '_image_ref'
+    )
+
+    def __init__(
+            self,
+            vertices: np.ndarray,
+            edges: np.ndarray,
+            timings: Optional[Dict[str, float]] = None,
+            image_path: Optional[Union[str, os.PathLike]] = None,
+            image: Optional[np.ndarray] = None,
+            keep_image: bool = False,
+            image_size: Optional[Tuple[int, int]] = None,
+            text_boxes: Optional[np.ndarray] = None,
+            masked_segments: Optional[int] = None,
+            grayscale: Optional[bool] = None,
+            vertex_index: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            vertices: The vertex coordinates, in any layout with two values
+                      per vertex (e.g. (N, 1, 2) as from goodFeaturesToTrack).
+            edges: The edge coordinates, in any layout with four values per
+                   edge (e.g. (M, 1, 4) as from the line detector).
+            timings: The wall time in seconds of each stage of the pipeline.
+            image_path: Path to the source image file, if any.
+            image: The source image, to which a weak reference is kept.
+            keep_image: Whether to also keep a strong reference to `image`.
+            image_size: The dimensions of the image. Defaults to those of
+                        `image`, if provided.
+            text_boxes: The half-open (start_x, start_y, end_x, end_y) text
+                        boxes masked before detection, if any.
+            masked_segments: The number of segments removed by masking the
+                             text boxes - the difference between the numbers
+                             of raw detector segments, before parallel edges
+                             are filtered, found before and after masking,
+                             clamped at zero.
+            grayscale: Whether the image was decoded to a single channel,
+                       rather than to BGR, so that it is re-read from its
+                       path in the same mode. Defaults to whether `image` is
+                       single-channel, if provided.
+            vertex_index: The indices of the vertices of the start and end
+                          point of each edge, as from
+                          `get_vertices_from_edges` with `return_index`.
+
+        """
+        self.vertices = np.ascontiguousarray(
+            np.asarray(vertices, dtype=np.float32).reshape(-1, 2)
+        )
+        self.edges = np.ascontiguousarray(
+            np.asarray(edges, dtype=np.int32).reshape(-1, 4)
+        )
+        self.vertex_index = (
+            np.ascontiguousarray(
+                np.asarray(vertex_index, dtype=np.int32).reshape(-1, 2)
+            )
+            if vertex_index is not None else None
+        )
+        self.timings = timings if timings is not None else {}
+        self.image_path = (
+            os.fspath(image_path) if image_path is not None else None
+        )
+        if image_size is None and image is not None:
+            image_size = image.shape[:2]
+        self.image_size = tuple(image_size) if image_size is not None else None
+        if grayscale is None:
+            grayscale = image is not None and image.ndim == 2
+        self.grayscale = grayscale
+        self.text_boxes = (
+            np.asarray(text_boxes, dtype=np.int32).reshape(-1, 4)
+            if text_boxes is not None else None
+        )
+        self.masked_segments = masked_segments
+        self._image = image if keep_image else None
+        self._image_ref = weakref.ref(image) if image is not None else None
+
+    @property
+    def image(self) -> Optional[np.ndarray]:
+        """
+        The source image, if held, still alive or readable from its path.
+
+        """
+        if self._image is not None:
+            return self._image
+        image = self._image_ref() if self._image_ref is not None else None
+        if image is None and self.image_path is not None:
+            image = read_image(self.image_path, grayscale=self.grayscale)
+        return image
+
+    @property
+    def corners(self) -> np.ndarray:
+        """
+        A copy of the vertices in the legacy int64 (N, 1, 2) layout.
+
+        """
+        return np.around(self.vertices).astype(np.int64).reshape(-1, 1, 2)
+
+    @property
+    def lines(self) -> np.ndarray:
+        """
+        A copy of the edges in the legacy int64 (M, 1, 4) layout.
+
+        """
+        return self.edges.astype(np.int64).reshape(-1, 1, 4)
+
+    def to_graph(self, tolerance: Optional[float] = None) -> MoleculeGraph:
+        """
+        Builds the molecular graph connecting the edges to the vertices (see
+        `graph.build_graph`).
+
+        If the vertex of each edge endpoint is recorded in `vertex_index`,
+        the edges are connected to those vertices directly, rather than by
+        snapping each endpoint to its nearest vertex.
+
+        Args:
+            tolerance: The maximum distance between an edge endpoint and its
+                       vertex. If not provided, it is defined adaptively based
+                       on the image size.
+
+        """
+        return build_graph(
+            self.edges,
+            self.vertices,
+            image_size=self.image_size,
+            tolerance=tolerance,
+            vertex_index=self.vertex_index
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Converts the result to a JSON-serializable dictionary of the vertices,
+        edges and stage timings, and of the masked text boxes, if any.
+
+        """
+        data = {
+            'vertices': self.vertices.tolist(),
+            'edges': self.edges.tolist(),
+            'timings': dict(self.timings)
+        }
+        if self.text_boxes is not None:
+            data['text_boxes'] = self.text_boxes.tolist()
+            data['masked_segments'] = self.masked_segments
+        return data
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the vertices, edges, image size and vertex index to a
+        compact binary format: a header, followed by the little-endian float32
+        vertices, int32 edges and, if recorded, int32 vertex index.
+
+        """
+        height, width = self.image_size or (0, 0)
+        flags = _FLAG_VERTEX_INDEX if self.vertex_index is not None else 0
+        return b''.join((
+            _HEADER.pack(
+                _MAGIC,
+                _VERSION,
+                len(self.vertices),
+                len(self.edges),
+                height,
+                width,
+                flags
+            ),
+            self.vertices.astype('<f4', copy=False).tobytes(),
+            self.edges.astype('<i4', copy=False).tobytes(),
+            (
+                self.vertex_index.astype('<i4', copy=False).tobytes()
+                if self.vertex_index is not None else b''
+            )
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: Any) -> 'MoleculeImageResult':
+        """
+        Deserializes a result from the output of `to_bytes`, including that
+        of earlier versions, which did not record the image size (version 1)
+        or the vertex index (versions 1 and 2).
+
+        Args:
+            data: Any object supporting the buffer protocol, e.g. bytes or a
+                  memoryview. The arrays of the result are views of `data`
+                  where possible, rather than copies.
+
+        Raises:
+            ValueError: If `data` is not a serialized result.
+
+        """
+        data = memoryview(data).cast('B')
+        if len(data) < _HEADER_V1.size:
+            raise ValueError('Data is too short to be a serialized result')
+        magic, version, n_vertices, n_edges = _HEADER_V1.unpack_from(data)
+        if magic != _MAGIC or version not in (1, 2, _VERSION):
+            raise ValueError('Data is not a serialized result')
+        header = {1: _HEADER_V1, 2: _HEADER_V2, _VERSION: _HEADER}[version]
+        if len(data) < header.size:
+            raise ValueError('Data is too short to be a serialized result')
+        height, width, flags = (header.unpack_from(data)[4:] + (0, 0, 0))[:3]
+        image_size = (height, width) if height and width else None
+        has_index = bool(flags & _FLAG_VERTEX_INDEX)
+        vertices_size = 8 * n_vertices
+        edges_size = 16 * n_edges
+        if len(data) != (
+                header.size + vertices_size + edges_size
+                + has_index * 8 * n_edges
+        ):
+            raise ValueError('Data length does not match its header')
+
+        result = cls.__new__(cls)
+        result.vertices = np.frombuffer(
+            data, dtype='<f4', count=2 * n_vertices, offset=header.size
+        ).reshape(-1, 2)
+        result.edges = np.frombuffer(
+            data,
+            dtype='<i4',
+            count=4 * n_edges,
+            offset=header.size + vertices_size
+        ).reshape(-1, 4)
+        result.vertex_index = np.frombuffer(
+            data,
+            dtype='<i4',
+            count=2 * n_edges,
+            offset=header.size + vertices_size + edges_size
+        ).reshape(-1, 2) if has_index else None
+        result.timings = {}
+        result.image_path = None
+        result.image_size = image_size
+        result.grayscale = False
+        result.text_boxes = None
+        result.masked_segments = None
+        result._image = None
+        result._image_ref = None
+        return result
+
+    def __reduce_ex__(self, protocol: int):
+        # The image is not pickled, only its path. The arrays support
+        # out-of-band buffers with pickle protocol 5
+        return (
+            _unpickle_result,
+            (
+                self.vertices,
+                self.edges,
+                self.timings,
+                self.image_path,
+                self.image_size,
+                self.text_boxes,
+                self.masked_segments,
+                self.grayscale,
+                self.vertex_index
+            )
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f'{type(self).__name__}({len(self.vertices)} vertices, '
+            f'{len(self.edges)} edges)'
+        )
+
+
+def _unpickle_result(
+        vertices: np.ndarray,
+        edges: np.ndarray,
+        timings: Dict[str, float],
+        image_path: Optional[str],
+        image_size: Optional[Tuple[int, int]],
+        text_boxes: Optional[np.ndarray] = None,
+        masked_segments: Optional[int] = None,
+        grayscale: bool = False,
+        vertex_index: Optional[np.ndarray] = None
+) -> MoleculeImageResult:
+    return MoleculeImageResult(
+        vertices,
+        edges,
+        timings=timings,
+        image_path=image_path,
+        image_size=image_size,
+        text_boxes=text_boxes,
+        masked_segments=masked_segments,
+        grayscale=grayscale,
+        vertex_index=vertex_index
+    )
@@ -1,4 +1,6 @@
 import os
+import threading
+from typing import Iterator, List, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
@@ -6,11 +8,238 @@ import numpy as np
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+EAST_MODEL_PATH = os.path.join(SCRIPT_DIR, 'frozen_east_text_detection.pb')
+
+# Define the two output layer names for the EAST detector model in which
+# we are interested - the first is the output probabilities and the
+# second can be used to derive the bounding box coordinates of text
+EAST_LAYER_NAMES = [
+    "feature_fusion/Conv_7/Sigmoid",
+    "feature_fusion/concat_3"
+]
+
+
+class EASTModel:
+    """
+    A process-wide registry for the EAST text detection network.
+
+    The frozen model is read from disk once per process and kept in memory.
+    Since cv2.dnn.Net instances are not safe to share between threads, each
+    thread is given its own network, constructed from the in-memory model.
+
+    Calling `warmup` before forking worker processes (e.g. with
+    multiprocessing) means that the children share the loaded model
+    copy-on-write, rather than each reading it from disk.
+
+    """
+    def __init__(
+            self,
+            model_path: str = EAST_MODEL_PATH,
+            backend: Optional[int] = None,
+            target: Optional[int] = None
+    ):
+        """
+        Args:
+            model_path: Path to the frozen EAST model.
+            backend: Preferred cv2.dnn backend, e.g.
+                     cv2.dnn.DNN_BACKEND_OPENCV. Defaults to OpenCV's default.
+            target: Preferred cv2.dnn target device, e.g.
+                    cv2.dnn.DNN_TARGET_CPU. Defaults to OpenCV's default.
+
+        """
+        self.model_path = model_path
+        self.backend = backend
+        self.target = target
+        self._lock = threading.Lock()
+        self._model_data: Optional[np.ndarray] = None
+        self._local = threading.local()
+        # Incremented whenever the configuration changes, invalidating the
+        # networks already constructed by each thread
+        self._generation = 0
+
+    def configure(
+            self,
+            backend: Optional[int] = None,
+            target: Optional[int] = None
+    ):
+        """
+        Sets the preferred backend and target for the networks.
+
+        Networks already constructed are rebuilt on their next use.
+
+        """
+        with self._lock:
+            self.backend = backend
+            self.target = target
+            self._generation += 1
+
+    def load_model_data(self) -> np.ndarray:
+        """
+        Reads the frozen model into memory, if not already loaded.
+
+        Returns:
+            The model file contents as a uint8 array.
+
+        """
+        with self._lock:
+            if self._model_data is None:
+                self._model_data = np.fromfile(self.model_path, dtype=np.uint8)
+            return self._model_data
+
+    def get_net(self) -> cv2.dnn_Net:
+        """
+        Retrieves the EAST network for the current thread, constructing it if
+        required.
+
+        """
+        net = getattr(self._local, 'net', None)
+        if net is None or self._local.generation != self._generation:
+            generation = self._generation
+            net = cv2.dnn.readNetFromTensorflow(self.load_model_data())
+            if self.backend is not None:
+                net.setPreferableBackend(self.backend)
+            if self.target is not None:
+                net.setPreferableTarget(self.target)
+            self._local.net = net
+            self._local.generation = generation
+        return net
+
+    def warmup(self):
+        """
+        Loads the model and initializes the network for the current thread by
+        running a forward pass on a blank image.
+
+        """
+        net = self.get_net()
+        net.setInput(cv2.dnn.blobFromImage(
+            np.zeros((32, 32, 3), dtype=np.uint8),
+            1.0,
+            (32, 32),
+            EAST_MEAN,
+            swapRB=True,
+            crop=False
+        ))
+        net.forward(EAST_LAYER_NAMES)
+
+    def clear(self):
+        """
+        Releases the loaded model. Networks are rebuilt on their next use.
+
+        """
+        with self._lock:
+            self._model_data = None
+            self._generation += 1
+
+
+# The mean (RGB) subtracted from input images by the EAST network
+EAST_MEAN = (123.68, 116.78, 103.94)
+
+# The default, process-wide model registry
+east_model = EASTModel()
+
+
+def decode_predictions(
+        scores: np.ndarray,
+        geometry: np.ndarray,
+        min_confidence: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decodes the EAST score and geometry maps of a single image into bounding
+    boxes.
+
+    Every cell of the score map with sufficient probability is decoded at once
+    using array arithmetic.
+
+    Args:
+        scores: The score map output of the network, shape (1, 1, H, W).
+        geometry: The geometry map output of the network, shape (1, 5, H, W).
+        min_confidence: The minimum probability required for a bounding box.
+
+    Returns:
+        Tuple of an N x 4 integer array of the coordinates of the start and end
+        points of each bounding box, and the corresponding confidences.
+
+    """
+    # Extract the scores (probabilities), followed by the geometrical data
+    # used to derive potential bounding box coordinates that surround text,
+    # for the cells with sufficient probability
+    ys, xs = np.nonzero(scores[0, 0] >= min_confidence)
+    confidences = scores[0, 0, ys, xs]
+    x_data0, x_data1, x_data2, x_data3, angles = geometry[0][:, ys, xs]
+
+    # Compute the offset factor as our resulting feature maps will be 4x
+    # smaller than the input image
+    offset_x, offset_y = xs * 4.0, ys * 4.0
+    cos, sin = np.cos(angles), np.sin(angles)
+    # Use the geometry volume to derive the width and height of the bounding
+    # box
+    h = x_data0 + x_data2
+    w = x_data1 + x_data3
+    # Compute both the starting and ending (x, y)-coordinates for the text
+    # prediction bounding box, truncating towards zero
+    end_x = (offset_x + (cos * x_data1) + (sin * x_data2)).astype(np.int64)
+    end_y = (offset_y - (sin * x_data1) + (cos * x_data2)).astype(np.int64)
+    start_x = (end_x - w).astype(np.int64)
+    start_y = (end_y - h).astype(np.int64)
+
+    return np.stack([start_x, start_y, end_x, end_y], axis=1), confidences
+
+
+def suppress_boxes(
+        rects: np.ndarray,
+        confidences: np.ndarray,
+        min_confidence: float,
+        nms_threshold: float = 0.4
+) -> np.ndarray:
+    """
+    Applies non-maximal suppression to suppress weak, overlapping bounding
+    boxes.
+
+    Args:
+        rects: N x 4 array of bounding box start and end points.
+        confidences: The confidence of each bounding box.
+        min_confidence: The minimum probability required for a bounding box.
+        nms_threshold: The overlap threshold for suppression.
+
+    Returns:
+        Array of the retained bounding boxes.
+
+    """
+    return rects[_suppression_indices(
+        rects, confidences, min_confidence, nms_threshold
+    )]
+
+
+def _suppression_indices(
+        rects: np.ndarray,
+        confidences: np.ndarray,
+        min_confidence: float,
+        nms_threshold: float
+) -> np.ndarray:
+    """
+    Determines the indices of the bounding boxes retained by non-maximal
+    suppression.
+
+    """
+    # Note that NMSBoxes is very fussy about its inputs:
+    # https://github.com/opencv/opencv/issues/12299
+    indices = cv2.dnn.NMSBoxes(
+        rects.tolist(),
+        [float(c) for c in confidences],
+        min_confidence,
+        # I have no idea how this threshold works... higher appears to
+        # retain more boxes
+        nms_threshold=nms_threshold
+    )
+    # Depending on the OpenCV version, the indices are N x 1 or flat
+    return np.reshape(indices, -1).astype(np.int64)
+
 
 def east_detection(
         image: np.ndarray,
         min_confidence: float = 0.5,
-        apply_suppression: bool = True
+        apply_suppression: bool = True,
+        model: Optional[EASTModel] = None
 ) -> np.ndarray:
     """
     Performs EAST text detection of text bounding boxes.
@@ -20,93 +249,320 @@ def east_detection(
     opencv-text-detection-east-text-detector/
 
     Args:
-        image: Numpy array image. Note that the dimensions must be multiples of
-               32.
+        image: The BGR or grayscale numpy array image. Note that the dimensions
+               must be multiples of 32.
         min_confidence: The minimum probability required for a bounding box.
         apply_suppression: Whether to perform non-maximal suppression.
+        model: The EAST model registry from which to retrieve the network.
+               Defaults to the process-wide `east_model`.
 
     Returns:
         Numpy array containing the coordinates of the start and end points of
         each bounding box.
 
     """
-    # Define the two output layer names for the EAST detector model in which
-    # we are interested - the first is the output probabilities and the
-    # second can be used to derive the bounding box coordinates of text
-    layer_names = [
-        "feature_fusion/Conv_7/Sigmoid",
-        "feature_fusion/concat_3"
-    ]
-
-    net = cv2.dnn.readNet(
-        os.path.join(SCRIPT_DIR, 'frozen_east_text_detection.pb')
-    )
+    net = (model or east_model).get_net()
 
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
     blob = cv2.dnn.blobFromImage(
         image,
         1.0,
         tuple(image.shape[:2]),
-        (123.68, 116.78, 103.94),
+        EAST_MEAN,
         swapRB=True,
         crop=False
     )
     net.setInput(blob)
-    scores, geometry = net.forward(layer_names)
-
-    num_rows, num_cols = scores.shape[2:4]
-    rects = []
-    confidences = []
-    for y in range(0, num_rows):
-        # Extract the scores (probabilities), followed by the geometrical
-        # data used to derive potential bounding box coordinates that
-        # surround text
-        scores_data = scores[0, 0, y]
-        x_data0 = geometry[0, 0, y]
-        x_data1 = geometry[0, 1, y]
-        x_data2 = geometry[0, 2, y]
-        x_data3 = geometry[0, 3, y]
-        angles_data = geometry[0, 4, y]
-
-        for x in range(0, num_cols):
-            # If our score does not have sufficient probability, ignore it
-            if scores_data[x] < min_confidence:
-                continue
-            # Compute the offset factor as our resulting feature maps will
-            # be 4x smaller than the input image
-            offset_x, offset_y = (x * 4.0, y * 4.0)
-            # Extract the rotation angle for the prediction
-            angle = angles_data[x]
-            cos = np.cos(angle)
-            sin = np.sin(angle)
-            # Use the geometry volume to derive the width and height of
-            # the bounding box
-            h = x_data0[x] + x_data2[x]
-            w = x_data1[x] + x_data3[x]
-            # Compute both the starting and ending (x, y)-coordinates for
-            # the text prediction bounding box
-            end_x = int(offset_x + (cos * x_data1[x]) + (sin * x_data2[x]))
-            end_y = int(offset_y - (sin * x_data1[x]) + (cos * x_data2[x]))
-            start_x = int(end_x - w)
-            start_y = int(end_y - h)
-
-            rects.append((start_x, start_y, end_x, end_y))
-            confidences.append(scores_data[x])
-
-    if apply_suppression and rects:
-        # Apply non-maximal suppression to suppress weak, overlapping bounding
-        # boxes
-        # Note that NMSBoxes is very fussy about its inputs:
-        # https://github.com/opencv/opencv/issues/12299
-        indices = cv2.dnn.NMSBoxes(
-            [list(r) for r in rects],
-            [float(c) for c in confidences],
-            min_confidence,
-            # I have no idea how this threshold works... higher appears to
-            # retain more boxes
-            nms_threshold=0.4
+    scores, geometry = net.forward(EAST_LAYER_NAMES)
+
+    rects, confidences = decode_predictions(scores, geometry, min_confidence)
+
+    if not len(rects):
+        return np.array([])
+
+    if apply_suppression:
+        rects = suppress_boxes(rects, confidences, min_confidence)
+
+    return rects
+
+
+def _round_up(value: int, multiple: int) -> int:
+    """Rounds `value` up to the nearest multiple of `multiple`."""
+    return -(-value // multiple) * multiple
+
+
+def _letterbox(
+        image: np.ndarray,
+        width: int,
+        height: int,
+        pad_value: Tuple[int, int, int]
+) -> Tuple[np.ndarray, float]:
+    """
+    Fits `image` into a `width` by `height` BGR canvas, scaling it down only
+    if necessary and padding to the bottom and right.
+
+    Returns:
+        Tuple of the letterboxed image and the scale factor applied.
+
+    """
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    scale = min(1., width / image.shape[1], height / image.shape[0])
+    if scale < 1.:
+        image = cv2.resize(
+            image,
+            (int(image.shape[1] * scale), int(image.shape[0] * scale)),
+            interpolation=cv2.INTER_AREA
         )
-        rects = np.array(rects)[indices[:, 0]]
-    else:
-        rects = np.array(rects)
 
+    return cv2.copyMakeBorder(
+        image,
+        0,
+        height - image.shape[0],
+        0,
+        width - image.shape[1],
+        cv2.BORDER_CONSTANT,
+        value=pad_value
+    ), scale
+
+
+def east_detection_batch(
+        images: Sequence[np.ndarray],
+        min_confidence: float = 0.5,
+        apply_suppression: bool = True,
+        size: Optional[Tuple[int, int]] = None,
+        batch_size: int = 16,
+        pad_value: Tuple[int, int, int] = (255, 255, 255),
+        model: Optional[EASTModel] = None
+) -> List[np.ndarray]:
+    """
+    Performs EAST text detection on several images, with one forward pass of
+    the network per batch of images.
+
+    Each image is letterboxed - padded to the bottom and right, and scaled
+    down only if it does not fit - to a common size which is a multiple of 32.
+    Bounding boxes are mapped back to the coordinates of each original image.
+
+    Args:
+        images: The BGR or grayscale numpy array images, of any size.
+        min_confidence: The minimum probability required for a bounding box.
+        apply_suppression: Whether to perform non-maximal suppression.
+        size: The common (width, height) to which to letterbox the images,
+              which must be multiples of 32. Defaults to the size of the
+              largest image in each batch, rounded up to multiples of 32.
+        batch_size: The maximum number of images per forward pass.
+        pad_value: The BGR colour with which to pad the images.
+        model: The EAST model registry from which to retrieve the network.
+               Defaults to the process-wide `east_model`.
+
+    Returns:
+        List containing, for each image, a numpy array of the coordinates of
+        the start and end points of each bounding box.
+
+    Raises:
+        ValueError: If `size` is not a multiple of 32.
+
+    """
+    if size is not None and (size[0] % 32 or size[1] % 32):
+        raise ValueError(f'Letterbox size {size} is not a multiple of 32')
+
+    results = []
+    for rects, confidences, scale in _predict_batches(
+            images, min_confidence, size, batch_size, pad_value,
+            (model or east_model).get_net()
+    ):
+        if not len(rects):
+            results.append(np.array([]))
+            continue
+        if apply_suppression:
+            rects = suppress_boxes(rects, confidences, min_confidence)
+        if scale < 1.:
+            rects = np.around(rects / scale).astype(np.int64)
+        results.append(rects)
+
+    return results
+
+
+def _predict_batches(
+        images: Sequence[np.ndarray],
+        min_confidence: float,
+        size: Optional[Tuple[int, int]],
+        batch_size: int,
+        pad_value: Tuple[int, int, int],
+        net: cv2.dnn_Net
+) -> Iterator[Tuple[np.ndarray, np.ndarray, float]]:
+    """
+    Runs the EAST network on letterboxed batches of `images` (see
+    `east_detection_batch`).
+
+    Yields:
+        For each image, the decoded (unsuppressed) bounding boxes in the
+        letterboxed coordinates, their confidences and the scale factor
+        applied to the image.
+
+    """
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        if size is None:
+            width = _round_up(max(image.shape[1] for image in batch), 32)
+            height = _round_up(max(image.shape[0] for image in batch), 32)
+        else:
+            width, height = size
+
+        letterboxed, scales = zip(*[
+            _letterbox(image, width, height, pad_value) for image in batch
+        ])
+        net.setInput(cv2.dnn.blobFromImages(
+            list(letterboxed),
+            1.0,
+            (width, height),
+            EAST_MEAN,
+            swapRB=True,
+            crop=False
+        ))
+        scores, geometry = net.forward(EAST_LAYER_NAMES)
+
+        for ii, scale in enumerate(scales):
+            yield (*decode_predictions(
+                scores[ii:ii + 1], geometry[ii:ii + 1], min_confidence
+            ), scale)
+
+
+def _tile_origins(length: int, tile_size: int, stride: int) -> List[int]:
+    """
+    Determines the start of each tile along an axis of `length`, such that the
+    final tile ends at the end of the axis.
+
+    """
+    origins = list(range(0, max(length - tile_size, 0) + 1, stride))
+    if origins[-1] + tile_size < length:
+        origins.append(length - tile_size)
+    return origins
+
+
+def calculate_ink_density(image: np.ndarray, ink_threshold: int) -> float:
+    """
+    Calculates the fraction of pixels in `image` darker than `ink_threshold`.
+
+    Args:
+        image: The BGR or grayscale numpy array image.
+        ink_threshold: The grayscale level below which pixels are considered
+                       to be ink.
+
+    Returns:
+        The ink density, between 0 and 1.
+
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if not image.size:
+        return 0.
+    return np.count_nonzero(image < ink_threshold) / image.size
+
+
+def east_detection_tiled(
+        image: np.ndarray,
+        tile_size: int = 512,
+        overlap: int = 64,
+        min_ink_density: float = 0.001,
+        ink_threshold: int = 128,
+        min_confidence: float = 0.5,
+        apply_suppression: bool = True,
+        nms_threshold: float = 0.4,
+        batch_size: int = 4,
+        model: Optional[EASTModel] = None
+) -> np.ndarray:
+    """
+    Performs EAST text detection on overlapping tiles of a (large) image.
+
+    Tiles with an ink density below `min_ink_density` are skipped, and the
+    remaining tiles are detected in batches of `batch_size`. The bounding
+    boxes of all tiles are merged with non-maximal suppression, so that text
+    across tile seams is not duplicated. Peak memory use is bounded by the
+    tile and batch sizes, rather than the size of the image, and the image
+    dimensions need not be multiples of 32.
+
+    Text wider than `overlap` may be split across tiles, so `overlap` should
+    exceed the size of the largest expected text.
+
+    Args:
+        image: The BGR or grayscale numpy array image.
+        tile_size: The width and height of each (square) tile, which must be a
+                   multiple of 32.
+        overlap: The overlap of neighbouring tiles in pixels.
+        min_ink_density: The minimum fraction of ink pixels for a tile to be
+                         detected.
+        ink_threshold: The grayscale level below which pixels are considered
+                       to be ink.
+        min_confidence: The minimum probability required for a bounding box.
+        apply_suppression: Whether to perform non-maximal suppression.
+        nms_threshold: The overlap threshold for suppression.
+        batch_size: The number of tiles per forward pass of the network.
+        model: The EAST model registry from which to retrieve the network.
+               Defaults to the process-wide `east_model`.
+
+    Returns:
+        Numpy array containing the coordinates of the start and end points of
+        each bounding box, in the coordinates of `image`.
+
+    Raises:
+        ValueError: If `tile_size` is not a multiple of 32 or `overlap` is not
+                    smaller than `tile_size`.
+
+    """
+    if tile_size % 32:
+        raise ValueError(f'Tile size {tile_size} is not a multiple of 32')
+    if not 0 <= overlap < tile_size:
+        raise ValueError(
+            f'Tile overlap {overlap} must be in [0, tile size {tile_size})'
+        )
+
+    net = (model or east_model).get_net()
+    stride = tile_size - overlap
+
+    all_rects, all_confidences = [], []
+
+    def detect(tiles, origins):
+        for (rects, confidences, _), origin in zip(_predict_batches(
+                tiles, min_confidence, (tile_size, tile_size), batch_size,
+                (255, 255, 255), net
+        ), origins):
+            if not len(rects):
+                continue
+            if apply_suppression:
+                retained = _suppression_indices(
+                    rects, confidences, min_confidence, nms_threshold
+                )
+                rects, confidences = rects[retained], confidences[retained]
+            all_rects.append(rects + np.array(origin * 2))
+            all_confidences.append(confidences)
+
+    tiles, origins = [], []
+    for y in _tile_origins(image.shape[0], tile_size, stride):
+        for x in _tile_origins(image.shape[1], tile_size, stride):
+            tile = image[y:y + tile_size, x:x + tile_size]
+            if calculate_ink_density(tile, ink_threshold) < min_ink_density:
+                continue
+            tiles.append(tile)
+            origins.append((x, y))
+            if len(tiles) == batch_size:
+                detect(tiles, origins)
+                tiles, origins = [], []
+    if tiles:
+        detect(tiles, origins)
+
+    if not all_rects:
+        return np.array([])
+
+    rects = np.concatenate(all_rects)
+    if apply_suppression:
+        # Merge boxes detected in more than one tile across the seams
+        rects = rects[_suppression_indices(
+            rects,
+            np.concatenate(all_confidences),
+            min_confidence,
+            nms_threshold
+        )]
     return rects
@@ -1,34 +1,205 @@
-from typing import List, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import cv2
 import numpy as np
 import pytesseract as tesseract
 
+from .ocr_cache import OCRCache
+
+Box = Tuple[int, int, int, int]
+
+# --psm 7 treats the region of interest as a single line of text
+TESSERACT_CONFIG = '-l eng --oem 1 --psm 7'
+
+# --psm 6 treats the packed strip of regions as a uniform block of text, with
+# one line per region
+TESSERACT_STRIP_CONFIG = '-l eng --oem 1 --psm 6'
+
+
+def _pad_box(box: Box, padding: float, shape: Tuple[int, ...]) -> Box:
+    """
+    Applies `padding` to each side of the bounding `box`, clamped to an image
+    of the given `shape`.
+
+    """
+    start_x, start_y, end_x, end_y = box
+
+    # Compute x and y deltas for padding
+    d_x = int((end_x - start_x) * padding)
+    d_y = int((end_y - start_y) * padding)
+
+    return (
+        max(0, start_x - d_x),
+        max(0, start_y - d_y),
+        min(shape[1], end_x + (d_x * 2)),
+        min(shape[0], end_y + (d_y * 2))
+    )
+
+
+def pack_rois(
+        rois: Sequence[np.ndarray],
+        gap: int = 20
+) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """
+    Packs regions of interest into a single, white, grayscale strip image,
+    one above the other.
+
+    Args:
+        rois: The BGR or grayscale region of interest images.
+        gap: The white space between (and around) the regions, in pixels.
+
+    Returns:
+        Tuple of the strip image and the (start, end) row of each region within
+        the strip.
+
+    """
+    rois = [
+        cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+        for roi in rois
+    ]
+    width = max((roi.shape[1] for roi in rois), default=0) + 2 * gap
+    height = sum(roi.shape[0] + gap for roi in rois) + gap
+
+    strip = np.full((height, width), 255, dtype=np.uint8)
+    offsets = []
+    y = gap
+    for roi in rois:
+        strip[y:y + roi.shape[0], gap:gap + roi.shape[1]] = roi
+        offsets.append((y, y + roi.shape[0]))
+        y += roi.shape[0] + gap
+
+    return strip, offsets
+
+
+def assign_words(
+        data: Dict[str, List[Any]],
+        offsets: Sequence[Tuple[int, int]]
+) -> List[str]:
+    """
+    Maps the words recognized in a packed strip back to their regions.
+
+    Each word is assigned to the region containing its vertical centre, and
+    the words of each region are joined by spaces from left to right.
+
+    Args:
+        data: Output of pytesseract.image_to_data as a dictionary.
+        offsets: The (start, end) row of each region within the strip.
+
+    Returns:
+        The text of each region.
+
+    """
+    starts = np.array([start for start, _ in offsets])
+    words: List[List[Tuple[int, str]]] = [[] for _ in offsets]
+    for text, left, top, height in zip(
+            data['text'], data['left'], data['top'], data['height']
+    ):
+        text = str(text).strip()
+        if not text:
+            continue
+        centre = int(top) + int(height) / 2
+        idx = int(np.searchsorted(starts, centre, side='right')) - 1
+        if idx >= 0 and centre < offsets[idx][1]:
+            words[idx].append((int(left), text))
+
+    return [' '.join(text for _, text in sorted(ws)) for ws in words]
+
+
+def _recognize_roi(roi: np.ndarray) -> str:
+    """Recognizes the text in a single region of interest."""
+    return tesseract.image_to_string(roi, config=TESSERACT_CONFIG)
+
 
 def extract_text(
         image: np.ndarray,
-        boxes: List[Tuple[int, int, int, int]],
-        padding: float = 0.2
-) -> List[Tuple[Tuple[int, int, int, int], str]]:
+        boxes: List[Box],
+        padding: float = 0.2,
+        batch: bool = False,
+        max_workers: int = 1,
+        executor: Optional[Executor] = None,
+        cache: Optional[OCRCache] = None
+) -> List[Tuple[Box, str]]:
     """
+    Recognizes the text in each of the bounding `boxes` of `image`.
+
+    Args:
+        image: The numpy array image.
+        boxes: Bounding boxes, defined by start and end coordinates.
+        padding: The padding to add to each side of the boxes, as a fraction of
+                 their width or height.
+        batch: Whether to pack all the regions into a single strip image,
+               recognized with a single Tesseract invocation, rather than
+               invoking Tesseract once per box.
+        max_workers: The number of boxes to recognize concurrently, when not
+                     in `batch` mode. If greater than one, a thread pool is
+                     created for the call - threads suffice as each
+                     recognition runs in a Tesseract subprocess.
+        executor: An existing executor with which to recognize the boxes
+                  concurrently, when not in `batch` mode. This takes
+                  precedence over `max_workers` and is not shut down.
+        cache: A cache of recognized text. Regions whose normalized content is
+               cached skip OCR entirely.
+
+    Returns:
+        List of the padded bounding box and its recognized text, for each of
+        `boxes`.
+
     """
-    texts = []
-    for (start_x, start_y, end_x, end_y) in boxes:
-        # Compute x and y deltas for padding
-        d_x = int((end_x - start_x) * padding)
-        d_y = int((end_y - start_y) * padding)
+    padded = [_pad_box(box, padding, image.shape) for box in boxes]
+
+    # Extract the actual, padded ROIs
+    rois = [
+        image[start_y:end_y, start_x:end_x]
+        for (start_x, start_y, end_x, end_y) in padded
+    ]
 
-        # Apply padding to each side of the bounding box
-        start_x = max(0, start_x - d_x)
-        start_y = max(0, start_y - d_y)
-        end_x = min(image.shape[0], end_x + (d_x * 2))
-        end_y = min(image.shape[1], end_y + (d_y * 2))
+    if cache is None:
+        texts = _recognize_rois(rois, batch, max_workers, executor)
+    else:
+        config = TESSERACT_STRIP_CONFIG if batch else TESSERACT_CONFIG
+        keys = [cache.key(roi, namespace=config) for roi in rois]
+        cached = {}
+        for key in keys:
+            if key not in cached:
+                cached[key] = cache.get(key)
+        # Each distinct uncached region is recognized once
+        missing = {
+            key: roi for key, roi in zip(keys, rois) if cached[key] is None
+        }
+        for key, text in zip(missing, _recognize_rois(
+                list(missing.values()), batch, max_workers, executor
+        )):
+            cache.put(key, text)
+            cached[key] = text
+        texts = [cached[key] for key in keys]
 
-        # Extract the actual, padded ROI
-        roi = image[start_y:end_y, start_x:end_x]
+    return list(zip(padded, texts))
 
-        # --psm 7 treats the region of interest as a single line of text
-        text = tesseract.image_to_string(roi, config='-l eng --oem 1 --psm 7')
 
-        texts.append(((start_x, start_y, end_x, end_y), text))
+def _recognize_rois(
+        rois: List[np.ndarray],
+        batch: bool,
+        max_workers: int,
+        executor: Optional[Executor]
+) -> List[str]:
+    """
+    Recognizes the text in each of the `rois` (see `extract_text`).
 
-    return texts
+    """
+    if batch and rois:
+        strip, offsets = pack_rois(rois)
+        return assign_words(
+            tesseract.image_to_data(
+                strip,
+                config=TESSERACT_STRIP_CONFIG,
+                output_type=tesseract.Output.DICT
+            ),
+            offsets
+        )
+    if executor is not None:
+        return list(executor.map(_recognize_roi, rois))
+    if max_workers > 1 and len(rois) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(_recognize_roi, rois))
+    return [_recognize_roi(roi) for roi in rois]
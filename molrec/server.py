@@ -0,0 +1,344 @@
+"""
+A self-hosted HTTP recognition service.
+
+Models are loaded once at startup, before a pool of worker processes is
+forked, and image uploads are dispatched to the pool:
+
+    python -m molrec.server --port 8080 --workers 4
+
+    curl --data-binary @molecule.png http://localhost:8080/recognize
+
+Endpoints:
+    POST /recognize: Recognizes the uploaded image file, returning a JSON
+                     record of its vertices, edges, text and stage timings.
+                     Text is detected when the server is started with
+                     --text, which loads the EAST model at startup, unless
+                     disabled per request with ?text=0. Responds with 400
+                     for ?text=1 if the server was started without --text,
+                     422 if the image cannot be decoded, or 500 if
+                     recognition fails otherwise.
+    GET /health: Reports whether the service is available, or the error
+                 raised while loading the models if not.
+    GET /metrics: Reports request counters and latencies.
+
+"""
+import argparse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .cli import (
+    add_detector_arguments,
+    detector_params_from_args,
+    init_worker,
+    recognize,
+    worker_warmup_error
+)
+
+
+class Metrics:
+    """
+    Thread-safe request counters and latencies of the service.
+
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency_total = 0.
+        self.latency_max = 0.
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+
+    def end(self, latency: float, error: bool):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += error
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = self.requests - self.in_flight
+            return {
+                'uptime': time.time() - self.started,
+                'requests': self.requests,
+                'errors': self.errors,
+                'in_flight': self.in_flight,
+                'latency_mean': (
+                    self.latency_total / completed if completed else 0.
+                ),
+                'latency_max': self.latency_max
+            }
+
+
+class RecognitionServer(ThreadingHTTPServer):
+    """
+    HTTP server which dispatches recognition requests to a pool of worker
+    processes.
+
+    Each request is handled in its own thread, which waits on the pool, so
+    that the number of images processed at once is bounded by the number of
+    workers.
+
+    If the models fail to load, the error is recorded in `warmup_error` and
+    the service reports itself unavailable, rather than failing each request
+    once it times out.
+
+    """
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address: Tuple[str, int],
+            workers: int = 1,
+            text: bool = False,
+            max_upload_bytes: int = 32 * 1024 ** 2,
+            timeout: Optional[float] = 60.,
+            quiet: bool = False,
+            detector_params: Optional[Mapping[str, Any]] = None
+    ):
+        """
+        Args:
+            address: The (host, port) on which to listen.
+            workers: The number of worker processes.
+            text: Whether to detect text in images, unless disabled per
+                  request. The EAST model is then loaded before the workers
+                  are forked. Otherwise, requests for text are rejected.
+            max_upload_bytes: The maximum size of an uploaded image.
+            timeout: The maximum time in seconds to wait for a result.
+            quiet: Whether to suppress the logging of each request.
+            detector_params: Keyword arguments to
+                             `feature_detection.detect_edges`, used for every
+                             request (see `process_molecule_image`).
+
+        """
+        super().__init__(address, RecognitionRequestHandler)
+        self.text = text
+        self.max_upload_bytes = max_upload_bytes
+        self.timeout = timeout
+        self.quiet = quiet
+        self.metrics = Metrics()
+        self.workers = workers
+        self.detector_params = dict(detector_params or {})
+        self.warmup_error: Optional[str] = None
+
+        # Load models in the parent, so that forked workers share them
+        # copy-on-write rather than each reading them from disk
+        if text:
+            from .molecule_detection.text_detection import east_model
+            try:
+                east_model.load_model_data()
+            except Exception as exc:
+                self.warmup_error = f'{type(exc).__name__}: {exc}'
+        context = multiprocessing.get_context(
+            'fork' if 'fork' in multiprocessing.get_all_start_methods()
+            else None
+        )
+        self.pool = context.Pool(
+            processes=workers,
+            initializer=init_worker,
+            initargs=(text, self.detector_params)
+        )
+        if self.warmup_error is None:
+            # Every worker loads the same models, so one probe suffices
+            self.warmup_error = self.pool.apply_async(
+                worker_warmup_error
+            ).get(timeout)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.terminate()
+        self.pool.join()
+
+
+class RecognitionRequestHandler(BaseHTTPRequestHandler):
+    server: RecognitionServer
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/health':
+            if self.server.warmup_error is not None:
+                self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {
+                    'status': 'unavailable',
+                    'workers': self.server.workers,
+                    'error': self.server.warmup_error
+                })
+            else:
+                self._send_json(HTTPStatus.OK, {
+                    'status': 'ok',
+                    'workers': self.server.workers
+                })
+        elif path == '/metrics':
+            self._send_json(HTTPStatus.OK, self.server.metrics.to_dict())
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f'Unknown path {path}')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/recognize':
+            self._send_error(
+                HTTPStatus.NOT_FOUND, f'Unknown path {url.path}'
+            )
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            self._send_error(HTTPStatus.LENGTH_REQUIRED, 'No image uploaded')
+            return
+        if length > self.server.max_upload_bytes:
+            # Discard the upload before responding, as clients may not read
+            # the response until they have finished sending
+            self.close_connection = True
+            while length > 0:
+                chunk = self.rfile.read(min(length, 64 * 1024))
+                if not chunk:
+                    break
+                length -= len(chunk)
+            self._send_error(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f'Image exceeds {self.server.max_upload_bytes} bytes'
+            )
+            return
+        data = self.rfile.read(length)
+        if self.server.warmup_error is not None:
+            self._send_error(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                f'Failed to load models: {self.server.warmup_error}'
+            )
+            return
+
+        query = parse_qs(url.query)
+        text = self.server.text
+        if 'text' in query:
+            text = query['text'][-1].lower() in ('1', 'true', 'yes')
+        if text and not self.server.text:
+            # The EAST model is only loaded at startup with --text, so each
+            # worker would otherwise load it from disk on its first request
+            self._send_error(
+                HTTPStatus.BAD_REQUEST,
+                'Text detection is not enabled; start the server with --text'
+            )
+            return
+
+        metrics = self.server.metrics
+        start = time.perf_counter()
+        metrics.begin()
+        status = HTTPStatus.OK
+        try:
+            result = self.server.pool.apply_async(
+                recognize, (data, text, self.server.detector_params)
+            )
+            record = result.get(self.server.timeout)
+        except multiprocessing.TimeoutError:
+            status = HTTPStatus.GATEWAY_TIMEOUT
+            record = {'error': 'Timed out waiting for recognition'}
+        else:
+            if record['error_kind'] == 'decode':
+                status = HTTPStatus.UNPROCESSABLE_ENTITY
+            elif record['error'] is not None:
+                status = HTTPStatus.INTERNAL_SERVER_ERROR
+        finally:
+            metrics.end(
+                time.perf_counter() - start, error=status != HTTPStatus.OK
+            )
+        self._send_json(status, record)
+
+    def _send_error(self, status: HTTPStatus, message: str):
+        self._send_json(status, {'error': message})
+
+    def _send_json(self, status: HTTPStatus, body: Dict[str, Any]):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Entry point of the recognition service.
+
+    Returns:
+        Exit status - 0 once the service is stopped, or 1 if the models
+        failed to load.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='molrec.server',
+        description='Serve molecule recognition over HTTP.'
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument(
+        '-j', '--workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Number of worker processes. Defaults to the number of CPUs.'
+    )
+    parser.add_argument(
+        '--text',
+        action='store_true',
+        help='Detect and recognize text, unless disabled per request with '
+             '?text=0. Requires the EAST model and Tesseract.'
+    )
+    parser.add_argument(
+        '--max-upload-mb',
+        type=float,
+        default=32.,
+        help='Maximum size of an uploaded image in megabytes.'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=60.,
+        help='Maximum time in seconds to wait for a result.'
+    )
+    add_detector_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = RecognitionServer(
+        (args.host, args.port),
+        workers=args.workers,
+        text=args.text,
+        max_upload_bytes=int(args.max_upload_mb * 1024 ** 2),
+        timeout=args.timeout,
+        detector_params=detector_params_from_args(args)
+    )
+    if server.warmup_error is not None:
+        print(
+            f'molrec.server: failed to load models: {server.warmup_error}',
+            file=sys.stderr
+        )
+        server.server_close()
+        return 1
+    host, port = server.server_address[:2]
+    print(f'Serving on http://{host}:{port}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
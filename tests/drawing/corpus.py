@@ -0,0 +1,458 @@
+"""
+Generates a corpus of random synthetic molecule drawings, with ground truth,
+across worker processes:
+
+    python -m tests.drawing.corpus corpus/ -n 5000 -j 8
+
+Each (grayscale) image `<index>.png` is stored next to `<index>.json`, which
+records the ground-truth vertex coordinates, the edges between them (as
+pairs of vertex indices) and the text labels with their bounding boxes,
+along with the drawing parameters.
+
+Molecules are built from fused rings, zigzag chains and single-atom
+substituents, some of whose terminal atoms are drawn as text labels. Each
+drawing is randomly rotated, scaled and stroked, and optionally noised.
+Every image is generated from its own seed, derived from the corpus seed and
+its index, so the corpus does not depend on the number of workers.
+
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import json
+import math
+import os
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .shapes import ShapeImage
+
+LABELS = ['OH', 'NH2', 'Cl', 'Br', 'F', 'O', 'N', 'CH3', 'COOH']
+
+# Atoms closer than this (in bond lengths) are considered coincident
+_MERGE_DISTANCE = 0.1
+
+# New atoms must be at least this far (in bond lengths) from existing ones
+_MIN_SEPARATION = 0.7
+
+
+class _Skeleton:
+    """
+    A molecular skeleton in units of bond length, to which rings, chains and
+    substituents are added.
+
+    """
+    def __init__(self):
+        self.vertices: List[np.ndarray] = []
+        self.edges: set = set()
+        self.ring_centres: List[np.ndarray] = []
+
+    def degree(self, vertex: int) -> int:
+        return sum(vertex in edge for edge in self.edges)
+
+    def neighbours(self, vertex: int) -> List[int]:
+        return [
+            other for edge in self.edges for other in edge
+            if vertex in edge and other != vertex
+        ]
+
+    def find(self, point: np.ndarray, distance: float) -> Optional[int]:
+        """The index of a vertex within `distance` of `point`, if any."""
+        for index, vertex in enumerate(self.vertices):
+            if np.linalg.norm(vertex - point) < distance:
+                return index
+        return None
+
+    def add_vertex(self, point: np.ndarray) -> int:
+        index = self.find(point, _MERGE_DISTANCE)
+        if index is None:
+            self.vertices.append(point)
+            index = len(self.vertices) - 1
+        return index
+
+    def add_edge(self, start: int, end: int):
+        if start != end:
+            self.edges.add((min(start, end), max(start, end)))
+
+    def add_ring(self, n_atoms: int, edge: Optional[Tuple[int, int]] = None):
+        """
+        Adds a regular ring of `n_atoms`, fused to the existing `edge` on the
+        side away from the rings which already share it, if given.
+
+        """
+        circumradius = 1 / (2 * math.sin(math.pi / n_atoms))
+        if edge is None:
+            centre = np.zeros(2)
+            angle = math.pi / 2
+        else:
+            start, end = (self.vertices[index] for index in edge)
+            midpoint = (start + end) / 2
+            normal = np.array([start[1] - end[1], end[0] - start[0]])
+            apothem = circumradius * math.cos(math.pi / n_atoms)
+            centre = midpoint + normal * apothem
+            # Build on whichever side of the edge is free
+            if self.find(centre, 1.) is not None or any(
+                    np.linalg.norm(centre - other) < 1.2
+                    for other in self.ring_centres
+            ):
+                centre = midpoint - normal * apothem
+            angle = math.atan2(*(start - centre)[::-1])
+
+        if any(
+                np.linalg.norm(centre - other) < 1.2
+                for other in self.ring_centres
+        ):
+            return
+        points = [
+            centre + circumradius * np.array([
+                math.cos(angle + 2 * math.pi * ii / n_atoms),
+                math.sin(angle + 2 * math.pi * ii / n_atoms)
+            ])
+            for ii in range(n_atoms)
+        ]
+        # The ring must not pass through atoms other than the fused edge
+        for point in points:
+            index = self.find(point, _MIN_SEPARATION)
+            if index is not None and (edge is None or index not in edge):
+                return
+
+        self.ring_centres.append(centre)
+        indices = [self.add_vertex(point) for point in points]
+        for ii, index in enumerate(indices):
+            self.add_edge(index, indices[(ii + 1) % n_atoms])
+
+    def outward(self, vertex: int) -> np.ndarray:
+        """The unit direction pointing away from the neighbours of `vertex`."""
+        point = self.vertices[vertex]
+        neighbours = self.neighbours(vertex)
+        if not neighbours:
+            return np.array([1., 0.])
+        direction = point - np.mean(
+            [self.vertices[other] for other in neighbours], axis=0
+        )
+        norm = np.linalg.norm(direction)
+        if norm < 1e-6:
+            # Opposite neighbours - branch perpendicular to them
+            other = self.vertices[neighbours[0]] - point
+            direction, norm = np.array([-other[1], other[0]]), 1.
+        return direction / norm
+
+    def extend(
+            self,
+            vertex: int,
+            direction: np.ndarray,
+            length: int,
+            zigzag: bool = True
+    ) -> Optional[int]:
+        """
+        Grows a chain of `length` atoms from `vertex`, in a zigzag about
+        `direction`, stopping early if it would approach existing atoms.
+
+        Returns:
+            The last atom of the chain, if any were added.
+
+        """
+        heading = math.atan2(direction[1], direction[0])
+        last = None
+        for ii in range(length):
+            turn = math.pi / 6 * (1 if ii % 2 else -1) if zigzag else 0.
+            point = self.vertices[vertex] + np.array([
+                math.cos(heading + turn), math.sin(heading + turn)
+            ])
+            if self.find(point, _MIN_SEPARATION) is not None:
+                break
+            new = self.add_vertex(point)
+            self.add_edge(vertex, new)
+            vertex = last = new
+        return last
+
+
+def _build_skeleton(
+        rng: np.random.Generator,
+        max_rings: int,
+        max_chain: int,
+        max_substituents: int
+) -> _Skeleton:
+    """Builds a random skeleton of rings, chains and substituents."""
+    skeleton = _Skeleton()
+
+    n_rings = rng.integers(0, max_rings + 1)
+    for ring in range(n_rings):
+        n_atoms = int(rng.choice([5, 6, 6, 6]))
+        if ring == 0:
+            skeleton.add_ring(n_atoms)
+        else:
+            edges = sorted(skeleton.edges)
+            skeleton.add_ring(n_atoms, edges[rng.integers(len(edges))])
+
+    if not skeleton.vertices:
+        skeleton.add_vertex(np.zeros(2))
+        skeleton.extend(0, np.array([1., 0.]), max(max_chain, 1))
+
+    for _ in range(rng.integers(0, 3)):
+        candidates = [
+            vertex for vertex in range(len(skeleton.vertices))
+            if skeleton.degree(vertex) <= 2
+        ]
+        if not candidates:
+            break
+        vertex = candidates[rng.integers(len(candidates))]
+        skeleton.extend(
+            vertex, skeleton.outward(vertex), rng.integers(1, max_chain + 1)
+        )
+
+    for _ in range(rng.integers(0, max_substituents + 1)):
+        candidates = [
+            vertex for vertex in range(len(skeleton.vertices))
+            if skeleton.degree(vertex) == 2
+        ]
+        if not candidates:
+            break
+        vertex = candidates[rng.integers(len(candidates))]
+        skeleton.extend(vertex, skeleton.outward(vertex), 1, zigzag=False)
+
+    return skeleton
+
+
+def generate_molecule(
+        rng: np.random.Generator,
+        size: int = 1000,
+        max_rings: int = 3,
+        max_chain: int = 5,
+        max_substituents: int = 3,
+        label_probability: float = 0.5,
+        thickness: Tuple[int, int] = (1, 4),
+        noise: float = 0.
+) -> Tuple[ShapeImage, Dict[str, Any]]:
+    """
+    Draws a random molecule.
+
+    All bonds are drawn with a single `ShapeImage.add_polylines` call.
+    Labelled atoms are drawn as text on a white background, so that their
+    bonds stop short of the label.
+
+    Args:
+        rng: The random number generator.
+        size: The width and height of the image in pixels.
+        max_rings: The maximum number of fused rings.
+        max_chain: The maximum length of each chain.
+        max_substituents: The maximum number of single-atom substituents.
+        label_probability: The probability that each terminal atom is drawn
+                           as a text label.
+        thickness: The range of stroke widths in pixels.
+        noise: The maximum standard deviation of the Gaussian noise added to
+               the image. Even slight noise produces thousands of spurious
+               segments with the default line detector settings, so it is
+               off by default.
+
+    Returns:
+        Tuple of the image and its ground truth: the vertex coordinates, the
+        edges as pairs of vertex indices, and the labels with the index of
+        their vertex and their (start_x, start_y, end_x, end_y) bounding box,
+        along with the drawing parameters.
+
+    """
+    skeleton = _build_skeleton(rng, max_rings, max_chain, max_substituents)
+    points = np.array(skeleton.vertices)
+    edges = np.array(sorted(skeleton.edges), dtype=np.int64).reshape(-1, 2)
+
+    rotation = float(rng.uniform(0, 2 * math.pi))
+    cos, sin = math.cos(rotation), math.sin(rotation)
+    points = points @ np.array([[cos, sin], [-sin, cos]])
+    # Centre the bounding box, rather than the mean, so that the scaled
+    # extent of a lopsided molecule fits either side of the centre
+    points -= (points.min(axis=0) + points.max(axis=0)) / 2
+
+    # Scale the molecule to fit, with a margin for labels
+    extent = max(np.ptp(points, axis=0).max(), 1.)
+    bond_length = float(min(rng.uniform(size / 20, size / 8),
+                            0.7 * size / extent))
+    vertices = np.around(points * bond_length + size / 2).astype(np.int64)
+
+    stroke = int(rng.integers(thickness[0], thickness[1] + 1))
+    image = ShapeImage.new(size, size)
+    image.add_polylines(
+        vertices[edges], thickness=stroke, lineType=cv2.LINE_AA
+    )
+
+    font_scale = bond_length / 60
+    font_thickness = max(int(round(font_scale * 1.5)), 1)
+    labels = []
+    for vertex in range(len(vertices)):
+        if (
+                skeleton.degree(vertex) != 1
+                or rng.random() >= label_probability
+        ):
+            continue
+        text = str(rng.choice(LABELS))
+        (width, height), baseline = cv2.getTextSize(
+            text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness
+        )
+        x, y = vertices[vertex]
+        box = [
+            int(x - width // 2),
+            int(y - height // 2),
+            int(x - width // 2 + width),
+            int(y - height // 2 + height + baseline)
+        ]
+        if min(box) < 0 or max(box) >= size:
+            continue
+        cv2.rectangle(image, tuple(box[:2]), tuple(box[2:]), (255,) * 3, -1)
+        image.add_text(
+            text,
+            (box[0], box[1] + height),
+            font_scale=font_scale,
+            thickness=font_thickness,
+            lineType=cv2.LINE_AA
+        )
+        labels.append({'text': text, 'vertex': vertex, 'box': box})
+
+    sigma = float(rng.uniform(0, noise))
+    if sigma:
+        # Gray noise, as in a scan, generated in float32 for one channel and
+        # broadcast to the others
+        noisy = image + sigma * rng.standard_normal(
+            (size, size, 1), dtype=np.float32
+        )
+        np.clip(noisy, 0, 255, out=noisy)
+        image[:] = noisy
+
+    return image, {
+        'size': size,
+        'rotation': rotation,
+        'bond_length': bond_length,
+        'thickness': stroke,
+        'noise': sigma,
+        'vertices': vertices.tolist(),
+        'edges': edges.tolist(),
+        'labels': labels
+    }
+
+
+def _generate_chunk(
+        directory: str,
+        indices: Sequence[int],
+        seed: int,
+        options: Dict[str, Any]
+) -> List[str]:
+    """
+    Generates and stores the images of the given `indices`.
+
+    Returns:
+        The paths of the images.
+
+    """
+    paths = []
+    for index in indices:
+        image, truth = generate_molecule(
+            np.random.default_rng([seed, index]), **options
+        )
+        path = os.path.join(directory, f'{index:06d}.png')
+        # The drawings are gray, so a single channel is written. Noise
+        # defeats PNG's dictionary compression, so only Huffman coding is used
+        cv2.imwrite(
+            path,
+            cv2.cvtColor(image, cv2.COLOR_BGR2GRAY),
+            [
+                cv2.IMWRITE_PNG_COMPRESSION, 1,
+                cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY
+            ]
+        )
+        with open(os.path.join(directory, f'{index:06d}.json'), 'w') as fh:
+            json.dump(truth, fh)
+        paths.append(path)
+    return paths
+
+
+def _chunks(n_images: int, chunk_size: int) -> Iterator[range]:
+    for start in range(0, n_images, chunk_size):
+        yield range(start, min(start + chunk_size, n_images))
+
+
+def generate_corpus(
+        directory: str,
+        n_images: int,
+        workers: Optional[int] = None,
+        seed: int = 0,
+        chunk_size: int = 32,
+        **options
+) -> List[str]:
+    """
+    Generates a corpus of `n_images` random molecule drawings in `directory`,
+    each stored next to its ground truth (see `generate_molecule`).
+
+    Args:
+        directory: The output directory, which is created if required.
+        n_images: The number of images.
+        workers: The number of worker processes. Defaults to the number of
+                 CPUs. If one, the images are generated in this process.
+        seed: The corpus seed, from which the seed of each image is derived.
+        chunk_size: The number of images generated per task.
+        options: Keyword arguments for `generate_molecule`.
+
+    Returns:
+        The paths of the images, in order.
+
+    Raises:
+        ValueError: If `n_images` is negative or `chunk_size` is less than
+                    one.
+
+    """
+    if n_images < 0:
+        raise ValueError(f'n_images must not be negative, got {n_images}')
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be at least 1, got {chunk_size}')
+    os.makedirs(directory, exist_ok=True)
+
+    generate = functools.partial(
+        _generate_chunk, directory, seed=seed, options=options
+    )
+    chunks = _chunks(n_images, chunk_size)
+    if workers == 1:
+        return [path for chunk in chunks for path in generate(chunk)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [
+            path for paths in executor.map(generate, chunks) for path in paths
+        ]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Generate random molecule drawings with ground truth.'
+    )
+    parser.add_argument('directory', help='The output directory.')
+    parser.add_argument('-n', '--images', type=int, default=1000)
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--max-rings', type=int, default=3)
+    parser.add_argument('--max-chain', type=int, default=5)
+    parser.add_argument(
+        '--label-probability', type=float, default=0.5
+    )
+    parser.add_argument(
+        '--noise', type=float, default=0.,
+        help='The maximum standard deviation of the image noise.'
+    )
+    args = parser.parse_args(argv)
+
+    paths = generate_corpus(
+        args.directory,
+        args.images,
+        workers=args.workers,
+        seed=args.seed,
+        size=args.size,
+        max_rings=args.max_rings,
+        max_chain=args.max_chain,
+        label_probability=args.label_probability,
+        noise=args.noise
+    )
+    print(f'Generated {len(paths)} images in {args.directory}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,7 @@
 """
 from __future__ import annotations
 
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple, Union
 
 import cv2
 import numpy as np
@@ -87,7 +87,7 @@ class ShapeImage(np.ndarray):
                     Defaults to ShapeImage.default_colour.
             rotation_angle: Anticlockwise coordinate rotation angle (around
                             shape center) in radians. Defaults to zero.
-            kwargs: Additional keyword arguments for cv2.line.
+            kwargs: Additional keyword arguments for cv2.polylines.
 
         Returns:
             ShapeImage.
@@ -101,23 +101,68 @@ class ShapeImage(np.ndarray):
             point=average
         )
 
-        for x, y in transformed:
-            if x < 0 or x > self.shape[0] or y < 0 or y > self.shape[1]:
-                raise ValueError(
-                    f'Transformed image coordinate {(x, y)} out of bounds for '
-                    f'image of size {self.shape}'
-                )
-
-        for ii, coord in enumerate(transformed):
-            next_index = ii + 1 if ii + 1 < len(transformed) else 0
-            cv2.line(
-                self,
-                tuple(coord),
-                tuple(transformed[next_index]),
-                tuple(reversed(colour or self.default_colour)),
-                **kwargs
+        return self.add_polylines(
+            [transformed], is_closed=True, colour=colour, **kwargs
+        )
+
+    def add_polylines(
+            self,
+            polylines: Union[np.ndarray, Sequence[np.ndarray]],
+            is_closed: bool = False,
+            colour: Optional[utils.RGBColour] = None,
+            **kwargs
+    ) -> ShapeImage:
+        """
+        Draws many polylines (e.g. every bond of a molecule) with a single
+        call to cv2.polylines, after a single bounds check of all their
+        coordinates.
+
+        Args:
+            polylines: Sequence of N x 2 arrays of (x, y) vertex coordinates,
+                       or an M x N x 2 array, e.g. M x 2 x 2 for M separate
+                       segments.
+            is_closed: Whether to join the last vertex of each polyline to
+                       its first.
+            colour: Line colour in RGB format.
+                    Defaults to ShapeImage.default_colour.
+            kwargs: Additional keyword arguments for cv2.polylines.
+
+        Returns:
+            ShapeImage.
+
+        Raises:
+            ValueError: If any coordinate lies outside the image.
+
+        """
+        polylines = [
+            np.asarray(polyline, dtype=np.int32).reshape(-1, 2)
+            for polyline in polylines
+        ]
+        if not polylines:
+            return self
+
+        coords = np.concatenate(polylines)
+        # x indexes the columns of the image and y its rows
+        out_of_bounds = (
+            (coords < 0).any(axis=1)
+            | (coords[:, 0] >= self.shape[1])
+            | (coords[:, 1] >= self.shape[0])
+        )
+        if out_of_bounds.any():
+            raise ValueError(
+                f'Transformed image coordinate '
+                f'{tuple(coords[out_of_bounds][0].tolist())} out of bounds '
+                f'for image of size {self.shape}'
             )
 
+        cv2.polylines(
+            self,
+            polylines,
+            is_closed,
+            tuple(reversed(colour or self.default_colour)),
+            **kwargs
+        )
+
         return self
 
     def add_text(
@@ -170,7 +215,7 @@ class ShapeImage(np.ndarray):
                     Defaults to ShapeImage.default_colour.
             rotation_angle: Anticlockwise coordinate rotation angle (around
                             shape center) in radians. Defaults to zero.
-            kwargs: Additional keyword arguments for cv2.line.
+            kwargs: Additional keyword arguments for cv2.polylines.
 
         Returns:
             ShapeImage.
@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from .corpus import generate_corpus, generate_molecule
+
+
+class TestGenerateMolecule(unittest.TestCase):
+    def test_deterministic(self):
+        """Tests that a molecule is determined by its seed."""
+        image1, truth1 = generate_molecule(np.random.default_rng(1))
+        image2, truth2 = generate_molecule(np.random.default_rng(1))
+        np.testing.assert_array_equal(image1, image2)
+        self.assertEqual(truth1, truth2)
+
+    def test_ground_truth(self):
+        """
+        Tests that the ground truth matches the drawing: bonds are drawn
+        between the vertices, and labels are drawn on terminal vertices.
+        """
+        for seed in range(10):
+            with self.subTest(seed=seed):
+                image, truth = generate_molecule(
+                    np.random.default_rng(seed), size=500
+                )
+                vertices = np.array(truth['vertices'])
+                edges = np.array(truth['edges'])
+                self.assertEqual((500, 500, 3), image.shape)
+                self.assertTrue(((vertices >= 0) & (vertices < 500)).all())
+                self.assertTrue(((edges >= 0) & (edges < len(vertices))).all())
+                self.assertEqual(
+                    len(edges), len({tuple(edge) for edge in edges.tolist()})
+                )
+
+                degrees = np.bincount(edges.ravel(), minlength=len(vertices))
+                boxes = []
+                for label in truth['labels']:
+                    self.assertEqual(1, degrees[label['vertex']])
+                    start_x, start_y, end_x, end_y = label['box']
+                    boxes.append(label['box'])
+                    # The text is drawn within its box
+                    self.assertTrue(
+                        (image[start_y:end_y, start_x:end_x] < 128).any()
+                    )
+
+                for start, end in vertices[edges]:
+                    x, y = (start + end) // 2
+                    if any(
+                            box[0] <= x <= box[2] and box[1] <= y <= box[3]
+                            for box in boxes
+                    ):
+                        continue
+                    # Allow for rounding at thin strokes
+                    self.assertTrue(
+                        (image[y - 1:y + 2, x - 1:x + 2] < 200).any()
+                    )
+
+    def test_lopsided_in_bounds(self):
+        """
+        Tests that a molecule whose atoms are unevenly distributed about
+        their mean is drawn within the image.
+        """
+        image, truth = generate_molecule(
+            np.random.default_rng([1, 240]), size=300, max_rings=0,
+            max_chain=15
+        )
+        vertices = np.array(truth['vertices'])
+        self.assertTrue(((vertices >= 0) & (vertices < 300)).all())
+
+    def test_noise(self):
+        """Tests that noise is only added on request, and recorded."""
+        image, truth = generate_molecule(np.random.default_rng(0))
+        self.assertEqual(0, truth['noise'])
+        # The background is pure white
+        self.assertTrue((image[:10, :10] == 255).all())
+
+        noisy, truth = generate_molecule(np.random.default_rng(0), noise=5)
+        self.assertGreater(truth['noise'], 0)
+        self.assertGreater(np.count_nonzero(noisy != image), 0)
+
+
+class TestGenerateCorpus(unittest.TestCase):
+    def test_corpus(self):
+        """
+        Tests that each image is stored next to its ground truth, identically
+        with any number of workers.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            serial = os.path.join(directory, 'serial')
+            parallel = os.path.join(directory, 'parallel')
+            paths = generate_corpus(
+                serial, 5, workers=1, seed=3, size=400
+            )
+            generate_corpus(
+                parallel, 5, workers=2, seed=3, chunk_size=2, size=400
+            )
+
+            self.assertEqual(
+                [os.path.join(serial, f'{ii:06d}.png') for ii in range(5)],
+                paths
+            )
+            for ii in range(5):
+                name = f'{ii:06d}'
+                image = cv2.imread(
+                    os.path.join(serial, f'{name}.png'), cv2.IMREAD_UNCHANGED
+                )
+                self.assertEqual((400, 400), image.shape)
+                np.testing.assert_array_equal(image, cv2.imread(
+                    os.path.join(parallel, f'{name}.png'),
+                    cv2.IMREAD_UNCHANGED
+                ))
+                with open(os.path.join(serial, f'{name}.json')) as fh:
+                    truth = json.load(fh)
+                with open(os.path.join(parallel, f'{name}.json')) as fh:
+                    self.assertEqual(truth, json.load(fh))
+                self.assertEqual(400, truth['size'])
+
+    def test_invalid_arguments(self):
+        """Tests that invalid corpus sizes and chunk sizes are rejected."""
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                generate_corpus(directory, -1)
+            with self.assertRaises(ValueError):
+                generate_corpus(directory, 1, chunk_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
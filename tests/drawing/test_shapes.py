@@ -1,5 +1,8 @@
 import unittest
 
+import cv2
+import numpy as np
+
 from .shapes import ShapeImage
 
 # TODO: rotation_angle tests
@@ -10,7 +13,7 @@ class TestShapeImage(unittest.TestCase):
         self.image = ShapeImage.new(1000, 1000)
 
     def test_line(self):
-        image = self.image.add_line((0, 0), (1000, 1000))
+        image = self.image.add_line((0, 0), (999, 999))
         self.assertIsInstance(image, ShapeImage)
 
     def test_square(self):
@@ -27,23 +30,71 @@ class TestShapeImage(unittest.TestCase):
 
     def test_out_of_bounds_left(self):
         with self.assertRaises(ValueError):
-            self.image.add_line((-1, 0), (1000, 1000))
+            self.image.add_line((-1, 0), (999, 999))
 
     def test_out_of_bounds_right(self):
         with self.assertRaises(ValueError):
-            self.image.add_line((10, 0), (1001, 1000))
+            self.image.add_line((10, 0), (1000, 999))
 
     def test_out_of_bounds_top(self):
         with self.assertRaises(ValueError):
-            self.image.add_line((0, -1), (1000, 1000))
+            self.image.add_line((0, -1), (999, 999))
 
     def test_out_of_bounds_bottom(self):
         with self.assertRaises(ValueError):
-            self.image.add_line((0, 0), (1000, 1001))
+            self.image.add_line((0, 0), (999, 1000))
 
     def test_text(self):
         self.image.add_text('Test Text', (600, 600))
 
+    def test_polylines(self):
+        """
+        Tests that many segments are drawn in one call, identically to drawing
+        each line.
+        """
+        segments = np.array([
+            [[100, 100], [300, 120]],
+            [[300, 120], [250, 400]],
+            [[600, 600], [900, 700]]
+        ])
+        image = self.image.add_polylines(segments, thickness=3)
+        self.assertIsInstance(image, ShapeImage)
+
+        expected = np.full((1000, 1000, 3), 255, dtype=np.uint8)
+        for start, end in segments:
+            cv2.line(expected, tuple(start), tuple(end), (0, 0, 0), 3)
+        np.testing.assert_array_equal(expected, image)
+
+    def test_shape_matches_lines(self):
+        """Tests that a shape is drawn identically to joining its vertices."""
+        coords = [(100, 100), (300, 100), (300, 400), (100, 400)]
+        self.image.add_shape(coords, thickness=2)
+
+        expected = np.full((1000, 1000, 3), 255, dtype=np.uint8)
+        for ii, start in enumerate(coords):
+            cv2.line(
+                expected, start, coords[(ii + 1) % len(coords)], (0, 0, 0), 2
+            )
+        np.testing.assert_array_equal(expected, self.image)
+
+    def test_polylines_out_of_bounds(self):
+        with self.assertRaises(ValueError):
+            self.image.add_polylines([
+                np.array([[0, 0], [10, 10]]),
+                np.array([[10, 10], [1001, 10]])
+            ])
+
+    def test_polylines_bounds_not_square(self):
+        """
+        Tests that x is bounded by the number of columns and y by the number
+        of rows of a non-square image.
+        """
+        image = ShapeImage(np.full((200, 500, 3), 255, dtype=np.uint8))
+        image.add_polylines([np.array([[0, 0], [499, 199], [300, 10]])])
+        for end in ([500, 199], [499, 200]):
+            with self.subTest(end=end), self.assertRaises(ValueError):
+                image.add_polylines([np.array([[0, 0], [10, 10]]), [end]])
+
 
 if __name__ == '__main__':
     unittest.main()
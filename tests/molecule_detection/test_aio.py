@@ -0,0 +1,136 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import unittest
+from unittest import mock
+
+import cv2
+
+from molrec.molecule_detection import text_recognition
+from molrec.molecule_detection.aio import AsyncRecognizer
+from tests.drawing import ShapeImage
+
+
+class TestAsyncRecognizer(unittest.TestCase):
+    def test_process_molecule_image(self):
+        """Tests that the pipeline can be awaited."""
+        image = ShapeImage.new(1000, 1000).add_regular_hexagon(
+            100, start_coord=(400, 400)
+        )
+        data = cv2.imencode('.png', image)[1].tobytes()
+
+        async def run():
+            async with AsyncRecognizer() as recognizer:
+                return await recognizer.process_molecule_image(data)
+
+        result = asyncio.run(run())
+        self.assertEqual(6, len(result.vertices))
+        self.assertEqual(6, len(result.edges))
+
+    def test_extract_text(self):
+        """Tests that keyword arguments are passed to extract_text."""
+        with mock.patch.object(
+                text_recognition, 'extract_text', return_value=[]
+        ) as extract_text:
+            async def run():
+                async with AsyncRecognizer() as recognizer:
+                    return await recognizer.extract_text(
+                        'image', [(0, 0, 1, 1)], batch=True
+                    )
+
+            self.assertEqual([], asyncio.run(run()))
+        extract_text.assert_called_once_with(
+            'image', [(0, 0, 1, 1)], batch=True
+        )
+
+    def test_max_concurrency(self):
+        """Tests that no more than max_concurrency calls run at once."""
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def work():
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        async def run():
+            # The executor has more threads than the concurrency limit
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                recognizer = AsyncRecognizer(
+                    max_concurrency=2, executor=executor
+                )
+                await asyncio.gather(
+                    *(recognizer.run(work) for _ in range(8))
+                )
+
+        asyncio.run(run())
+        self.assertEqual(2, max_running[0])
+
+    def test_timeout(self):
+        """
+        Tests that a call times out, and that its slot is held until the work
+        has actually finished.
+        """
+        finished = threading.Event()
+
+        def slow():
+            time.sleep(0.3)
+            finished.set()
+
+        async def run():
+            async with AsyncRecognizer(max_concurrency=1) as recognizer:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await recognizer.run(slow, timeout=0.05)
+                # The next call only starts once the slow call has finished
+                await recognizer.run(lambda: self.assertTrue(finished.is_set()))
+
+        asyncio.run(run())
+
+    def test_cancel_queued(self):
+        """Tests that a cancelled call waiting for a slot never runs."""
+        calls = []
+
+        async def run():
+            async with AsyncRecognizer(max_concurrency=1) as recognizer:
+                first = asyncio.ensure_future(
+                    recognizer.run(time.sleep, 0.1)
+                )
+                second = asyncio.ensure_future(
+                    recognizer.run(calls.append, 'second')
+                )
+                await asyncio.sleep(0.01)
+                second.cancel()
+                await first
+                with self.assertRaises(asyncio.CancelledError):
+                    await second
+
+        asyncio.run(run())
+        self.assertEqual([], calls)
+
+    def test_event_loop_responsive(self):
+        """Tests that the event loop runs while blocking work is running."""
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            task = asyncio.ensure_future(heartbeat())
+            async with AsyncRecognizer() as recognizer:
+                await recognizer.run(time.sleep, 0.2)
+            task.cancel()
+
+        asyncio.run(run())
+        self.assertGreater(len(ticks), 5)
+
+    def test_invalid_concurrency(self):
+        """Tests that ValueError is raised for an invalid limit."""
+        with self.assertRaises(ValueError):
+            AsyncRecognizer(max_concurrency=0)
@@ -1,4 +1,5 @@
 import math
+import threading
 from typing import Callable, List, Optional, Tuple
 import unittest
 
@@ -7,6 +8,7 @@ import numpy as np
 
 from molrec.molecule_detection.feature_detection import (
     detect_edges,
+    get_line_detector,
     get_vertices_from_edges,
     remove_parallel_edges
 )
@@ -22,6 +24,8 @@ def to_grey(image: ShapeImage) -> ShapeImage:
 
 
 class TestParallelLineRemoval(unittest.TestCase):
+    method = 'vectorized'
+
     def test_adjacent_parallel_lines_identical(self):
         """
         Tests that one line is removed when there are two identical lines.
@@ -35,7 +39,7 @@ class TestParallelLineRemoval(unittest.TestCase):
             np.array([
                 [[1, 1, 6, 6]]
             ]),
-            remove_parallel_edges(lines)
+            remove_parallel_edges(lines, method=self.method)
         )
 
     def test_adjacent_parallel_lines_same_gradient(self):
@@ -51,7 +55,7 @@ class TestParallelLineRemoval(unittest.TestCase):
             np.array([
                 [[1, 1, 6, 6]]
             ]),
-            remove_parallel_edges(lines, max_line_dist=5)
+            remove_parallel_edges(lines, max_line_dist=5, method=self.method)
         )
 
     def test_adjacent_parallel_lines_gradient_within_tolerance(self):
@@ -68,7 +72,9 @@ class TestParallelLineRemoval(unittest.TestCase):
                 # This should be kept as it is the longer of the two segments
                 [[2, 1, 8, 6]]
             ]),
-            remove_parallel_edges(lines, gradient_tolerance=1)
+            remove_parallel_edges(
+                lines, gradient_tolerance=1, method=self.method
+            )
         )
 
     def test_adjacent_lines_gradient_outside_tolerance(self):
@@ -82,7 +88,9 @@ class TestParallelLineRemoval(unittest.TestCase):
         ])
         np.testing.assert_array_equal(
             lines,
-            remove_parallel_edges(lines, gradient_tolerance=1)
+            remove_parallel_edges(
+                lines, gradient_tolerance=1, method=self.method
+            )
         )
 
     def test_nonadjacent_parallel_lines(self):
@@ -96,7 +104,30 @@ class TestParallelLineRemoval(unittest.TestCase):
         ])
         np.testing.assert_array_equal(
             lines,
-            remove_parallel_edges(lines, max_line_dist=1)
+            remove_parallel_edges(lines, max_line_dist=1, method=self.method)
+        )
+
+    def test_vertical_lines(self):
+        """
+        Tests that one of two adjacent vertical lines is removed.
+        """
+        lines = np.array([
+            [[1, 1, 1, 6]],
+            [[2, 0, 2, 8]]
+        ])
+        np.testing.assert_array_equal(
+            np.array([
+                [[2, 0, 2, 8]]
+            ]),
+            remove_parallel_edges(lines, max_line_dist=2, method=self.method)
+        )
+
+    def test_no_lines(self):
+        """Tests that an empty array is returned when there are no lines."""
+        lines = np.empty((0, 1, 4), dtype=np.int64)
+        self.assertEqual(
+            (0, 1, 4),
+            remove_parallel_edges(lines, method=self.method).shape
         )
 
     def test_many_lines(self):
@@ -116,7 +147,208 @@ class TestParallelLineRemoval(unittest.TestCase):
                 [[3, 3, 11, 11]],
                 [[-12, 1, 5, -3]]
             ]),
-            remove_parallel_edges(lines)
+            remove_parallel_edges(lines, method=self.method)
+        )
+
+
+class TestParallelLineRemovalLoop(TestParallelLineRemoval):
+    method = 'loop'
+
+
+class TestParallelLineRemovalGrid(TestParallelLineRemoval):
+    method = 'grid'
+
+
+class TestParallelLineRemovalEngineEquivalence(unittest.TestCase):
+    def _random_lines(self, seed: int, n_lines: int) -> np.ndarray:
+        """
+        Generates random segments, including vertical, horizontal, duplicate
+        and near-parallel segments.
+        """
+        rng = np.random.RandomState(seed)
+        lines = rng.randint(0, 200, size=(n_lines, 1, 4))
+        lines[::7, 0, 2] = lines[::7, 0, 0]
+        lines[1::7, 0, 3] = lines[1::7, 0, 1]
+        lines[2::11] = lines[3::11][:len(lines[2::11])]
+        lines[4::9, 0, ::2] = lines[5::9, 0, ::2][:len(lines[4::9])] + 2
+        return lines
+
+    def test_vectorized_matches_loop(self):
+        """
+        Tests that the vectorized and grid engines retain the same segments as
+        the reference loop.
+        """
+        for seed in range(5):
+            lines = self._random_lines(seed, 150)
+            for gradient_tolerance, max_line_dist in [(0.1, 5.), (1., 20.)]:
+                with self.subTest(
+                        seed=seed,
+                        gradient_tolerance=gradient_tolerance,
+                        max_line_dist=max_line_dist
+                ):
+                    kwargs = {
+                        'gradient_tolerance': gradient_tolerance,
+                        'max_line_dist': max_line_dist
+                    }
+                    expected = remove_parallel_edges(
+                        lines, method='loop', **kwargs
+                    )
+                    np.testing.assert_array_equal(
+                        expected,
+                        remove_parallel_edges(
+                            lines, method='vectorized', chunk_size=16, **kwargs
+                        )
+                    )
+                    np.testing.assert_array_equal(
+                        expected,
+                        remove_parallel_edges(lines, method='grid', **kwargs)
+                    )
+
+    def test_unknown_method(self):
+        """Tests that an unrecognised method raises a ValueError."""
+        with self.assertRaises(ValueError):
+            remove_parallel_edges(np.array([[[1, 1, 6, 6]]]), method='magic')
+
+    def test_zero_tolerance_axis_aligned(self):
+        """
+        Tests that the engines agree, without numerical warnings, for a zero
+        gradient tolerance when every segment is horizontal or vertical.
+        """
+        lines = np.array([
+            [[0, 0, 100, 0]],
+            [[0, 2, 100, 2]],
+            [[50, 10, 50, 80]],
+            [[52, 10, 52, 80]],
+            [[0, 40, 30, 40]]
+        ])
+        kwargs = {'gradient_tolerance': 0., 'max_line_dist': 5.}
+        expected = remove_parallel_edges(lines, method='loop', **kwargs)
+        with np.errstate(all='raise'):
+            np.testing.assert_array_equal(
+                expected, remove_parallel_edges(lines, method='grid', **kwargs)
+            )
+        self.assertEqual(3, len(expected))
+
+
+class TestVertexClustering(unittest.TestCase):
+    def test_centroid_vertices(self):
+        """
+        Tests that vertices are the centroids of nearby endpoints, in order of
+        first appearance.
+        """
+        edges = np.array([
+            [[100, 100, 200, 100]],
+            [[104, 102, 150, 300]],
+            [[202, 98, 150, 296]]
+        ])
+        np.testing.assert_array_equal(
+            np.array([
+                [[102, 101]],
+                [[201, 99]],
+                [[150, 298]]
+            ]),
+            get_vertices_from_edges(edges, (1000, 1000), tolerance=10)
+        )
+
+    def test_return_index(self):
+        """
+        Tests that the vertex index of each edge endpoint is returned.
+        """
+        edges = np.array([
+            [[100, 100, 200, 100]],
+            [[104, 102, 150, 300]],
+            [[202, 98, 150, 296]]
+        ])
+        vertices, index = get_vertices_from_edges(
+            edges, (1000, 1000), tolerance=10, return_index=True
+        )
+        self.assertEqual(3, len(vertices))
+        np.testing.assert_array_equal(
+            np.array([[0, 1], [0, 2], [1, 2]]),
+            index
+        )
+
+    def test_transitive_clustering(self):
+        """
+        Tests that endpoints are clustered transitively.
+        """
+        edges = np.array([
+            [[0, 0, 500, 500]],
+            [[8, 0, 500, 0]],
+            [[16, 0, 0, 500]]
+        ])
+        vertices = get_vertices_from_edges(edges, (1000, 1000), tolerance=10)
+        np.testing.assert_array_equal(np.array([[8, 0]]), vertices[0])
+        self.assertEqual(4, len(vertices))
+
+    def test_no_edges(self):
+        """Tests that no vertices are found when there are no edges."""
+        vertices, index = get_vertices_from_edges(
+            np.empty((0, 1, 4), dtype=np.int64), (1000, 1000), return_index=True
+        )
+        self.assertEqual(0, len(vertices))
+        self.assertEqual((0, 2), index.shape)
+
+    def test_matches_pairwise_search(self):
+        """
+        Tests that the grid clustering agrees with a brute force search for
+        well separated vertices.
+        """
+        rng = np.random.RandomState(0)
+        # Distinct vertices on a coarse lattice, perturbed by small offsets
+        lattice = np.stack(
+            np.meshgrid(np.arange(20), np.arange(20)), axis=-1
+        ).reshape(-1, 2) * 50
+        ends = rng.randint(0, len(lattice), size=(300, 2))
+        endpoints = lattice[ends] + rng.randint(-3, 4, size=(300, 2, 2))
+        edges = endpoints.reshape(-1, 1, 4)
+
+        vertices, index = get_vertices_from_edges(
+            edges, (1000, 1000), tolerance=10, return_index=True
+        )
+        self.assertEqual(len(np.unique(ends)), len(vertices))
+        # Endpoints from the same lattice point share a vertex
+        for lattice_idx in np.unique(ends):
+            self.assertEqual(1, len(np.unique(index[ends == lattice_idx])))
+
+
+class TestLineDetectorPool(unittest.TestCase):
+    def test_cached_per_parameters(self):
+        """
+        Tests that a detector is reused for the same parameters, and not for
+        different parameters.
+        """
+        detector = get_line_detector(length_threshold=20)
+
+        self.assertIs(detector, get_line_detector(length_threshold=20))
+        self.assertIsNot(detector, get_line_detector(length_threshold=30))
+
+    def test_cached_per_thread(self):
+        """Tests that each thread has its own detector."""
+        detectors = []
+        thread = threading.Thread(
+            target=lambda: detectors.append(get_line_detector())
+        )
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(detectors[0], get_line_detector())
+
+    def test_length_threshold(self):
+        """Tests that short segments are discarded by the length threshold."""
+        image = ShapeImage.new(500, 500)
+        image.add_line((50, 50), (450, 50))
+        image.add_line((50, 200), (80, 200))
+        image = to_grey(image)
+
+        short = detect_edges(image, remove_parallel=False)
+        long = detect_edges(
+            image, remove_parallel=False, length_threshold=100
+        )
+
+        self.assertGreater(len(short), len(long))
+        self.assertTrue(
+            (np.abs(long[:, 0, 2] - long[:, 0, 0]) >= 100).all()
         )
 
 
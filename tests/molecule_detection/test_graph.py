@@ -0,0 +1,186 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from molrec.molecule_detection import process_molecule_image
+from molrec.molecule_detection.graph import (
+    MoleculeGraph,
+    _snap_points,
+    build_graph
+)
+from tests.drawing import ShapeImage
+
+
+def _edge_set(graph: MoleculeGraph):
+    """The edges of `graph`, as a set of pairs of vertex coordinates."""
+    return {
+        frozenset(
+            tuple(graph.vertices[vertex].tolist()) for vertex in edge
+        )
+        for edge in graph.edges
+    }
+
+
+class TestMoleculeGraph(unittest.TestCase):
+    def test_csr(self):
+        """Tests the adjacency and incidence of a path graph."""
+        graph = MoleculeGraph(
+            np.array([[0, 0], [10, 0], [20, 0]]), np.array([[1, 0], [1, 2]])
+        )
+
+        np.testing.assert_array_equal([0, 1, 3, 4], graph.indptr)
+        np.testing.assert_array_equal([1, 2, 1], graph.degrees())
+        np.testing.assert_array_equal([0, 2], graph.neighbours(1))
+        np.testing.assert_array_equal([0, 1], graph.incident_edges(1))
+        np.testing.assert_array_equal([1], graph.neighbours(2))
+        np.testing.assert_array_equal([1], graph.incident_edges(2))
+        self.assertEqual(
+            {
+                'vertices': [[0, 0], [10, 0], [20, 0]],
+                'edges': [[1, 0], [1, 2]]
+            },
+            graph.to_dict()
+        )
+
+
+class TestBuildGraph(unittest.TestCase):
+    def test_triangle(self):
+        """Tests that nearby endpoints are snapped to shared vertices."""
+        edges = np.array([
+            [[0, 0, 100, 1]],
+            [[101, 0, 50, 80]],
+            [[49, 81, 1, 1]]
+        ])
+        vertices = np.array([[[0, 0]], [[100, 0]], [[50, 80]]])
+
+        for graph in (
+                build_graph(edges, vertices, tolerance=5),
+                build_graph(edges, tolerance=5)
+        ):
+            self.assertEqual(3, graph.n_vertices)
+            self.assertEqual(3, graph.n_edges)
+            np.testing.assert_array_equal([2, 2, 2], graph.degrees())
+
+    def test_t_junction(self):
+        """
+        Tests that an edge is split where another edge ends on its interior.
+        """
+        edges = np.array([
+            [[0, 0, 100, 0]],
+            [[50, 2, 50, 60]],
+            [[75, 100, 75, -1]]
+        ])
+
+        graph = build_graph(edges, tolerance=5)
+
+        self.assertEqual(
+            {
+                frozenset({(0, 0), (50, 2)}),
+                frozenset({(50, 2), (75, -1)}),
+                frozenset({(75, -1), (100, 0)}),
+                frozenset({(50, 2), (50, 60)}),
+                frozenset({(75, 100), (75, -1)})
+            },
+            _edge_set(graph)
+        )
+        np.testing.assert_array_equal([0, 0, 0, 1, 2], graph.segment_index)
+
+        graph = build_graph(edges, tolerance=5, split_junctions=False)
+        self.assertEqual(3, graph.n_edges)
+
+    def test_unmatched_endpoints(self):
+        """Tests that endpoints far from all vertices become vertices."""
+        graph = build_graph(
+            np.array([[[0, 0, 100, 0]]]), np.array([[[0, 0]]]), tolerance=5
+        )
+
+        np.testing.assert_array_equal([[0, 0], [100, 0]], graph.vertices)
+        np.testing.assert_array_equal([[0, 1]], graph.edges)
+
+    def test_vertex_index(self):
+        """
+        Tests that endpoints are connected to the vertices given by the
+        vertex index, rather than snapped to the nearest vertex.
+        """
+        graph = build_graph(
+            np.array([[[0, 0, 100, 0]]]),
+            np.array([[[0, 0]], [[95, 0]], [[100, 0]]]),
+            tolerance=10,
+            vertex_index=np.array([[0, 1]])
+        )
+        np.testing.assert_array_equal([[0, 1]], graph.edges)
+
+        with self.assertRaises(ValueError):
+            build_graph(
+                np.array([[[0, 0, 100, 0]]]),
+                tolerance=10,
+                vertex_index=np.array([[0, 1]])
+            )
+        with self.assertRaises(ValueError):
+            build_graph(
+                np.array([[[0, 0, 100, 0]]]),
+                np.array([[[0, 0]], [[100, 0]]]),
+                tolerance=10,
+                vertex_index=np.array([[0, 1], [1, 0]])
+            )
+
+    def test_duplicates_and_loops(self):
+        """Tests that duplicate edges and self-loops are removed."""
+        graph = build_graph(
+            np.array([
+                [[0, 0, 100, 0]],
+                [[100, 1, 1, 0]],
+                [[50, 50, 51, 51]]
+            ]),
+            tolerance=5
+        )
+
+        self.assertEqual(1, graph.n_edges)
+        np.testing.assert_array_equal([0], graph.segment_index)
+
+    def test_empty(self):
+        """Tests that an empty graph is built from no edges."""
+        graph = build_graph(np.empty((0, 1, 4)), tolerance=5)
+
+        self.assertEqual(0, graph.n_vertices)
+        self.assertEqual(0, graph.n_edges)
+        np.testing.assert_array_equal([0], graph.indptr)
+
+    def test_tolerance_required(self):
+        """Tests that ValueError is raised without a tolerance."""
+        with self.assertRaises(ValueError):
+            build_graph(np.array([[[0, 0, 100, 0]]]))
+
+    def test_snap_points(self):
+        """Tests that the nearest vertex matches a brute force search."""
+        rng = np.random.default_rng(0)
+        points = rng.uniform(0, 1000, (2000, 2))
+        vertices = rng.uniform(0, 1000, (500, 2))
+
+        nearest, distances = _snap_points(points, vertices, 20)
+
+        all_distances = np.linalg.norm(
+            points[:, None] - vertices[None], axis=-1
+        )
+        expected = np.where(
+            all_distances.min(axis=1) <= 20, all_distances.argmin(axis=1), -1
+        )
+        np.testing.assert_array_equal(expected, nearest)
+        matched = nearest >= 0
+        np.testing.assert_allclose(
+            all_distances.min(axis=1)[matched], distances[matched]
+        )
+
+    def test_hexagon(self):
+        """Tests the graph of a detected hexagon is a ring."""
+        image = ShapeImage.new(1000, 1000).add_regular_hexagon(
+            100, start_coord=(400, 400)
+        )
+        data = cv2.imencode('.png', image)[1].tobytes()
+
+        graph = process_molecule_image(data).to_graph()
+
+        self.assertEqual(6, graph.n_vertices)
+        self.assertEqual(6, graph.n_edges)
+        np.testing.assert_array_equal([2] * 6, graph.degrees())
@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+
+from molrec.molecule_detection.grid import expand_grid_cells, join_cell_keys
+
+
+class TestGrid(unittest.TestCase):
+    def test_join_cell_keys(self):
+        """
+        Tests that each lookup is matched with every item inserted under its
+        key.
+        """
+        queries, inserts = join_cell_keys(
+            np.array([5, 3, 5, 9]),
+            np.array([0, 1, 2, 3]),
+            np.array([5, 4, 3]),
+            np.array([10, 11, 12])
+        )
+
+        self.assertCountEqual(
+            [(10, 0), (10, 2), (12, 1)], zip(queries, inserts)
+        )
+
+    def test_expand_grid_cells(self):
+        """Tests that every cell of each inclusive range is enumerated."""
+        owners, x, y = expand_grid_cells(
+            np.array([0, 4]), np.array([0, 2]), np.array([1, 4]),
+            np.array([1, 2])
+        )
+
+        self.assertEqual(
+            [(0, 0, 0), (0, 1, 0), (0, 0, 1), (0, 1, 1), (1, 4, 2)],
+            list(zip(owners, x, y))
+        )
@@ -1,13 +1,22 @@
 import math
 import unittest
 
+import numpy as np
+
 from molrec.molecule_detection.line_utils import (
     calculate_gradient,
+    calculate_gradients,
     calculate_intercept,
+    calculate_intercepts,
     calculate_segment_length,
+    calculate_segment_lengths,
     calculate_midpoint,
+    calculate_midpoints,
     calculate_parallel_distance,
+    calculate_parallel_distances,
+    calculate_point_distances,
     calculate_point_segment_distance,
+    calculate_point_segment_distances,
 )
 
 
@@ -100,5 +109,98 @@ class TestPointSegmentDistance(unittest.TestCase):
         )
 
 
+class TestArrayVariants(unittest.TestCase):
+    segments = np.array([
+        [1., 1., 4., 5.],
+        [1., 1., 1., 1.],
+        [3., 3., 3., 10.],
+        [3., 1., 10., 1.],
+        [1., 2., 3., 4.]
+    ])
+    points = np.array([
+        [1.5, 1.5],
+        [2., 1.],
+        [5., 5.]
+    ])
+
+    def test_segment_lengths(self):
+        np.testing.assert_array_equal(
+            [calculate_segment_length(*seg) for seg in self.segments],
+            calculate_segment_lengths(self.segments)
+        )
+
+    def test_gradients(self):
+        np.testing.assert_array_equal(
+            [calculate_gradient(*seg) for seg in self.segments],
+            calculate_gradients(self.segments)
+        )
+
+    def test_intercepts(self):
+        gradients = calculate_gradients(self.segments)
+        np.testing.assert_array_equal(
+            [calculate_intercept(*seg[:2], m)
+             for seg, m in zip(self.segments, gradients)],
+            calculate_intercepts(self.segments[:, :2], gradients)
+        )
+
+    def test_midpoints(self):
+        np.testing.assert_array_equal(
+            [calculate_midpoint(*seg) for seg in self.segments],
+            calculate_midpoints(self.segments)
+        )
+
+    def test_point_distances(self):
+        distances = calculate_point_distances(self.points, self.points[:2])
+        self.assertEqual((3, 2), distances.shape)
+        np.testing.assert_allclose(
+            [[0., 0.5 ** 0.5], [0.5 ** 0.5, 0.], [24.5 ** 0.5, 5.]],
+            distances
+        )
+
+    def test_point_distances_elementwise(self):
+        np.testing.assert_allclose(
+            [0.5 ** 0.5, 5.],
+            calculate_point_distances(
+                self.points[:2], self.points[1:], pairwise=False
+            )
+        )
+
+    def test_point_segment_distances(self):
+        distances = calculate_point_segment_distances(
+            self.segments, self.points
+        )
+        self.assertEqual((5, 3), distances.shape)
+        for ii, seg in enumerate(self.segments):
+            for jj, point in enumerate(self.points):
+                with self.subTest(segment=seg, point=point):
+                    self.assertEqual(
+                        calculate_point_segment_distance(
+                            tuple(seg[:2]), tuple(seg[2:]), tuple(point)
+                        ),
+                        distances[ii, jj]
+                    )
+
+    def test_point_segment_distances_elementwise(self):
+        np.testing.assert_allclose(
+            [0., 1., 2 ** 0.5],
+            calculate_point_segment_distances(
+                np.array([
+                    [1., 1., 2., 2.], [1., 1., 1., 1.], [1., 1., 4., 4.]
+                ]),
+                self.points,
+                pairwise=False
+            )
+        )
+
+    def test_parallel_distances(self):
+        distances = calculate_parallel_distances(
+            np.array([1., 1., 1.]),
+            np.array([2., 1., 2.]),
+            np.array([1., 5., math.nan])
+        )
+        np.testing.assert_allclose([0.7071068, 0.], distances[:2])
+        self.assertTrue(math.isnan(distances[2]))
+
+
 if __name__ == '__main__':
     unittest.main()
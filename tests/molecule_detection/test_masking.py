@@ -3,7 +3,13 @@ import unittest
 import cv2
 import numpy as np
 
-from molrec.molecule_detection.masking import apply_mask, create_mask
+from molrec.molecule_detection.masking import (
+    apply_mask,
+    create_mask,
+    mask_rectangles,
+    merge_rectangles,
+    normalize_rectangles
+)
 
 from tests.drawing import ShapeImage
 
@@ -60,6 +66,20 @@ class TestCreateMask(unittest.TestCase):
         expected[150:201, 100:201] = 0
         np.testing.assert_equal(mask, expected)
 
+    def test_mask_single_channel(self):
+        """
+        Tests that a single-channel mask is constructed for a colour image.
+
+        """
+        mask = create_mask(
+            (1024, 1024, 3),
+            np.array([[100, 150, 200, 200]]),
+            single_channel=True
+        )
+        expected = np.full((1024, 1024), 255)
+        expected[150:201, 100:201] = 0
+        np.testing.assert_equal(mask, expected)
+
 
 class TestApplyMask(unittest.TestCase):
     def test_blank_mask(self):
@@ -123,6 +143,159 @@ class TestApplyMask(unittest.TestCase):
         masked = apply_mask(image, mask, 255)
         np.testing.assert_equal(masked, np.full(image.shape, 255))
 
+    def test_mask_cover_one_text_single_channel(self):
+        """
+        Tests that one box of text is successfully masked in a colour image
+        with a single-channel mask.
+
+        """
+        image = ShapeImage.new(1024, 1024)
+        text_width, text_height = image.add_text('Testing', (250, 250))
+        mask = create_mask(
+            image.shape,
+            # Add padding to height
+            np.array([[250, 260, 250 + text_width, 250 - text_height]]),
+            single_channel=True
+        )
+        masked = apply_mask(image, mask, (255, 255, 255))
+        np.testing.assert_equal(masked, np.full(image.shape, 255))
+
+
+class TestMaskRectangles(unittest.TestCase):
+    def test_normalize_rectangles(self):
+        """
+        Tests that rectangles are ordered, made half-open and clipped, and
+        that empty rectangles are dropped.
+
+        """
+        np.testing.assert_equal(
+            normalize_rectangles(
+                np.array([
+                    [300, 260, 250, 240],
+                    [-10, 500, 20, 600],
+                    [600, 100, 700, 200],
+                    [700, 100, 800, 200]
+                ]),
+                (512, 640)
+            ),
+            np.array([
+                [250, 240, 301, 261],
+                [0, 500, 21, 512],
+                [600, 100, 640, 201]
+            ])
+        )
+
+    def test_merge_rectangles(self):
+        """
+        Tests that contained rectangles are dropped and aligned, overlapping
+        rectangles are joined.
+
+        """
+        np.testing.assert_equal(
+            merge_rectangles(np.array([
+                [0, 0, 100, 100],
+                [10, 10, 20, 20],
+                [100, 0, 150, 100],
+                [300, 300, 310, 310],
+                [305, 305, 320, 320]
+            ])),
+            np.array([
+                [0, 0, 150, 100],
+                [300, 300, 310, 310],
+                [305, 305, 320, 320]
+            ])
+        )
+
+    def test_merge_chains(self):
+        """
+        Tests that a long chain of touching rectangles is joined into one,
+        and that only the first of identical rectangles is kept.
+
+        """
+        starts = np.arange(0, 5000, 10)
+        zeros = np.zeros_like(starts)
+        rectangles = np.stack(
+            [starts, zeros, starts + 10, zeros + 8], axis=1
+        )
+        np.testing.assert_equal(
+            merge_rectangles(rectangles), [[0, 0, 5000, 8]]
+        )
+        np.testing.assert_equal(
+            merge_rectangles(rectangles.T[[1, 0, 3, 2]].T),
+            [[0, 0, 8, 5000]]
+        )
+        np.testing.assert_equal(
+            merge_rectangles([[5, 5, 9, 9], [0, 0, 2, 2], [5, 5, 9, 9]]),
+            [[5, 5, 9, 9], [0, 0, 2, 2]]
+        )
+
+    def test_merge_preserves_coverage(self):
+        """
+        Tests that merged rectangles cover exactly the same pixels.
+
+        """
+        rng = np.random.default_rng(0)
+        starts = rng.integers(0, 90, (40, 2)) // 10 * 10
+        rectangles = np.concatenate(
+            [starts, starts + rng.integers(1, 4, (40, 2)) * 10], axis=1
+        )
+
+        def coverage(rects):
+            covered = np.zeros((200, 200), dtype=bool)
+            for start_x, start_y, end_x, end_y in rects:
+                covered[start_y:end_y, start_x:end_x] = True
+            return covered
+
+        merged = merge_rectangles(rectangles)
+        self.assertLess(len(merged), len(rectangles))
+        np.testing.assert_equal(coverage(merged), coverage(rectangles))
+
+    def test_matches_mask(self):
+        """
+        Tests that the result matches creating and applying a mask, for gray
+        and colour images.
+
+        """
+        rectangles = np.array([
+            [250, 260, 400, 230],
+            [300, 250, 350, 300],
+            [900, 900, 1100, 1100]
+        ])
+        for image, colour in (
+                (ShapeImage.new(1024, 1024), (255, 0, 0)),
+                (np.arange(1024 ** 2, dtype=np.uint8).reshape(1024, 1024), 7)
+        ):
+            expected = apply_mask(
+                image, create_mask(image.shape, rectangles), colour
+            )
+            np.testing.assert_equal(
+                mask_rectangles(image.copy(), rectangles, colour), expected
+            )
+
+    def test_in_place(self):
+        """
+        Tests that the image is modified in place, or left unchanged when an
+        output buffer is given.
+
+        """
+        image = np.zeros((100, 100), dtype=np.uint8)
+        self.assertIs(
+            image, mask_rectangles(image, np.array([[0, 0, 9, 9]]), 255)
+        )
+        self.assertEqual(100, np.count_nonzero(image))
+
+        image = np.zeros((100, 100), dtype=np.uint8)
+        out = np.empty_like(image)
+        self.assertIs(
+            out,
+            mask_rectangles(image, np.array([[0, 0, 9, 9]]), 255, out=out)
+        )
+        self.assertEqual(0, np.count_nonzero(image))
+        self.assertEqual(100, np.count_nonzero(out))
+
+        with self.assertRaises(ValueError):
+            mask_rectangles(image, np.array([]), 255, out=np.empty((10, 10)))
+
 
 if __name__ == '__main__':
     unittest.main()
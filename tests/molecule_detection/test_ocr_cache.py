@@ -0,0 +1,138 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from molrec.molecule_detection.ocr_cache import OCRCache
+from molrec.molecule_detection.text_recognition import extract_text
+from tests.drawing import ShapeImage
+
+
+def _label(text: str, font_scale: float = 1., grey: int = 0) -> np.ndarray:
+    """Draws a label on a white background."""
+    image = ShapeImage.new(int(60 * font_scale), int(160 * font_scale))
+    image.add_text(
+        text,
+        (int(10 * font_scale), int(40 * font_scale)),
+        font_scale=font_scale,
+        font_colour=(grey, grey, grey),
+        thickness=2
+    )
+    return np.asarray(image)
+
+
+class TestOCRCacheKey(unittest.TestCase):
+    def setUp(self):
+        self.cache = OCRCache()
+
+    def test_same_label(self):
+        """Tests that identical labels share a key."""
+        self.assertEqual(
+            self.cache.key(_label('OH')), self.cache.key(_label('OH'))
+        )
+
+    def test_contrast_normalized(self):
+        """
+        Tests that the same label with different contrast and colour
+        conversion shares a key.
+        """
+        self.assertEqual(
+            self.cache.key(_label('NH2')),
+            self.cache.key(
+                cv2.cvtColor(_label('NH2', grey=90), cv2.COLOR_BGR2GRAY)
+            )
+        )
+
+    def test_different_labels(self):
+        """Tests that different labels have different keys."""
+        self.assertNotEqual(
+            self.cache.key(_label('Cl')), self.cache.key(_label('CO2Me'))
+        )
+
+    def test_namespace(self):
+        """Tests that the namespace is included in the key."""
+        self.assertNotEqual(
+            self.cache.key(_label('OH'), namespace='--psm 7'),
+            self.cache.key(_label('OH'), namespace='--psm 6')
+        )
+
+    def test_empty_roi(self):
+        """Tests that an empty region can be keyed."""
+        self.cache.key(np.zeros((0, 10), dtype=np.uint8))
+
+
+class TestOCRCache(unittest.TestCase):
+    def test_hit_and_miss(self):
+        """Tests that the hit and miss counters are maintained."""
+        cache = OCRCache()
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 'OH')
+        self.assertEqual('OH', cache.get('a'))
+        self.assertEqual(
+            {'hits': 1, 'disk_hits': 0, 'misses': 1, 'entries': 1},
+            cache.stats
+        )
+
+    def test_lru_eviction(self):
+        """Tests that the least recently used entries are evicted."""
+        cache = OCRCache(max_entries=2)
+        cache.put('a', 'OH')
+        cache.put('b', 'Cl')
+        cache.get('a')
+        cache.put('c', 'NH2')
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('OH', cache.get('a'))
+        self.assertEqual('NH2', cache.get('c'))
+
+    def test_disk_tier(self):
+        """
+        Tests that entries are persisted to disk and retrieved once evicted
+        from memory.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        cache = OCRCache(max_entries=1, directory=directory)
+        cache.put('ab12', 'OH')
+        cache.put('cd34', '')
+        self.assertEqual('OH', cache.get('ab12'))
+        self.assertEqual(1, cache.stats['disk_hits'])
+
+        new_cache = OCRCache(directory=directory)
+        self.assertEqual('', new_cache.get('cd34'))
+        self.assertEqual(1, new_cache.stats['disk_hits'])
+
+
+class TestCachedTextRecognition(unittest.TestCase):
+    def test_repeated_labels_skip_ocr(self):
+        """
+        Tests that repeated labels are only recognized once.
+        """
+        image = np.full((200, 400, 3), 255, dtype=np.uint8)
+        image[20:80, 20:180] = _label('OH')
+        image[120:180, 20:180] = _label('OH')
+        image[20:80, 220:380] = _label('Cl')
+        boxes = [(30, 30, 170, 70), (30, 130, 170, 170), (230, 30, 370, 70)]
+
+        cache = OCRCache()
+        with mock.patch(
+                'pytesseract.image_to_string', side_effect=['OH', 'Cl']
+        ) as image_to_string:
+            texts = extract_text(image, boxes, cache=cache)
+            self.assertEqual(['OH', 'OH', 'Cl'], [t[1] for t in texts])
+            self.assertEqual(2, image_to_string.call_count)
+
+            texts = extract_text(image, boxes, cache=cache)
+            self.assertEqual(['OH', 'OH', 'Cl'], [t[1] for t in texts])
+            self.assertEqual(2, image_to_string.call_count)
+
+        self.assertEqual(2, cache.stats['hits'])
+        self.assertEqual(2, cache.stats['misses'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import io
+import mmap
+import os
+import tarfile
+import tempfile
+import unittest
+
+import cv2
+
+from molrec.molecule_detection import PackReader, process_molecule_images
+from tests.drawing import ShapeImage
+
+
+class TestPackReader(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, 'images.tar')
+
+        image = ShapeImage.new(1000, 1000).add_regular_hexagon(
+            100, start_coord=(400, 400)
+        )
+        self.entries = {
+            'hexagon_0.png': cv2.imencode('.png', image)[1].tobytes(),
+            'notes.txt': b'not an image',
+            'hexagon_1.png': cv2.imencode('.png', image)[1].tobytes()
+        }
+        with tarfile.open(self.path, 'w') as archive:
+            for name, data in self.entries.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+
+    def test_entries(self):
+        """Tests that each entry is read in archive order."""
+        with PackReader(self.path) as pack:
+            self.assertEqual(list(self.entries), pack.names)
+            self.assertEqual(3, len(pack))
+            self.assertIn('notes.txt', pack)
+            for (name, view), expected in zip(pack, self.entries.values()):
+                self.assertIsInstance(view, memoryview)
+                self.assertEqual(expected, bytes(view))
+            with self.assertRaises(KeyError):
+                pack['missing.png']
+
+    def test_zero_copy(self):
+        """Tests that entries are views of the memory-mapped archive."""
+        with PackReader(self.path) as pack:
+            view = pack['hexagon_0.png']
+            self.assertIsInstance(view.obj, mmap.mmap)
+            self.assertEqual(len(self.entries['hexagon_0.png']), view.nbytes)
+            view.release()
+
+    def test_process_views(self):
+        """Tests that the pipeline decodes the views in place."""
+        with PackReader(self.path) as pack:
+            results = list(process_molecule_images(
+                (view for _, view in pack), return_exceptions=True
+            ))
+
+        self.assertEqual(6, len(results[0][1].edges))
+        self.assertIsInstance(results[1][1], ValueError)
+        self.assertEqual(6, len(results[2][1].edges))
+
+    def test_closed(self):
+        """Tests that entries cannot be read once the reader is closed."""
+        pack = PackReader(self.path)
+        view = pack['notes.txt']
+        pack.close()
+
+        # Views outlive the reader until released
+        self.assertEqual(b'not an image', bytes(view))
+        with self.assertRaises(ValueError):
+            pack['notes.txt']
+
+    def test_compressed(self):
+        """Tests that ValueError is raised for a compressed archive."""
+        path = os.path.join(self._tmp.name, 'images.tar.gz')
+        with tarfile.open(path, 'w:gz') as archive:
+            archive.add(self.path, arcname='images.tar')
+
+        with self.assertRaises(ValueError):
+            PackReader(path)
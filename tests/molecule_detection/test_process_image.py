@@ -0,0 +1,360 @@
+import mmap
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from molrec.molecule_detection import (
+    annotate_image,
+    feature_detection,
+    process_image,
+    process_molecule_image,
+    process_molecule_images,
+    read_image,
+    text_detection
+)
+from molrec.molecule_detection.image_utils import ImageDecodeError
+from tests.drawing import ShapeImage
+
+
+def _encode_hexagon(offset: int = 0) -> bytes:
+    """Encodes a PNG image of a regular hexagon."""
+    image = ShapeImage.new(1000, 1000).add_regular_hexagon(
+        100, start_coord=(400 + offset, 400)
+    )
+    return cv2.imencode('.png', image)[1].tobytes()
+
+
+class TestReadImage(unittest.TestCase):
+    def test_read_path_and_bytes(self):
+        """Tests that an image is read identically from a path and bytes."""
+        data = _encode_hexagon()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hexagon.png')
+            with open(path, 'wb') as fh:
+                fh.write(data)
+
+            self.assertTrue((read_image(path) == read_image(data)).all())
+
+    def test_read_buffers(self):
+        """
+        Tests that an image is decoded from a memoryview, an mmap and an
+        encoded array.
+        """
+        data = _encode_hexagon()
+        expected = read_image(data)
+        with tempfile.TemporaryFile() as fh:
+            fh.write(data)
+            fh.flush()
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.assertTrue((expected == read_image(mm)).all())
+
+        with tempfile.TemporaryFile() as fh:
+            fh.write(b'header' + data)
+            fh.flush()
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)[len(b'header'):]
+                self.assertTrue((expected == read_image(view)).all())
+                view.release()
+
+        self.assertTrue((expected == read_image(memoryview(data))).all())
+        self.assertTrue((
+            expected == read_image(np.frombuffer(data, dtype=np.uint8))
+        ).all())
+
+    def test_read_decoded(self):
+        """
+        Tests that a decoded image in the requested format is used without
+        copying, and otherwise converted.
+        """
+        gray = read_image(_encode_hexagon(), grayscale=True)
+        bgr = read_image(_encode_hexagon())
+
+        self.assertIs(gray, read_image(gray, grayscale=True))
+        self.assertIs(bgr, read_image(bgr))
+        self.assertEqual((1000, 1000, 3), read_image(gray).shape)
+        np.testing.assert_array_equal(gray, read_image(bgr, grayscale=True))
+        bgra = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+        np.testing.assert_array_equal(gray, read_image(bgra, grayscale=True))
+        with self.assertRaises(ValueError):
+            read_image(np.zeros((2, 2, 2), dtype=np.uint8))
+
+        result = process_molecule_image(bgr)
+        self.assertEqual(6, len(result.edges))
+
+    def test_read_grayscale(self):
+        """Tests that an image is decoded directly to a single channel."""
+        image = read_image(_encode_hexagon(), grayscale=True)
+
+        self.assertEqual((1000, 1000), image.shape)
+        self.assertEqual(np.uint8, image.dtype)
+
+    def test_read_invalid(self):
+        """
+        Tests that ImageDecodeError (a ValueError) is raised if the image
+        cannot be read.
+        """
+        with self.assertRaises(ImageDecodeError):
+            read_image(b'not an image')
+        with self.assertRaises(ImageDecodeError):
+            read_image('/nonexistent/image.png')
+        self.assertTrue(issubclass(ImageDecodeError, ValueError))
+
+    def test_process_bytes(self):
+        """Tests that the pipeline accepts the contents of an image file."""
+        timings = {}
+        result = process_molecule_image(_encode_hexagon(), timings=timings)
+        self.assertEqual(6, len(result.vertices))
+        self.assertEqual(6, len(result.edges))
+        # The vertex of each edge endpoint is recorded
+        self.assertEqual((6, 2), result.vertex_index.shape)
+        self.assertEqual(
+            list(range(6)), sorted(set(result.vertex_index.ravel().tolist()))
+        )
+        self.assertEqual({'read', 'edges', 'vertices'}, set(timings))
+
+    def test_grayscale_pipeline(self):
+        """
+        Tests that the decoded grayscale image is passed to the line detector
+        without copying, and kept in colour only on request.
+        """
+        detect = mock.Mock(return_value=np.array([[[400, 400, 487, 350]]]))
+        with mock.patch.object(
+                feature_detection,
+                'get_line_detector',
+                return_value=mock.Mock(detect=detect)
+        ):
+            result = process_molecule_image(
+                _encode_hexagon(), keep_image=True
+            )
+        self.assertIs(result.image, detect.call_args[0][0])
+        self.assertEqual((1000, 1000), result.image.shape)
+        self.assertEqual((1000, 1000), result.image_size)
+
+        result = process_molecule_image(
+            _encode_hexagon(), keep_image=True, colour=True
+        )
+        self.assertEqual((1000, 1000, 3), result.image.shape)
+        self.assertEqual(6, len(result.edges))
+
+    def test_detector_params(self):
+        """
+        Tests that the detector parameters are passed to the line detector
+        and parallel edge filter, and that unknown parameters are rejected.
+        """
+        result = process_molecule_image(
+            _encode_hexagon(),
+            detector_params={'parallel_method': 'grid', 'canny_th1': 40}
+        )
+        self.assertEqual(6, len(result.edges))
+
+        with self.assertRaises(feature_detection.DetectionError):
+            process_molecule_image(
+                _encode_hexagon(), detector_params={'length_threshold': 1000}
+            )
+        with self.assertRaises(ValueError):
+            process_molecule_image(
+                _encode_hexagon(), detector_params={'threshold': 10}
+            )
+
+    def test_annotate_grayscale(self):
+        """Tests that a grayscale image is annotated in colour."""
+        result = process_molecule_image(_encode_hexagon(), keep_image=True)
+
+        annotated = annotate_image(result.image, result.corners, result.lines)
+
+        self.assertEqual((1000, 1000, 3), annotated.shape)
+        self.assertEqual((1000, 1000), result.image.shape)
+
+
+class TestMaskText(unittest.TestCase):
+    def setUp(self):
+        image = ShapeImage.new(1000, 1000).add_regular_hexagon(
+            100, start_coord=(400, 400)
+        )
+        width, height = image.add_text(
+            'NH2', (700, 300), font_scale=2, thickness=3
+        )
+        self.image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self.box = np.array([[700, 310, 700 + width, 295 - height]])
+        patcher = mock.patch.object(
+            text_detection, 'east_detection_tiled', return_value=self.box
+        )
+        self.detect_text = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_text_masked(self):
+        """
+        Tests that the strokes of masked text are not detected as edges, and
+        that the removed segments are reported.
+        """
+        unmasked = process_molecule_image(self.image)
+        self.assertIsNone(unmasked.text_boxes)
+        self.assertNotIn('text_boxes', unmasked.to_dict())
+
+        timings = {}
+        original = self.image.copy()
+        result = process_molecule_image(
+            self.image, timings=timings, mask_text=True
+        )
+
+        self.detect_text.assert_called_once()
+        self.assertEqual(6, len(result.edges))
+        self.assertLess(len(result.edges), len(unmasked.edges))
+        # The raw detector segments, before parallel edges are filtered
+        masked = self.image.copy()
+        masked[251:311, 700:832] = 255
+        self.assertEqual(
+            len(feature_detection.detect_edges(
+                self.image, remove_parallel=False
+            ))
+            - len(feature_detection.detect_edges(
+                masked, remove_parallel=False
+            )),
+            result.masked_segments
+        )
+        self.assertGreater(result.masked_segments, 0)
+        np.testing.assert_array_equal(
+            [[700, 251, 832, 311]], result.text_boxes
+        )
+        self.assertEqual(
+            {'read', 'mask', 'edges', 'vertices'}, set(timings)
+        )
+        # The caller's image is not modified
+        np.testing.assert_array_equal(original, self.image)
+
+    def test_masked_segments_not_negative(self):
+        """
+        Tests that the count of removed segments is clamped at zero where
+        masking splits a segment in two.
+        """
+        detect = mock.Mock(side_effect=[
+            np.array([[[0, 0, 100, 0]]]),
+            np.array([[[0, 0, 40, 0]], [[60, 0, 100, 0]]])
+        ])
+        with mock.patch.object(
+                feature_detection,
+                'get_line_detector',
+                return_value=mock.Mock(detect=detect)
+        ):
+            _, _, removed = process_image._mask_text(self.image)
+        self.assertEqual(0, removed)
+
+    def test_decoded_image_masked_in_place(self):
+        """Tests that an image decoded by the pipeline is masked in place."""
+        data = cv2.imencode('.png', self.image)[1].tobytes()
+
+        result = process_molecule_image(data, keep_image=True, mask_text=True)
+
+        self.assertTrue((result.image[251:311, 700:832] == 255).all())
+
+    def test_stream(self):
+        """Tests that text is masked in each image of a stream."""
+        results = dict(process_molecule_images(
+            [self.image, self.image], max_workers=2, mask_text=True
+        ))
+
+        self.assertEqual(2, self.detect_text.call_count)
+        for result in results.values():
+            self.assertEqual(6, len(result.edges))
+            self.assertGreater(result.masked_segments, 0)
+
+
+class TestProcessMoleculeImages(unittest.TestCase):
+    def setUp(self):
+        self.inputs = [_encode_hexagon(offset) for offset in range(0, 80, 10)]
+
+    def test_ordered(self):
+        """Tests that results are yielded in the order of the inputs."""
+        results = list(process_molecule_images(self.inputs, max_workers=3))
+
+        self.assertEqual(
+            list(range(len(self.inputs))), [index for index, _ in results]
+        )
+        for index, result in results:
+            self.assertEqual(6, len(result.vertices))
+            self.assertEqual(6, len(result.edges))
+            # Each hexagon is offset horizontally by 10 pixels
+            self.assertAlmostEqual(
+                400 + 10 * index, result.vertices[:, 0].min(), delta=2
+            )
+
+    def test_unordered(self):
+        """Tests that a result is yielded for each input when unordered."""
+        results = list(process_molecule_images(
+            self.inputs, max_workers=3, ordered=False
+        ))
+
+        self.assertCountEqual(
+            range(len(self.inputs)), [index for index, _ in results]
+        )
+
+    def test_errors(self):
+        """
+        Tests that an error for one input is raised, or yielded in place of
+        its result with return_exceptions.
+        """
+        inputs = [self.inputs[0], b'not an image', self.inputs[1]]
+
+        results = list(process_molecule_images(
+            inputs, return_exceptions=True
+        ))
+        self.assertEqual(6, len(results[0][1].edges))
+        self.assertIsInstance(results[1][1], ValueError)
+        self.assertEqual(2, results[2][0])
+
+        with self.assertRaises(ValueError):
+            list(process_molecule_images(inputs))
+
+    def test_bounded_prefetch(self):
+        """
+        Tests that the inputs are consumed no further ahead of the consumer
+        than the prefetch and worker limits allow.
+        """
+        consumed = []
+        lock = threading.Lock()
+
+        def inputs():
+            for i in range(100):
+                with lock:
+                    consumed.append(i)
+                yield self.inputs[0]
+
+        results = process_molecule_images(inputs(), prefetch=2, max_workers=2)
+        next(results)
+        time.sleep(0.5)
+        with lock:
+            # The yielded image, those being processed, those queued and the
+            # one awaiting a place in the queue
+            self.assertLessEqual(len(consumed), 1 + 2 + 2 + 1)
+        results.close()
+
+    def test_invalid_arguments(self):
+        """
+        Tests that ValueError is raised for invalid limits and detector
+        parameters.
+        """
+        with self.assertRaises(ValueError):
+            next(process_molecule_images(self.inputs, prefetch=0))
+        with self.assertRaises(ValueError):
+            next(process_molecule_images(self.inputs, max_workers=0))
+        with self.assertRaises(ValueError):
+            next(process_molecule_images(
+                self.inputs, detector_params={'threshold': 10}
+            ))
+
+    def test_detector_params(self):
+        """Tests that the detector parameters are applied to each image."""
+        results = list(process_molecule_images(
+            self.inputs[:2],
+            return_exceptions=True,
+            detector_params={'length_threshold': 1000}
+        ))
+
+        for _, result in results:
+            self.assertIsInstance(result, feature_detection.DetectionError)
@@ -0,0 +1,229 @@
+import gc
+import os
+import pickle
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from molrec.molecule_detection import (
+    MoleculeImageResult,
+    process_molecule_image
+)
+from molrec.molecule_detection.feature_detection import (
+    get_vertices_from_edges
+)
+from molrec.molecule_detection.graph import build_graph
+from tests.drawing import ShapeImage
+
+
+class TestMoleculeImageResult(unittest.TestCase):
+    def setUp(self):
+        self.corners = np.array([
+            [[400, 400]],
+            [[487, 350]],
+            [[574, 400]]
+        ])
+        self.lines = np.array([
+            [[400, 400, 487, 350]],
+            [[487, 350, 574, 400]]
+        ])
+        self.result = MoleculeImageResult(
+            self.corners, self.lines, timings={'edges': 0.1}
+        )
+
+    def test_layout(self):
+        """Tests that vertices and edges are stored as compact 2D arrays."""
+        self.assertEqual(np.float32, self.result.vertices.dtype)
+        self.assertEqual((3, 2), self.result.vertices.shape)
+        self.assertTrue(self.result.vertices.flags.c_contiguous)
+        self.assertEqual(np.int32, self.result.edges.dtype)
+        self.assertEqual((2, 4), self.result.edges.shape)
+        self.assertTrue(self.result.edges.flags.c_contiguous)
+        self.assertFalse(hasattr(self.result, '__dict__'))
+
+    def test_legacy_views(self):
+        """Tests that the legacy layouts are reproduced."""
+        np.testing.assert_array_equal(self.corners, self.result.corners)
+        self.assertEqual(np.int64, self.result.corners.dtype)
+        np.testing.assert_array_equal(self.lines, self.result.lines)
+        self.assertEqual(np.int64, self.result.lines.dtype)
+
+    def test_to_dict(self):
+        """Tests conversion to a JSON-serializable dictionary."""
+        self.assertEqual(
+            {
+                'vertices': [[400, 400], [487, 350], [574, 400]],
+                'edges': [[400, 400, 487, 350], [487, 350, 574, 400]],
+                'timings': {'edges': 0.1}
+            },
+            self.result.to_dict()
+        )
+
+    def test_pickle(self):
+        """
+        Tests that a result is pickled without its image, and that its arrays
+        are exported out-of-band with pickle protocol 5.
+        """
+        result = MoleculeImageResult(
+            self.corners,
+            self.lines,
+            image=np.zeros((10, 10, 3), dtype=np.uint8),
+            keep_image=True
+        )
+        buffers = []
+        data = pickle.dumps(result, protocol=5, buffer_callback=buffers.append)
+        self.assertEqual(2, len(buffers))
+
+        loaded = pickle.loads(data, buffers=buffers)
+        np.testing.assert_array_equal(result.vertices, loaded.vertices)
+        np.testing.assert_array_equal(result.edges, loaded.edges)
+        self.assertIsNone(loaded.image)
+
+        loaded = pickle.loads(pickle.dumps(self.result))
+        np.testing.assert_array_equal(self.result.edges, loaded.edges)
+        self.assertEqual({'edges': 0.1}, loaded.timings)
+
+    def test_text_boxes(self):
+        """
+        Tests that masked text boxes are included in the dictionary and
+        retained when pickled.
+        """
+        result = MoleculeImageResult(
+            self.corners,
+            self.lines,
+            text_boxes=np.array([[0, 0, 10, 5]]),
+            masked_segments=3
+        )
+        self.assertEqual([[0, 0, 10, 5]], result.to_dict()['text_boxes'])
+        self.assertEqual(3, result.to_dict()['masked_segments'])
+
+        loaded = pickle.loads(pickle.dumps(result))
+        np.testing.assert_array_equal([[0, 0, 10, 5]], loaded.text_boxes)
+        self.assertEqual(3, loaded.masked_segments)
+
+    def test_bytes_round_trip(self):
+        """
+        Tests that a result is restored from its bytes, as views of the
+        buffer.
+        """
+        data = bytearray(self.result.to_bytes())
+        loaded = MoleculeImageResult.from_bytes(data)
+
+        np.testing.assert_array_equal(self.result.vertices, loaded.vertices)
+        np.testing.assert_array_equal(self.result.edges, loaded.edges)
+        self.assertTrue(np.shares_memory(
+            loaded.edges, np.frombuffer(data, dtype=np.uint8)
+        ))
+
+        empty = MoleculeImageResult(np.empty((0, 1, 2)), np.empty((0, 1, 4)))
+        loaded = MoleculeImageResult.from_bytes(empty.to_bytes())
+        self.assertEqual((0, 2), loaded.vertices.shape)
+        self.assertEqual((0, 4), loaded.edges.shape)
+
+    def test_bytes_image_size(self):
+        """
+        Tests that the image size is restored from bytes, so that the graph
+        can be built with the adaptive tolerance.
+        """
+        result = MoleculeImageResult(
+            self.corners, self.lines, image_size=(1000, 800)
+        )
+        loaded = MoleculeImageResult.from_bytes(result.to_bytes())
+
+        self.assertEqual((1000, 800), loaded.image_size)
+        self.assertEqual(
+            result.to_graph().to_dict(), loaded.to_graph().to_dict()
+        )
+
+        # Version 1 did not record the image size
+        data = result.to_bytes()
+        legacy = b'MOLR\x01' + data[5:13] + data[22:]
+        loaded = MoleculeImageResult.from_bytes(legacy)
+        self.assertIsNone(loaded.image_size)
+        np.testing.assert_array_equal(result.edges, loaded.edges)
+
+    def test_vertex_index(self):
+        """
+        Tests that the graph is built from the recorded vertex of each
+        endpoint, which is retained when pickled and serialized, even where
+        an endpoint lies further than the tolerance from its vertex.
+        """
+        edges = np.array([
+            [[0, 0, 0, 300]],
+            [[9, 0, 300, 0]],
+            [[18, 0, 300, 300]],
+            [[27, 0, 150, 400]]
+        ])
+        vertices, vertex_index = get_vertices_from_edges(
+            edges, (500, 500), return_index=True
+        )
+        result = MoleculeImageResult(
+            vertices, edges, image_size=(500, 500), vertex_index=vertex_index
+        )
+        expected = build_graph(edges, image_size=(500, 500)).to_dict()
+
+        self.assertEqual(expected, result.to_graph().to_dict())
+        for loaded in (
+                pickle.loads(pickle.dumps(result)),
+                MoleculeImageResult.from_bytes(result.to_bytes())
+        ):
+            np.testing.assert_array_equal(vertex_index, loaded.vertex_index)
+            self.assertEqual(expected, loaded.to_graph().to_dict())
+
+    def test_from_invalid_bytes(self):
+        """Tests that ValueError is raised for invalid data."""
+        data = self.result.to_bytes()
+        for invalid in (b'', b'XXXX' + data[4:], data[:-1]):
+            with self.assertRaises(ValueError):
+                MoleculeImageResult.from_bytes(invalid)
+
+    def test_image_weak_reference(self):
+        """
+        Tests that the image is only held while otherwise referenced, unless
+        kept.
+        """
+        image = np.zeros((10, 10, 3), dtype=np.uint8)
+        result = MoleculeImageResult(self.corners, self.lines, image=image)
+        self.assertIs(image, result.image)
+        del image
+        gc.collect()
+        self.assertIsNone(result.image)
+
+        image = np.zeros((10, 10, 3), dtype=np.uint8)
+        result = MoleculeImageResult(
+            self.corners, self.lines, image=image, keep_image=True
+        )
+        del image
+        gc.collect()
+        self.assertIsNotNone(result.image)
+
+    def test_image_path(self):
+        """
+        Tests that an image read from a file is re-read from its path, in the
+        colour mode in which it was decoded.
+        """
+        image = ShapeImage.new(1000, 1000).add_regular_hexagon(
+            100, start_coord=(400, 400)
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hexagon.png')
+            cv2.imwrite(path, image)
+
+            result = process_molecule_image(path)
+            gc.collect()
+            self.assertEqual(path, result.image_path)
+            self.assertTrue(result.grayscale)
+            np.testing.assert_array_equal(
+                cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), result.image
+            )
+
+            # The colour mode is retained when pickled
+            loaded = pickle.loads(pickle.dumps(result))
+            self.assertEqual((1000, 1000), loaded.image.shape)
+
+            result = process_molecule_image(path, colour=True)
+            gc.collect()
+            self.assertFalse(result.grayscale)
+            np.testing.assert_array_equal(image, result.image)
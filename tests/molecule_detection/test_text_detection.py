@@ -1,8 +1,21 @@
+import math
+import os
+import tempfile
+import threading
 import unittest
+from unittest import mock
 
+import cv2
 import numpy as np
 
-from molrec.molecule_detection.text_detection import east_detection
+from molrec.molecule_detection.text_detection import (
+    EASTModel,
+    decode_predictions,
+    east_detection,
+    east_detection_batch,
+    east_detection_tiled,
+    suppress_boxes
+)
 from tests.drawing import ShapeImage
 
 from .utils import assert_allclose_unsorted
@@ -112,5 +125,298 @@ class TestEASTTextDetection(unittest.TestCase):
         )
 
 
+class TestDecodePredictions(unittest.TestCase):
+    def _decode_cell(self, geometry, x, y):
+        """Decodes a single cell of the geometry map, one value at a time."""
+        d_top, d_right, d_bottom, d_left, angle = geometry[0, :, y, x]
+        cos, sin = math.cos(angle), math.sin(angle)
+        end_x = int(x * 4. + cos * d_right + sin * d_bottom)
+        end_y = int(y * 4. - sin * d_right + cos * d_bottom)
+        return (
+            int(end_x - (d_right + d_left)),
+            int(end_y - (d_top + d_bottom)),
+            end_x,
+            end_y
+        )
+
+    def test_no_confident_cells(self):
+        """Tests that no boxes are decoded below the minimum confidence."""
+        rects, confidences = decode_predictions(
+            np.full((1, 1, 8, 8), 0.2, dtype=np.float32),
+            np.ones((1, 5, 8, 8), dtype=np.float32),
+            0.5
+        )
+        self.assertEqual((0, 4), rects.shape)
+        self.assertEqual(0, len(confidences))
+
+    def test_decode(self):
+        """
+        Tests that the confident cells are decoded in row-major order.
+        """
+        rng = np.random.RandomState(0)
+        scores = rng.uniform(size=(1, 1, 16, 12)).astype(np.float32)
+        geometry = rng.uniform(
+            -0.3, 30, size=(1, 5, 16, 12)
+        ).astype(np.float32)
+
+        rects, confidences = decode_predictions(scores, geometry, 0.7)
+        ys, xs = np.nonzero(scores[0, 0] >= 0.7)
+        self.assertEqual(len(ys), len(rects))
+        np.testing.assert_array_equal(scores[0, 0, ys, xs], confidences)
+        for rect, x, y in zip(rects, xs, ys):
+            np.testing.assert_allclose(
+                self._decode_cell(geometry, x, y), rect, atol=1
+            )
+
+
+class TestSuppressBoxes(unittest.TestCase):
+    def test_overlapping_boxes(self):
+        """
+        Tests that the weaker of two overlapping boxes is suppressed.
+        """
+        rects = np.array([
+            [10, 10, 50, 30], [12, 11, 52, 31], [200, 200, 240, 220]
+        ])
+        np.testing.assert_array_equal(
+            np.array([[12, 11, 52, 31], [200, 200, 240, 220]]),
+            suppress_boxes(rects, np.array([0.6, 0.9, 0.8]), 0.5)
+        )
+
+
+class _FakeNet:
+    """
+    Imitates the EAST network, predicting a single 8 x 8 box for each image,
+    with its end point at (12, 4 * (i + 2)) for the i-th image of the batch.
+    """
+    def __init__(self):
+        self.blobs = []
+
+    def setInput(self, blob):
+        self.blobs.append(blob)
+
+    def forward(self, layer_names):
+        n_images, _, height, width = self.blobs[-1].shape
+        scores = np.zeros((n_images, 1, height // 4, width // 4), np.float32)
+        geometry = np.zeros((n_images, 5, height // 4, width // 4), np.float32)
+        for ii in range(n_images):
+            scores[ii, 0, ii + 1, 2] = 0.9
+            geometry[ii, :4, ii + 1, 2] = 4.
+        return scores, geometry
+
+
+class _FakeModel:
+    def __init__(self):
+        self.net = _FakeNet()
+
+    def get_net(self):
+        return self.net
+
+
+class TestEASTBatchDetection(unittest.TestCase):
+    def test_common_size(self):
+        """
+        Tests that images are letterboxed to a common multiple of 32 and the
+        boxes of each image are returned.
+        """
+        model = _FakeModel()
+        images = [
+            ShapeImage.new(64, 96),
+            np.full((100, 50), 255, dtype=np.uint8)
+        ]
+        boxes = east_detection_batch(images, model=model)
+        self.assertEqual(1, len(model.net.blobs))
+        self.assertEqual((2, 3, 128, 96), model.net.blobs[0].shape)
+        np.testing.assert_array_equal(np.array([[4, 0, 12, 8]]), boxes[0])
+        np.testing.assert_array_equal(np.array([[4, 4, 12, 12]]), boxes[1])
+
+    def test_scaled_to_size(self):
+        """
+        Tests that boxes are mapped back to the coordinates of images which
+        were scaled down to fit the letterbox size.
+        """
+        model = _FakeModel()
+        boxes = east_detection_batch(
+            [ShapeImage.new(64, 64)], size=(32, 32), model=model
+        )
+        self.assertEqual((1, 3, 32, 32), model.net.blobs[0].shape)
+        np.testing.assert_array_equal(np.array([[8, 0, 24, 16]]), boxes[0])
+
+    def test_batch_size(self):
+        """Tests that one forward pass is made per batch of images."""
+        model = _FakeModel()
+        boxes = east_detection_batch(
+            [ShapeImage.new(32, 32) for _ in range(3)],
+            batch_size=2,
+            model=model
+        )
+        self.assertEqual(3, len(boxes))
+        self.assertEqual(
+            [2, 1], [blob.shape[0] for blob in model.net.blobs]
+        )
+
+    def test_invalid_size(self):
+        """Tests that a size which is not a multiple of 32 is rejected."""
+        with self.assertRaises(ValueError):
+            east_detection_batch(
+                [ShapeImage.new(32, 32)], size=(40, 32), model=_FakeModel()
+            )
+
+
+class _FakeInkNet(_FakeNet):
+    """
+    Imitates the EAST network, predicting a 4 x 4 box around each dark 4 x 4
+    cell of each image.
+    """
+    def forward(self, layer_names):
+        blob = self.blobs[-1]
+        n_images, _, height, width = blob.shape
+        cells = blob[:, 0].reshape(n_images, height // 4, 4, width // 4, 4)
+        scores = np.where(
+            cells.max(axis=(2, 4)) < -50, 0.9, 0.
+        ).astype(np.float32)[:, None]
+        geometry = np.zeros((n_images, 5, height // 4, width // 4), np.float32)
+        geometry[:, :4] = 2.
+        return scores, geometry
+
+
+class TestEASTTiledDetection(unittest.TestCase):
+    def setUp(self):
+        self.model = _FakeModel()
+        self.model.net = _FakeInkNet()
+        # Tiles of 512 with an overlap of 64 start at 0, 448 and 488
+        self.image = np.full((1000, 1000), 255, dtype=np.uint8)
+
+    def test_blank_image(self):
+        """Tests that no tiles of a blank image are detected."""
+        boxes = east_detection_tiled(self.image, model=self.model)
+        np.testing.assert_equal(boxes, np.array([]))
+        self.assertEqual([], self.model.net.blobs)
+
+    def test_boxes_merged_across_seams(self):
+        """
+        Tests that only tiles containing ink are detected, and that boxes
+        detected in overlapping tiles are merged.
+        """
+        self.image[100:104, 460:464] = 0
+        boxes = east_detection_tiled(
+            self.image, min_ink_density=1e-5, model=self.model
+        )
+        self.assertEqual(1, len(self.model.net.blobs))
+        self.assertEqual((2, 3, 512, 512), self.model.net.blobs[0].shape)
+        np.testing.assert_array_equal(np.array([[458, 98, 462, 102]]), boxes)
+
+    def test_no_suppression(self):
+        """
+        Tests that the boxes of each tile are retained without suppression.
+        """
+        self.image[100:104, 460:464] = 0
+        boxes = east_detection_tiled(
+            self.image,
+            min_ink_density=1e-5,
+            apply_suppression=False,
+            model=self.model
+        )
+        np.testing.assert_array_equal(
+            np.array([[458, 98, 462, 102], [458, 98, 462, 102]]), boxes
+        )
+
+    def test_small_image(self):
+        """
+        Tests that an image smaller than a tile, and of any size, is detected.
+        """
+        image = np.full((70, 90, 3), 255, dtype=np.uint8)
+        image[40:44, 20:24] = 0
+        boxes = east_detection_tiled(image, model=self.model)
+        np.testing.assert_array_equal(np.array([[18, 38, 22, 42]]), boxes)
+
+    def test_invalid_tiles(self):
+        """Tests that invalid tile sizes and overlaps are rejected."""
+        for tile_size, overlap in [(500, 64), (512, 512)]:
+            with self.subTest(tile_size=tile_size, overlap=overlap):
+                with self.assertRaises(ValueError):
+                    east_detection_tiled(
+                        self.image,
+                        tile_size=tile_size,
+                        overlap=overlap,
+                        model=self.model
+                    )
+
+
+class TestEASTModel(unittest.TestCase):
+    """
+    These tests replace the network construction, so do not require the
+    frozen EAST model.
+
+    """
+    def setUp(self):
+        handle, self.model_path = tempfile.mkstemp(suffix='.pb')
+        os.write(handle, b'not really a model')
+        os.close(handle)
+        self.addCleanup(os.remove, self.model_path)
+
+        patcher = mock.patch.object(
+            cv2.dnn,
+            'readNetFromTensorflow',
+            side_effect=lambda data: mock.Mock(name='Net')
+        )
+        self.read_net = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_net_reused_within_thread(self):
+        """Tests that each thread reuses its network."""
+        model = EASTModel(self.model_path)
+        self.assertIs(model.get_net(), model.get_net())
+        self.assertEqual(1, self.read_net.call_count)
+
+    def test_net_per_thread(self):
+        """
+        Tests that each thread is given its own network, built from a single
+        read of the model file.
+        """
+        model = EASTModel(self.model_path)
+        nets = [model.get_net()]
+        with mock.patch('numpy.fromfile', wraps=np.fromfile) as from_file:
+            thread = threading.Thread(
+                target=lambda: nets.append(model.get_net())
+            )
+            thread.start()
+            thread.join()
+            from_file.assert_not_called()
+        self.assertEqual(2, len(nets))
+        self.assertIsNot(nets[0], nets[1])
+        np.testing.assert_array_equal(
+            np.frombuffer(b'not really a model', dtype=np.uint8),
+            self.read_net.call_args[0][0]
+        )
+
+    def test_configure_backend(self):
+        """
+        Tests that the preferred backend and target are applied, rebuilding
+        existing networks.
+        """
+        model = EASTModel(self.model_path)
+        net = model.get_net()
+        net.setPreferableBackend.assert_not_called()
+
+        model.configure(
+            backend=cv2.dnn.DNN_BACKEND_OPENCV,
+            target=cv2.dnn.DNN_TARGET_CPU
+        )
+        new_net = model.get_net()
+        self.assertIsNot(net, new_net)
+        new_net.setPreferableBackend.assert_called_once_with(
+            cv2.dnn.DNN_BACKEND_OPENCV
+        )
+        new_net.setPreferableTarget.assert_called_once_with(
+            cv2.dnn.DNN_TARGET_CPU
+        )
+
+    def test_warmup(self):
+        """Tests that warming up runs a forward pass."""
+        model = EASTModel(self.model_path)
+        model.warmup()
+        model.get_net().forward.assert_called_once()
+
+
 if __name__ == '__main__':
     unittest.main()
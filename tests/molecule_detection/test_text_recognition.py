@@ -1,8 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 import unittest
+from unittest import mock
 
 import numpy as np
 
-from molrec.molecule_detection.text_recognition import extract_text
+from molrec.molecule_detection.text_recognition import (
+    assign_words,
+    extract_text,
+    pack_rois
+)
 from tests.drawing import ShapeImage
 
 from .utils import assert_allclose_unsorted
@@ -57,5 +65,143 @@ class TestTextRecognition(unittest.TestCase):
         self.assertIn(text2, text_strings)
 
 
+class TestBatchTextRecognition(unittest.TestCase):
+    def test_two_words(self):
+        """
+        Tests that two words are recognized with a single Tesseract invocation.
+
+        """
+        image = ShapeImage.new(512, 512)
+        text1 = 'Testing'
+        image.add_text(text1, (300, 300))
+        text2 = 'Hydroxybenzene'
+        image.add_text(text2, (200, 200))
+        boxes = [(300, 270, 410, 310), (200, 170, 400, 210)]
+        texts = extract_text(image, boxes, batch=True)
+        self.assertEqual(
+            [(278, 262, 454, 326), (160, 162, 480, 226)],
+            [t[0] for t in texts]
+        )
+        self.assertEqual([text1, text2], [t[1] for t in texts])
+
+    def test_single_invocation(self):
+        """
+        Tests that the words recognized in the packed strip are mapped back to
+        their boxes.
+
+        """
+        image = ShapeImage.new(512, 512)
+        boxes = [(300, 270, 410, 310), (200, 170, 400, 210)]
+        # The padded regions are 64 high, so are packed at rows 20 and 104
+        data = {
+            'text': ['', 'CO2Me', 'OH', 'x', ''],
+            'left': [0, 20, 20, 60, 0],
+            'top': [0, 110, 25, 30, 0],
+            'height': [0, 40, 40, 35, 0]
+        }
+        with mock.patch(
+                'pytesseract.image_to_data', return_value=data
+        ) as image_to_data:
+            texts = extract_text(image, boxes, batch=True)
+        image_to_data.assert_called_once()
+        self.assertEqual(['OH x', 'CO2Me'], [t[1] for t in texts])
+
+    def test_no_boxes(self):
+        """Tests that no text is recognized with no boxes."""
+        image = ShapeImage.new(512, 512)
+        self.assertEqual([], extract_text(image, [], batch=True))
+
+
+class TestConcurrentTextRecognition(unittest.TestCase):
+    def setUp(self):
+        self.image = ShapeImage.new(512, 512)
+        self.boxes = [
+            (50 * ii, 10, 50 * ii + 10 + 5 * ii, 20) for ii in range(8)
+        ]
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def _fake_image_to_string(self, roi, config):
+        """
+        Imitates Tesseract, recording the number of concurrent recognitions
+        and identifying each region by its width.
+        """
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return str(roi.shape[1])
+
+    def _expected(self):
+        return [str(10 + 5 * ii) for ii in range(8)]
+
+    def test_max_workers(self):
+        """
+        Tests that boxes are recognized concurrently and returned in box
+        order.
+        """
+        with mock.patch(
+                'pytesseract.image_to_string',
+                side_effect=self._fake_image_to_string
+        ):
+            texts = extract_text(
+                self.image, self.boxes, padding=0, max_workers=4
+            )
+        self.assertGreater(self.max_running, 1)
+        self.assertEqual(self._expected(), [t[1] for t in texts])
+
+    def test_executor(self):
+        """Tests that a provided executor is used and left running."""
+        with ThreadPoolExecutor(max_workers=4) as executor, mock.patch(
+                'pytesseract.image_to_string',
+                side_effect=self._fake_image_to_string
+        ):
+            texts = extract_text(
+                self.image, self.boxes, padding=0, executor=executor
+            )
+            self.assertEqual(
+                '1', executor.submit(lambda: '1').result()
+            )
+        self.assertGreater(self.max_running, 1)
+        self.assertEqual(self._expected(), [t[1] for t in texts])
+
+
+class TestPackRois(unittest.TestCase):
+    def test_pack(self):
+        """
+        Tests that regions are packed into a white strip at known offsets.
+
+        """
+        rois = [
+            np.zeros((10, 30, 3), dtype=np.uint8),
+            np.full((5, 50), 100, dtype=np.uint8)
+        ]
+        strip, offsets = pack_rois(rois, gap=4)
+        self.assertEqual((27, 58), strip.shape)
+        self.assertEqual([(4, 14), (18, 23)], offsets)
+        np.testing.assert_array_equal(0, strip[4:14, 4:34])
+        np.testing.assert_array_equal(100, strip[18:23, 4:54])
+        self.assertEqual(
+            27 * 58 - 10 * 30 - 5 * 50, np.count_nonzero(strip == 255)
+        )
+
+
+class TestAssignWords(unittest.TestCase):
+    def test_words_outside_regions(self):
+        """Tests that words in the gaps between regions are discarded."""
+        data = {
+            'text': ['A', 'B', 'C'],
+            'left': [0, 0, 0],
+            'top': [0, 12, 30],
+            'height': [4, 4, 4]
+        }
+        self.assertEqual(
+            ['B', ''], assign_words(data, [(10, 20), (40, 50)])
+        )
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,204 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+import numpy as np
+
+from benchmarks import complexity, stages
+from molrec.molecule_detection.feature_detection import remove_parallel_edges
+
+
+class TestScenes(unittest.TestCase):
+    def test_scenes(self):
+        """Tests that each scene is drawn, with labels inside the image."""
+        for name, draw in stages.SCENES.items():
+            with self.subTest(scene=name):
+                image, labels = draw(512)
+                self.assertEqual((512, 512, 3), image.shape)
+                self.assertTrue((np.asarray(image) == 0).any())
+                for start_x, start_y, end_x, end_y in labels:
+                    self.assertTrue(0 <= start_x < end_x <= 512)
+                    self.assertTrue(0 <= start_y < end_y <= 512)
+
+
+class TestBenchmarkImage(unittest.TestCase):
+    def test_line_stages(self):
+        """Tests that each requested stage is timed."""
+        image, labels = stages.draw_hexagon_chain(512)
+        report = stages.benchmark_image(
+            image,
+            labels,
+            repeat=2,
+            stages=[
+                'detect_edges',
+                'remove_parallel_edges',
+                'get_vertices_from_edges'
+            ]
+        )
+
+        self.assertEqual(
+            ['detect_edges', 'remove_parallel_edges',
+             'get_vertices_from_edges'],
+            list(report)
+        )
+        for timing in report.values():
+            self.assertLessEqual(timing['min'], timing['median'])
+        self.assertGreaterEqual(
+            report['detect_edges']['segments'],
+            report['remove_parallel_edges']['segments']
+        )
+        self.assertGreater(report['get_vertices_from_edges']['vertices'], 0)
+
+    def test_unknown(self):
+        """Tests that unknown scenes and stages are rejected."""
+        with self.assertRaises(ValueError):
+            stages.run(scenes=['benzene'])
+        with self.assertRaises(ValueError):
+            stages.run(stages=['segmentation'])
+
+
+class TestCompare(unittest.TestCase):
+    def setUp(self):
+        self.baseline = {'results': {
+            'grid/512': {
+                'detect_edges': {'min': 0.010, 'median': 0.011},
+                'remove_parallel_edges': {'min': 0.020, 'median': 0.021}
+            }
+        }}
+
+    def test_regressions(self):
+        """
+        Tests that only stages slower than the threshold are reported, and
+        that cases missing from the baseline are ignored.
+        """
+        report = {'results': {
+            'grid/512': {
+                'detect_edges': {'min': 0.0115, 'median': 0.02},
+                'remove_parallel_edges': {'min': 0.030, 'median': 0.031}
+            },
+            'grid/1024': {
+                'detect_edges': {'min': 1., 'median': 1.}
+            }
+        }}
+
+        regressions = stages.compare(report, self.baseline, threshold=0.2)
+
+        self.assertEqual(1, len(regressions))
+        self.assertEqual('grid/512', regressions[0]['case'])
+        self.assertEqual('remove_parallel_edges', regressions[0]['stage'])
+        self.assertAlmostEqual(1.5, regressions[0]['ratio'])
+
+        self.assertEqual(2, len(stages.compare(
+            report, self.baseline, threshold=0.2, statistic='median'
+        )))
+        self.assertEqual([], stages.compare(
+            report, self.baseline, threshold=0.6
+        ))
+
+    def test_main(self):
+        """
+        Tests that the report is written as JSON, and that the exit status
+        reflects a comparison with the baseline.
+        """
+        argv = [
+            '--sizes', '256',
+            '--scenes', 'grid',
+            '--stages', 'detect_edges',
+            '--repeat', '1'
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(0, stages.main(argv + ['-o', output]))
+            with open(output) as fh:
+                report = json.load(fh)
+            self.assertEqual(['grid/256'], list(report['results']))
+
+            # A baseline 100 times faster than the current report
+            timing = report['results']['grid/256']['detect_edges']
+            timing['min'] /= 100
+            baseline = os.path.join(directory, 'baseline.json')
+            with open(baseline, 'w') as fh:
+                json.dump(report, fh)
+            stderr = io.StringIO()
+            with redirect_stdout(io.StringIO()), redirect_stderr(stderr):
+                self.assertEqual(
+                    1, stages.main(argv + ['--baseline', baseline])
+                )
+            self.assertIn(
+                'Regression: grid/256 detect_edges', stderr.getvalue()
+            )
+
+
+class TestFitExponent(unittest.TestCase):
+    def test_power_law(self):
+        """Tests that the exponent of an exact power law is recovered."""
+        sizes = [1000, 2000, 4000, 8000]
+        self.assertAlmostEqual(
+            2., complexity.fit_exponent(sizes, [1e-9 * n ** 2 for n in sizes])
+        )
+        self.assertAlmostEqual(
+            1., complexity.fit_exponent(sizes, [1e-6 * n for n in sizes])
+        )
+
+    def test_too_few_sizes(self):
+        """Tests that ValueError is raised for a single size."""
+        with self.assertRaises(ValueError):
+            complexity.fit_exponent([1000], [0.1])
+
+
+class TestLayouts(unittest.TestCase):
+    def test_layouts(self):
+        """
+        Tests that each layout generates the requested number of segments, at
+        constant density.
+        """
+        for layout, generate in complexity.LAYOUTS.items():
+            with self.subTest(layout=layout):
+                small, large = generate(1000), generate(4000)
+                self.assertEqual((1000, 1, 4), small.shape)
+                self.assertEqual((4000, 1, 4), large.shape)
+                self.assertTrue(np.issubdtype(small.dtype, np.integer))
+                # Four times the segments cover about four times the area
+                self.assertAlmostEqual(
+                    2., np.ptp(large[..., 0]) / np.ptp(small[..., 0]), delta=0.3
+                )
+
+
+@unittest.skipUnless(
+    os.environ.get('MOLREC_TIMING_TESTS'),
+    'Wall-clock growth checks run with MOLREC_TIMING_TESTS=1, or with '
+    'python -m benchmarks.complexity'
+)
+class TestGrowthBounds(unittest.TestCase):
+    def test_declared_bounds(self):
+        """
+        Tests that the runtime of each case grows no faster than its declared
+        bound.
+        """
+        for row in complexity.check():
+            with self.subTest(case=row['case']):
+                self.assertLessEqual(row['exponent'], row['bound'])
+
+    def test_quadratic_detected(self):
+        """
+        Tests that the all-pairs engine, which is quadratic by design, exceeds
+        the bound declared for the near-linear engines.
+        """
+        case = complexity.Case(
+            'remove_parallel_edges[vectorized]/random',
+            lambda segments: remove_parallel_edges(
+                segments, max_line_dist=5, method='vectorized'
+            ),
+            'random',
+            1.5
+        )
+        (row,) = complexity.check([case], sizes=[1000, 2000, 4000])
+        self.assertFalse(row['passed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
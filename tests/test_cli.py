@@ -0,0 +1,164 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+
+from molrec import cli
+from molrec.cli import find_images, main, process_path, warmup_worker
+from molrec.molecule_detection import feature_detection
+from tests.drawing import ShapeImage
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+        self.addCleanup(self._tmp.cleanup)
+
+        image = ShapeImage.new(1000, 1000).add_regular_hexagon(
+            100, start_coord=(400, 400)
+        )
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.directory, f'hexagon_{i}.png')
+            cv2.imwrite(path, image)
+            self.paths.append(path)
+
+    def _run(self, *argv):
+        """Runs the CLI, returning its exit status and output records."""
+        output = os.path.join(self.directory, 'out.jsonl')
+        with contextlib.redirect_stderr(io.StringIO()):
+            status = main([*argv, '-o', output])
+        with open(output) as fh:
+            records = [json.loads(line) for line in fh]
+        return status, records
+
+    def test_find_images(self):
+        """
+        Tests that directories and glob patterns are expanded to image paths,
+        without duplicates.
+        """
+        with open(os.path.join(self.directory, 'notes.txt'), 'w') as fh:
+            fh.write('not an image')
+
+        self.assertEqual(
+            self.paths,
+            find_images([
+                self.directory,
+                os.path.join(self.directory, 'hexagon_*.png'),
+                self.paths[0]
+            ])
+        )
+
+    def test_process_path(self):
+        """
+        Tests that a record of the vertices, edges and stage timings is
+        produced for an image.
+        """
+        record = process_path(self.paths[0])
+
+        self.assertIsNone(record['error'])
+        self.assertIsNone(record['error_kind'])
+        self.assertEqual(6, len(record['vertices']))
+        self.assertEqual(6, len(record['edges']))
+        self.assertEqual(6, len(record['graph']['edges']))
+        self.assertIsNone(record['text'])
+        self.assertLessEqual(
+            {'read', 'edges', 'vertices', 'graph', 'total'},
+            set(record['timings'])
+        )
+
+    def test_process_path_error(self):
+        """Tests that a failure is recorded rather than raised."""
+        record = process_path(os.path.join(self.directory, 'missing.png'))
+
+        self.assertIsNone(record['vertices'])
+        self.assertIn('ImageDecodeError', record['error'])
+        self.assertEqual('decode', record['error_kind'])
+
+    def test_warmup_worker(self):
+        """Tests that the line detector is created ahead of the first image."""
+        with mock.patch.object(
+                feature_detection,
+                'get_line_detector',
+                wraps=feature_detection.get_line_detector
+        ) as get_line_detector:
+            warmup_worker()
+        get_line_detector.assert_called_once_with()
+
+    def test_main_serial(self):
+        """Tests that one record is written per image, in a single process."""
+        status, records = self._run(self.directory, '-j', '1')
+
+        self.assertEqual(0, status)
+        self.assertEqual(self.paths, [record['path'] for record in records])
+
+    def test_main_process_pool(self):
+        """Tests that one record is written per image, across processes."""
+        status, records = self._run(self.directory, '-j', '2')
+
+        self.assertEqual(0, status)
+        self.assertCountEqual(
+            self.paths, [record['path'] for record in records]
+        )
+        for record in records:
+            self.assertIsNone(record['error'])
+            self.assertEqual(6, len(record['edges']))
+
+    def test_main_failure(self):
+        """Tests that the exit status is non-zero if any image fails."""
+        bad_path = os.path.join(self.directory, 'corrupt.png')
+        with open(bad_path, 'wb') as fh:
+            fh.write(b'not a png')
+
+        status, records = self._run(self.paths[0], bad_path, '-j', '1')
+
+        self.assertEqual(1, status)
+        self.assertIsNone(records[0]['error'])
+        self.assertIsNotNone(records[1]['error'])
+
+    def test_main_detector_params(self):
+        """Tests that the line detection options are applied."""
+        status, records = self._run(
+            self.paths[0], '-j', '1', '--parallel-method', 'grid'
+        )
+        self.assertEqual(0, status)
+        self.assertEqual(6, len(records[0]['edges']))
+
+        status, records = self._run(
+            self.paths[0], '-j', '1', '--length-threshold', '1000'
+        )
+        self.assertEqual(1, status)
+        self.assertIn('DetectionError', records[0]['error'])
+
+    def test_main_warmup_failure(self):
+        """
+        Tests that a failure to load the models is recorded for each image,
+        rather than crashing the process or the pool.
+        """
+        self.addCleanup(setattr, cli, '_warmup_error', None)
+        with mock.patch(
+                'molrec.molecule_detection.text_detection.east_model.warmup',
+                side_effect=FileNotFoundError('frozen_east_text_detection.pb')
+        ):
+            for workers in ('1', '2'):
+                status, records = self._run(
+                    self.directory, '--text', '-j', workers
+                )
+
+                self.assertEqual(1, status)
+                self.assertEqual(3, len(records))
+                for record in records:
+                    self.assertIsNone(record['vertices'])
+                    self.assertIn('FileNotFoundError', record['error'])
+
+    def test_main_no_images(self):
+        """Tests that the exit status is 2 if no images are found."""
+        with contextlib.redirect_stderr(io.StringIO()):
+            status = main([os.path.join(self.directory, '*.jpg')])
+        self.assertEqual(2, status)
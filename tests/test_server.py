@@ -0,0 +1,163 @@
+import json
+import threading
+import unittest
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import cv2
+
+from molrec.server import RecognitionServer
+from tests.drawing import ShapeImage
+
+
+class TestRecognitionServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = RecognitionServer(
+            ('127.0.0.1', 0), workers=2, max_upload_bytes=1024 ** 2, quiet=True
+        )
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+        host, port = cls.server.server_address[:2]
+        cls.url = f'http://{host}:{port}'
+
+        image = ShapeImage.new(1000, 1000).add_regular_hexagon(
+            100, start_coord=(400, 400)
+        )
+        cls.image_data = cv2.imencode('.png', image)[1].tobytes()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.thread.join()
+        cls.server.server_close()
+
+    def _request(self, path, data=None):
+        """Sends a request, returning the status and decoded JSON body."""
+        try:
+            with urlopen(Request(self.url + path, data=data)) as response:
+                return response.status, json.load(response)
+        except HTTPError as error:
+            return error.code, json.load(error)
+
+    def test_recognize(self):
+        """Tests that the vertices and edges of an upload are returned."""
+        status, record = self._request('/recognize', self.image_data)
+
+        self.assertEqual(200, status)
+        self.assertIsNone(record['error'])
+        self.assertEqual(6, len(record['vertices']))
+        self.assertEqual(6, len(record['edges']))
+
+    def test_recognize_invalid_image(self):
+        """Tests that an undecodable upload is rejected."""
+        status, record = self._request('/recognize', b'not an image')
+
+        self.assertEqual(422, status)
+        self.assertIn('ImageDecodeError', record['error'])
+        self.assertEqual('decode', record['error_kind'])
+
+    def test_recognize_failure(self):
+        """
+        Tests that a failure other than decoding the upload is a server
+        error.
+        """
+        blank = cv2.imencode('.png', ShapeImage.new(100, 100))[1].tobytes()
+        status, record = self._request('/recognize', blank)
+
+        self.assertEqual(500, status)
+        self.assertIn('DetectionError', record['error'])
+        self.assertEqual('internal', record['error_kind'])
+
+    def test_recognize_text_not_enabled(self):
+        """
+        Tests that text detection is rejected unless the server was started
+        with it, and that it may be disabled per request.
+        """
+        status, record = self._request('/recognize?text=1', self.image_data)
+        self.assertEqual(400, status)
+        self.assertIn('--text', record['error'])
+
+        status, _ = self._request('/recognize?text=0', self.image_data)
+        self.assertEqual(200, status)
+
+    def test_recognize_too_large(self):
+        """Tests that an upload larger than the limit is rejected."""
+        status, _ = self._request('/recognize', bytes(1024 ** 2 + 1))
+        self.assertEqual(413, status)
+
+    def test_unknown_path(self):
+        """Tests that unknown paths are not found."""
+        self.assertEqual(404, self._request('/unknown')[0])
+        self.assertEqual(404, self._request('/unknown', b'data')[0])
+
+    def test_health(self):
+        """Tests that the health endpoint reports the workers."""
+        status, body = self._request('/health')
+
+        self.assertEqual(200, status)
+        self.assertEqual({'status': 'ok', 'workers': 2}, body)
+
+    def test_metrics(self):
+        """Tests that recognition requests are counted."""
+        _, before = self._request('/metrics')
+        self._request('/recognize', self.image_data)
+        self._request('/recognize', b'not an image')
+        status, after = self._request('/metrics')
+
+        self.assertEqual(200, status)
+        self.assertEqual(2, after['requests'] - before['requests'])
+        self.assertEqual(1, after['errors'] - before['errors'])
+        self.assertEqual(0, after['in_flight'])
+        self.assertGreater(after['latency_max'], 0)
+
+
+class TestRecognitionServerWarmupFailure(unittest.TestCase):
+    def setUp(self):
+        # The model data loads in the parent, but not in the workers
+        module = 'molrec.molecule_detection.text_detection.east_model'
+        patches = [
+            mock.patch(f'{module}.load_model_data'),
+            mock.patch(
+                f'{module}.warmup',
+                side_effect=FileNotFoundError('frozen_east_text_detection.pb')
+            )
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.server = RecognitionServer(
+            ('127.0.0.1', 0), workers=1, text=True, quiet=True
+        )
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.server_address[:2]
+        self.url = f'http://{host}:{port}'
+
+    def _request(self, path, data=None):
+        try:
+            with urlopen(Request(self.url + path, data=data)) as response:
+                return response.status, json.load(response)
+        except HTTPError as error:
+            return error.code, json.load(error)
+
+    def test_unavailable(self):
+        """
+        Tests that a failure to load the models is reported by the health
+        endpoint, and that uploads are rejected rather than timing out.
+        """
+        self.assertIn('FileNotFoundError', self.server.warmup_error)
+
+        status, body = self._request('/health')
+        self.assertEqual(503, status)
+        self.assertEqual('unavailable', body['status'])
+        self.assertIn('FileNotFoundError', body['error'])
+
+        status, body = self._request('/recognize', b'data')
+        self.assertEqual(503, status)
+        self.assertIn('FileNotFoundError', body['error'])